@@ -1,163 +1,179 @@
 from temporalio import activity
-import sqlite3
+from temporalio.client import Client
 from datetime import datetime, timedelta
+import asyncio
+import collections
+import json
 import random
-from docx import Document
-from docx2pdf import convert
 import os
 import uuid
 
+from config import (
+    SAVE_PRESCRIPTION_DOCX,
+    RECEPTION_TASK_QUEUE,
+    DOCTOR_QUEUE_WORKFLOW_ID_PREFIX,
+    WAIT_ESTIMATE_HORIZON_HOURS,
+    BULK_RENDER_PROCESSES,
+    BULK_RENDER_BATCH_SIZE,
+    BULK_RENDER_CHUNK_SIZE,
+)
+from executors import DB_EXECUTOR, RENDER_EXECUTOR, BULK_RENDER_EXECUTOR, in_executor
+import repository
+from schedule_index import schedule_index
+from patient_cache import patient_cache
+from wait_estimator import estimate_wait, prior_stats
+from prescription_pdf import render_pdf
+from prescription_template import TEMPLATE_PATH, get_template
+
 OUTPUT_DIR = "../static/prescriptions"
 BASE_URL = "http://localhost:8000"
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-DB_PATH = "../clinic.db"
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+def idempotency_key():
+    """
+    A key that stays the same across retries of the current activity execution,
+    so a retried write can recognise the row its earlier attempt committed.
+    None when called outside an activity.
+    """
+    if not activity.in_activity():
+        return None
+    info = activity.info()
+    return f"{info.workflow_id}:{info.workflow_run_id}:{info.activity_id}"
+
 
 @activity.defn
-async def check_doctor_availability(doctor_name: str) -> dict:
-    conn = get_connection()
-    cur = conn.cursor()
+@in_executor(DB_EXECUTOR)
+def check_doctor_availability(doctor_name: str) -> dict:
     now = datetime.now()
     weekday = now.strftime("%A")
     time_now = now.strftime("%H:%M:%S")
 
-    cur.execute("""
-        SELECT doctor_id FROM doctor_schedule
-        WHERE LOWER(name) = LOWER(?)
-        AND day_of_week = ?
-        AND start_time <= ?
-        AND end_time >= ?
-    """, (doctor_name, weekday, time_now, time_now))
-
-    row = cur.fetchone()
-    conn.close()
+    doctor_id = schedule_index.find_doctor_on_shift(doctor_name, weekday, time_now)
 
-    if row:
+    if doctor_id is not None:
         return {
             "available": True,
-            "doctor_id": row[0]
+            "doctor_id": doctor_id
         }
     else:
+        # Tell the patient when the doctor is next in, if they work here at all
+        next_shift = None
+        for known_id in schedule_index.doctor_ids(doctor_name):
+            shift = schedule_index.next_shift(known_id, weekday, time_now)
+            if shift:
+                next_shift = {"day": shift[0], "start": shift[1], "end": shift[2]}
+                break
         return {
             "available": False,
-            "doctor_id": None
+            "doctor_id": None,
+            "next_shift": next_shift
         }
 
+def load_patient(phone_number: str):
+    patient = repository.find_patient_by_phone(phone_number)
+    if patient is not None:
+        patient_cache.put(phone_number, patient)
+    return patient
+
 @activity.defn
 async def get_patient_by_phone(phone_number: str) -> dict:
     """Get patient information by phone number"""
-    conn = get_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        SELECT patient_id, name, phone, gender, age, address FROM patients
-        WHERE phone = ?
-    """, (phone_number,))
-    
-    patient = cur.fetchone()
-    conn.close()
-    
-    if patient:
-        return {
-            "patient_id": patient[0],
-            "name": patient[1],
-            "phone_number": patient[2],
-            "gender": patient[3],
-            "age": patient[4],
-            "address": patient[5]
-        }
-    return None
+    if patient_cache.version_check_due():
+        await DB_EXECUTOR.run(patient_cache.check_version)
+    # Cache hits are answered on the event loop without taking a DB thread
+    patient = patient_cache.get(phone_number)
+    if patient is None:
+        patient = await DB_EXECUTOR.run(load_patient, phone_number)
+    return patient
 
 @activity.defn
-async def confirm_patient_appointment(patient_id: int, doctor_id: int) -> bool:
-    conn = get_connection()
-    cur = conn.cursor()
-
+@in_executor(DB_EXECUTOR)
+def confirm_patient_appointment(patient_id: int, doctor_id: int) -> bool:
     # Get today's start and end time
     now = datetime.now()
     start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
     end_of_day = start_of_day + timedelta(days=1)
 
-    cur.execute("""
-        SELECT * FROM appointments
-        WHERE patient_id = ? AND doctor_id = ?
-        AND appointment_datetime >= ? AND appointment_datetime < ?
-        AND status = 'scheduled'
-        ORDER BY appointment_datetime ASC
-        LIMIT 1
-    """, (patient_id, doctor_id, start_of_day.isoformat(), end_of_day.isoformat()))
-
-    appointment = cur.fetchone()
-    conn.close()
-    return appointment is not None
+    return repository.has_scheduled_appointment(
+        patient_id, doctor_id, start_of_day.isoformat(), end_of_day.isoformat()
+    )
 
 @activity.defn
-async def register_patient(name: str, phone: str, gender: str, age: str, address: str) -> str:
+@in_executor(DB_EXECUTOR)
+def register_patient(name: str, phone: str, gender: str, age: str, address: str) -> dict:
     """
     Register a new patient with name, phone, gender, age and address.
+    Returns the patient record, the existing one if the phone is already registered.
     """
-    conn = get_connection()
-    cur = conn.cursor()
+    patient_id, created = repository.create_patient(name, phone, gender, age, address, idempotency_key())
+    if created:
+        patient = {
+            "patient_id": patient_id,
+            "name": name,
+            "phone_number": phone,
+            "gender": gender,
+            "age": age,
+            "address": address
+        }
+        patient_cache.put(phone, patient)
+        return patient
 
-    # Check if patient already exists
-    cur.execute("SELECT patient_id FROM patients WHERE phone = ?", (phone,))
-    existing = cur.fetchone()
-    if existing:
-        conn.close()
-        return f"Patient with phone {phone} already registered (patient_id: {existing[0]})."
+    return load_patient(phone)
 
-    cur.execute("SELECT MAX(patient_id) FROM patients")
-    max_id_row = cur.fetchone()
-    max_id = max_id_row[0] if max_id_row[0] is not None else 0
-    patient_id = max_id + 1
+@activity.defn
+@in_executor(DB_EXECUTOR)
+def estimate_wait_time_for_walkin(doctor_id: int) -> dict:
+    """
+    p50/p90 minutes a walk-in joining now would wait, from the doctor's observed consultation times.
+    The queue length is the checkpointed count, up to QUEUE_CHECKPOINT_INTERVAL seconds behind the
+    doctor's DoctorQueueWorkflow; that is intended, as it keeps the estimate a local read on the
+    reception path, and the position once queued is asked of the workflow itself.
+    """
+    now = datetime.now()
+    horizon = now + timedelta(hours=WAIT_ESTIMATE_HORIZON_HOURS)
+    appointment_offsets = [
+        (datetime.fromisoformat(slot) - now).total_seconds() / 60
+        for slot in repository.booked_slots(doctor_id, now.isoformat(), horizon.isoformat())
+    ]
+    stats = repository.get_service_stats(doctor_id) or prior_stats()
+    return estimate_wait(repository.count_open_queue(doctor_id), appointment_offsets, stats)
 
-    # Insert new patient
-    cur.execute("""
-        INSERT INTO patients (patient_id, name, phone, gender, age, address)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (patient_id, name, phone, gender, age, address))
 
-    conn.commit()
-    conn.close()
+SLOT_MINUTES = 15
 
-    return f"Patient registered successfully with patient_id: {patient_id}"
 
-@activity.defn
-async def estimate_wait_time_for_walkin(doctor_id: int) -> int:
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT COUNT(*) FROM doctor_queue
-        WHERE doctor_id = ? AND (seen IS NULL OR seen = 'no')
-    """, (doctor_id,))
-    
-    queue_count = cur.fetchone()[0]
-    conn.close()
+def free_slots(schedules, appointment_date, booked: set, limit: int = None) -> list:
+    """The first `limit` (default all) 15-minute slots within `schedules` on `appointment_date` not in `booked`."""
+    slot_length = timedelta(minutes=SLOT_MINUTES)
+    found = []
+    for start_str, end_str in sorted(schedules):
+        current_slot = datetime.strptime(f"{appointment_date} {start_str}", "%Y-%m-%d %H:%M:%S")
+        end_dt = datetime.strptime(f"{appointment_date} {end_str}", "%Y-%m-%d %H:%M:%S")
+        while current_slot + slot_length <= end_dt:
+            if current_slot.isoformat() not in booked:
+                found.append(current_slot)
+                if limit is not None and len(found) == limit:
+                    return found
+            current_slot += slot_length
+    return found
 
-    return queue_count * 15
 
 @activity.defn
-async def book_later_appointment(patient_id: int, doctor_id: int):
-    conn = get_connection()
-    cur = conn.cursor()
+@in_executor(DB_EXECUTOR)
+def book_later_appointment(patient_id: int, doctor_id: int):
     now = datetime.now()
+
+    # A retry of an attempt that already committed gets the same booking back
+    key = idempotency_key()
+    if key is not None:
+        existing = repository.find_appointment_by_key(key)
+        if existing:
+            return (existing[0], existing[1], str(datetime.fromisoformat(existing[2])))
     
     # Step 1: Check if patient already has a future appointment with this doctor
-    cur.execute("""
-        SELECT 1 FROM appointments
-        WHERE patient_id = ? AND doctor_id = ?
-        AND appointment_datetime >= ? AND status = 'scheduled'
-        LIMIT 1
-    """, (patient_id, doctor_id, now.isoformat()))
-    
-    already_booked = cur.fetchone()
-    if already_booked:
-        conn.close()
+    if repository.has_scheduled_appointment(patient_id, doctor_id, now.isoformat()):
         return "Patient already has a scheduled appointment with this doctor."
 
     # Step 2: Proceed to book next available slot
@@ -176,77 +192,62 @@ async def book_later_appointment(patient_id: int, doctor_id: int):
         appointment_date = (now + timedelta(days=1)).date()
 
     # Fetch doctor's schedule
-    cur.execute("""
-        SELECT start_time, end_time FROM doctor_schedule
-        WHERE doctor_id = ? AND day_of_week = ?
-    """, (doctor_id, schedule_day))
-    schedules = cur.fetchall()
+    schedules = schedule_index.get_schedule(doctor_id, schedule_day)
 
     if not schedules:
-        conn.close()
         return f"No schedule found for this doctor on {schedule_day} day."
 
-    # Try to find an available 15-minute slot
-    for start_str, end_str in schedules:
-        start_dt = datetime.strptime(f"{appointment_date} {start_str}", "%Y-%m-%d %H:%M:%S")
-        end_dt = datetime.strptime(f"{appointment_date} {end_str}", "%Y-%m-%d %H:%M:%S")
+    # One query for everything already booked that day, then pick from the schedule in memory
+    day_start = datetime.combine(appointment_date, datetime.min.time())
+    booked = repository.booked_slots(
+        doctor_id, day_start.isoformat(), (day_start + timedelta(days=1)).isoformat()
+    )
+    # Slots taken concurrently since that read are skipped atomically by reserve_slot
+    slots = free_slots(schedules, appointment_date, booked)
+    slot = repository.reserve_slot(patient_id, doctor_id, [s.isoformat() for s in slots], key)
+    if slot:
+        return (patient_id, doctor_id, str(datetime.fromisoformat(slot)))
 
-        current_slot = start_dt
-        while current_slot + timedelta(minutes=15) <= end_dt:
-            cur.execute("""
-                SELECT 1 FROM appointments
-                WHERE doctor_id = ? AND appointment_datetime = ? AND status = 'scheduled'
-            """, (doctor_id, current_slot.isoformat()))
-            conflict = cur.fetchone()
-
-            if not conflict:
-                # Found available slot
-                cur.execute("""
-                    INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status)
-                    VALUES (?, ?, ?, 'scheduled')
-                """, (patient_id, doctor_id, current_slot.isoformat()))
-                conn.commit()
-                conn.close()
-                return (patient_id, doctor_id, str(current_slot))
-
-            current_slot += timedelta(minutes=15)
-
-    conn.close()
     return "All 15-minute slots are already booked for this doctor."
 
 @activity.defn
-async def add_to_walkin_queue(patient_id: int, doctor_id: int):
-    """Add patient to walk-in queue if not already in the queue with seen = 'no'"""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Check if patient already in queue and not seen yet
-    cur.execute("""
-        SELECT 1 FROM doctor_queue
-        WHERE patient_id = ? AND doctor_id = ? AND (seen IS NULL OR seen = 'no')
-        LIMIT 1
-    """, (patient_id, doctor_id))
-    
-    already_in_queue = cur.fetchone()
-    
-    if already_in_queue:
-        conn.close()
-        return False ## already available
-
-    # Insert into queue
-    cur.execute("""
-        INSERT INTO doctor_queue (patient_id, doctor_id, queued_at, seen)
-        VALUES (?, ?, ?, 'no')
-    """, (patient_id, doctor_id, datetime.now().isoformat()))
-    
-    conn.commit()
-    conn.close()
-    return True ## added
+@in_executor(DB_EXECUTOR)
+def checkpoint_doctor_queue(doctor_id: int, events: list) -> dict:
+    """
+    Persist a batch of queue changes recorded by DoctorQueueWorkflow and return the
+    doctor's consultation statistics afterwards, for the workflow's wait estimates
+    """
+    repository.apply_queue_events(doctor_id, events)
+    return repository.get_service_stats(doctor_id) or prior_stats()
 
 @activity.defn
-async def generate_prescription_slip(data: dict) -> dict:
+@in_executor(DB_EXECUTOR)
+def load_doctor_queue(doctor_id: int) -> list:
+    """The doctor's open queue entries in SQLite, which a newly started DoctorQueueWorkflow takes over"""
+    return repository.open_queue_entries(doctor_id)
+
+class QueueActivities:
+    """Activities that talk to the per-doctor queue workflows, so they hold a Temporal client."""
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    @activity.defn
+    async def join_doctor_queue(self, doctor_id: int, entry: dict):
+        """Add the patient to the doctor's queue workflow, starting it if it isn't running"""
+        await self.client.start_workflow(
+            "DoctorQueueWorkflow",
+            args=[doctor_id],
+            id=f"{DOCTOR_QUEUE_WORKFLOW_ID_PREFIX}{doctor_id}",
+            task_queue=RECEPTION_TASK_QUEUE,
+            start_signal="enqueue",
+            start_signal_args=[entry],
+        )
+
+def render_prescription_slip(data: dict) -> dict:
     """
-    Generate prescription slip from data dictionary
+    Render a prescription slip from data dictionary.
+    Module-level and context-free so it can run on a process pool.
     """
     try:
         data["date"] = datetime.today().strftime('%Y-%m-%d')
@@ -255,27 +256,18 @@ async def generate_prescription_slip(data: dict) -> dict:
         docx_path = os.path.join(OUTPUT_DIR, f"{unique_id}.docx")
         pdf_path = os.path.join(OUTPUT_DIR, f"{unique_id}.pdf")
 
-        template_path = "../prescription/prescription_template.docx"
-        
-        # Check if template exists
-        if not os.path.exists(template_path):
-            raise FileNotFoundError(f"Prescription template not found at {template_path}")
-        
-        doc = Document(template_path)
-
-        # Replace placeholders
-        for p in doc.paragraphs:
-            for key, value in data.items():
-                placeholder = f"{{{{{key}}}}}"
-                if placeholder in p.text:
-                    p.text = p.text.replace(placeholder, str(value))
-        
-        doc.save(docx_path)
-        convert(docx_path, pdf_path)
+        # Compiled once per worker and recompiled only when the template file changes
+        template = get_template(TEMPLATE_PATH)
+
+        if SAVE_PRESCRIPTION_DOCX:
+            template.fill_document(data).save(docx_path)
+        render_pdf(template.fill_layout(data), pdf_path)
 
+        # The filled-in data travels with the slip so the final prescription can be rendered anywhere
         return {
             "unique_id": unique_id,
-            "pdf_url": f"{BASE_URL}/static/prescriptions/{unique_id}.pdf"
+            "pdf_url": f"{BASE_URL}/static/prescriptions/{unique_id}.pdf",
+            "data": data
         }
         
     except KeyError as e:
@@ -285,66 +277,188 @@ async def generate_prescription_slip(data: dict) -> dict:
 
 
 @activity.defn
-async def prescription_with_diagnosis(unique_id: str, diagnosis: str, medicines: list) -> str:
-    # Original draft paths
-    docx_path = os.path.join(OUTPUT_DIR, f"{unique_id}.docx")
-    
-    # Generate new unique ID for final prescription
-    final_unique_id = f"{unique_id}_final"
-    final_docx_path = os.path.join(OUTPUT_DIR, f"{final_unique_id}.docx")
-    final_pdf_path = os.path.join(OUTPUT_DIR, f"{final_unique_id}.pdf")
+async def generate_prescription_slip(data: dict) -> dict:
+    """
+    Generate prescription slip from data dictionary
+    """
+    return await RENDER_EXECUTOR.run(render_prescription_slip, data)
 
-    if not os.path.exists(docx_path):
-        raise FileNotFoundError("Draft prescription not found")
 
-    # Load the original document
-    doc = Document(docx_path)
+def remove_prescription_slip(unique_id: str):
+    """Delete a rendered slip's files; module-level so it can run on a process pool."""
+    for extension in ("pdf", "docx"):
+        path = os.path.join(OUTPUT_DIR, f"{unique_id}.{extension}")
+        if os.path.exists(path):
+            os.remove(path)
 
-    # Locate the 'Rx -' paragraph
-    for i, p in enumerate(doc.paragraphs):
-        if p.text.strip().lower() in {"rx -", "rx:", "rx"}:
-            insert_index = i + 1
-            break
-    else:
-        insert_index = len(doc.paragraphs)
 
-    # Clear existing content after Rx and rebuild properly
-    # Remove paragraphs after Rx
-    paragraphs_to_remove = doc.paragraphs[insert_index:]
-    for p in paragraphs_to_remove:
-        p._element.getparent().remove(p._element)
+@activity.defn
+async def discard_prescription_slip(slip: dict):
+    """
+    Delete a slip rendered ahead of time that the patient turned out not to need
+    """
+    await RENDER_EXECUTOR.run(remove_prescription_slip, slip["unique_id"])
+
 
-    # Add diagnosis first
+def diagnosis_paragraphs(diagnosis: str, medicines: list) -> list:
+    """Paragraphs that follow the "Rx -" heading on a final prescription."""
+    paragraphs = []
     if diagnosis:
-        doc.add_paragraph(f"Diagnosis: {diagnosis}")
-        doc.add_paragraph("")  # Empty line for spacing
-
-    # Add medicines section
+        paragraphs.append(f"Diagnosis: {diagnosis}")
+        paragraphs.append("")  # Empty line for spacing
     if medicines:
-        doc.add_paragraph("Medicines:")
-        for medicine in medicines:
-            doc.add_paragraph(f"- {medicine}")
+        paragraphs.append("Medicines:")
+        paragraphs.extend(f"- {medicine}" for medicine in medicines)
+    return paragraphs
 
-    # Save as final prescription with new unique ID
-    doc.save(final_docx_path)
-    convert(final_docx_path, final_pdf_path)
+
+def render_final_prescription(slip: dict, diagnosis: str, medicines: list) -> str:
+    """
+    Render the final prescription straight from the slip data carried in workflow state,
+    so no draft has to be read back from this worker's disk.
+    """
+    final_unique_id = f"{slip['unique_id']}_final"
+    final_docx_path = os.path.join(OUTPUT_DIR, f"{final_unique_id}.docx")
+    final_pdf_path = os.path.join(OUTPUT_DIR, f"{final_unique_id}.pdf")
+
+    template = get_template(TEMPLATE_PATH)
+    appendix = diagnosis_paragraphs(diagnosis, medicines)
+
+    if SAVE_PRESCRIPTION_DOCX:
+        template.fill_document(slip["data"], appendix).save(final_docx_path)
+    render_pdf(template.fill_layout(slip["data"], appendix), final_pdf_path)
 
     return f"{BASE_URL}/static/prescriptions/{final_unique_id}.pdf"
 
 
 @activity.defn
-async def get_random_diagnosis_and_medicines() -> dict:
+async def prescription_with_diagnosis(slip: dict, diagnosis: str, medicines: list) -> str:
+    return await RENDER_EXECUTOR.run(render_final_prescription, slip, diagnosis, medicines)
+
+
+BULK_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "bulk")
+# Longer error messages are cut, which keeps a batch's failures small enough to heartbeat
+MAX_BULK_ERROR_LENGTH = 200
+
+
+def read_bulk_lines(source: str, position: int, limit: int) -> tuple:
+    """
+    Read up to `limit` non-blank lines of the JSON lines file `source` from byte `position`.
+    Returns the lines and the position after the last one, where the next batch starts.
+    """
+    lines = []
+    with open(source, "rb") as f:
+        f.seek(position)
+        while len(lines) < limit:
+            line = f.readline()
+            if not line:
+                break
+            if line.strip():
+                lines.append(line.decode())
+        return lines, f.tell()
+
+
+def render_prescription_chunk(lines: list, output_dir: str) -> list:
+    """
+    Render (index, JSON line) pairs straight to PDFs in `output_dir`, with no DOCX copy.
+    A record is a slip ({"unique_id", "data"}) with optional "diagnosis" and "medicines",
+    or a ConsultationWorkflow result. Returns an error message or None per record.
+    """
+    template = get_template(TEMPLATE_PATH)
+    today = datetime.today().strftime('%Y-%m-%d')
+    errors = []
+    for index, line in lines:
+        try:
+            record = json.loads(line)
+            slip = record.get("prescription_slip", record)
+            data = {"date": today, **slip["data"]}
+            missing = template.keys - data.keys()
+            if missing:
+                raise ValueError(f"Missing required patient data field: {', '.join(sorted(missing))}")
+            name = slip.get("unique_id") or f"{index:06d}"
+            appendix = None
+            if record.get("diagnosis") or record.get("medicines"):
+                appendix = diagnosis_paragraphs(record.get("diagnosis"), record.get("medicines") or [])
+                name += "_final"
+            render_pdf(template.fill_layout(data, appendix), os.path.join(output_dir, f"{name}.pdf"))
+            errors.append(None)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}"[:MAX_BULK_ERROR_LENGTH])
+    return errors
+
+
+def write_bulk_failures(path: str, failed: list):
+    """Replace a batch's failures file, or remove it when a rerun of the batch had none."""
+    if not failed:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    with open(path, "w") as f:
+        for failure in failed:
+            f.write(json.dumps(failure) + "\n")
+
+
+@activity.defn
+async def render_prescription_batch(source: str, name: str, position: int, first_index: int) -> dict:
+    """
+    Render the next BULK_RENDER_BATCH_SIZE records of the JSON lines file `source`, starting at
+    byte `position`, into BULK_OUTPUT_DIR/<name> on the worker's bulk render pool. Progress is
+    heartbeated in record order, so a retry after a worker crash resumes with the first record
+    not yet written. Records that fail to render are written to a failures file per batch
+    instead of failing it; the result only counts them.
+    """
+    details = activity.info().heartbeat_details
+    done, failed = (details[0], details[1]) if details else (0, [])
+    resumed_from = done
+    output_dir = os.path.join(BULK_OUTPUT_DIR, os.path.basename(name))
+    os.makedirs(output_dir, exist_ok=True)
+
+    lines, next_position = await BULK_RENDER_EXECUTOR.run(read_bulk_lines, source, position, BULK_RENDER_BATCH_SIZE)
+    indexed = list(enumerate(lines, start=first_index))[done:]
+    chunks = [indexed[i:i + BULK_RENDER_CHUNK_SIZE] for i in range(0, len(indexed), BULK_RENDER_CHUNK_SIZE)]
+    # Enough chunks in flight to keep every process busy, collected in order for the heartbeat
+    in_flight = collections.deque()
+    try:
+        for chunk in chunks:
+            task = asyncio.ensure_future(BULK_RENDER_EXECUTOR.run(render_prescription_chunk, chunk, output_dir))
+            in_flight.append((chunk, task))
+            while len(in_flight) > 2 * BULK_RENDER_PROCESSES or (chunk is chunks[-1] and in_flight):
+                finished, task = in_flight[0]
+                # Shielded so a cancelled activity still holds the task and waits for it below
+                errors = await asyncio.shield(task)
+                in_flight.popleft()
+                for (index, _), error in zip(finished, errors):
+                    if error:
+                        failed.append({"index": index, "error": error})
+                done += len(finished)
+                activity.heartbeat(done, failed)
+    finally:
+        # A process can't be stopped mid-record, so a cancelled or timed out batch waits for the
+        # chunks already handed out rather than leave them writing PDFs after it has gone
+        await asyncio.gather(*(task for _, task in in_flight), return_exceptions=True)
+
+    await BULK_RENDER_EXECUTOR.run(
+        write_bulk_failures, os.path.join(output_dir, f"failures-{first_index:09d}.jsonl"), failed
+    )
+    return {
+        "records": len(lines),
+        "rendered": len(lines) - len(failed),
+        "failed": len(failed),
+        "next_position": next_position,
+        "resumed_from": resumed_from,
+    }
+
+
+@activity.defn
+@in_executor(DB_EXECUTOR)
+def get_random_diagnosis_and_medicines() -> dict:
     """
     Get a random diagnosis and its associated medicines from the database
     Returns: dict with 'diagnosis' and 'medicines' (as list)
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    
     try:
         # Get all diagnosis and medicines from the table
-        cur.execute("SELECT diagnosis, medicines FROM diagnosis_medicines")
-        all_records = cur.fetchall()
+        all_records = repository.list_diagnoses()
         
         if not all_records:
             # Fallback if no records found
@@ -371,7 +485,4 @@ async def get_random_diagnosis_and_medicines() -> dict:
         return {
             "diagnosis": "General Health Check",
             "medicines": ["As advised by doctor"]
-        }
-    
-    finally:
-        conn.close()
\ No newline at end of file
+        }
\ No newline at end of file
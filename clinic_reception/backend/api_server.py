@@ -1,17 +1,44 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from temporalio.client import Client
+from typing import Optional
 from uuid import uuid4
 import re
+import json
 import asyncio
 from fastapi.staticfiles import StaticFiles
 import os
 
+from temporalio.service import RPCError, RPCStatusCode
+
+from config import RECEPTION_TASK_QUEUE, STEP_WAIT_TIMEOUT, DOCTOR_QUEUE_WORKFLOW_ID_PREFIX, STATUS_STREAM_KEEPALIVE
+from temporal_client import TemporalClientPool
+from status_stream import StatusStreams
+from session_registry import SessionRegistry
+import telemetry
+
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # go one level up
 STATIC_DIR = os.path.join(BASE_DIR, "static")
 
-app = FastAPI()
+# One pool of Temporal clients per API process, reused by every request
+temporal_clients = TemporalClientPool()
+# One watcher per followed workflow, shared by all of its stream subscribers
+status_streams = StatusStreams(temporal_clients)
+# Live sessions by workflow ID, shared with the other API processes
+sessions = SessionRegistry()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Before the clients connect, so they get the tracing interceptor
+    telemetry.setup("clinic-api")
+    await temporal_clients.start()
+    yield
+    await status_streams.close()
+    await temporal_clients.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -23,6 +50,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def trace_request(request: Request, call_next):
+    """One span per request; the Temporal calls it makes carry it into the workflow and its activities."""
+    with telemetry.span(f"{request.method} {request.url.path}") as span:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        if span is not None and route is not None:
+            # Named by route, not by path, so workflow IDs don't end up in span names
+            span.update_name(f"{request.method} {route.path}")
+            span.set_attribute("http.status_code", response.status_code)
+        return response
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -41,9 +80,38 @@ class DecisionRequest(BaseModel):
     workflow_id: str
     decision: str
 
-# Store active workflows for decision making
-active_workflows = {}
-prescription_messages_sent = {}
+class SeenRequest(BaseModel):
+    patient_id: Optional[int] = None
+
+async def session_handle(workflow_id: str):
+    """The workflow handle of a live session, or None if the session is unknown or expired."""
+    if not await sessions.touch(workflow_id):
+        return None
+    return (await temporal_clients.get()).get_workflow_handle(workflow_id)
+
+async def wait_for_step(handle, steps):
+    """Wait until the workflow reaches one of `steps` (or completes) and return its status."""
+    return await handle.execute_update("wait_for_step", args=[steps, STEP_WAIT_TIMEOUT])
+
+def wait_range(wait_time_p90):
+    return f" (up to {wait_time_p90})" if wait_time_p90 is not None else ""
+
+@app.get("/health")
+async def health():
+    return {
+        "temporal": temporal_clients.stats(),
+        "status_streams": status_streams.stats(),
+        "sessions": await sessions.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics of this API process, when PROMETHEUS_METRICS is on."""
+    exposition = telemetry.metrics_exposition()
+    if exposition is None:
+        return Response(status_code=404)
+    body, content_type = exposition
+    return Response(body, media_type=content_type)
 
 @app.post("/chat")
 async def chat(req: ChatRequest):
@@ -52,25 +120,24 @@ async def chat(req: ChatRequest):
         return {"response": "Please provide the doctor name."}
 
     try:
-        client = await Client.connect("localhost:7233")
+        client = await temporal_clients.get()
         workflow_id = f"reception-{uuid4()}"
 
         handle = await client.start_workflow(
             "ReceptionWorkflow",
             args=[doctor_name],
             id=workflow_id,
-            task_queue="reception-task-queue"
+            task_queue=RECEPTION_TASK_QUEUE
         )
 
-        active_workflows[workflow_id] = handle
-        await asyncio.sleep(2)
+        await sessions.open(workflow_id)
 
         try:
-            status = await handle.query("get_status")
+            status = await wait_for_step(handle, ["get_phone"])
 
-            if not status.get("doctor_available"):
-                result = await handle.result()
-                return {"response": f"{result}"}
+            if status.get("step") == "completed":
+                await sessions.close(workflow_id)
+                return {"response": f"{status['result']}"}
 
             if status.get("step") == "get_phone":
                 return {
@@ -80,7 +147,13 @@ async def chat(req: ChatRequest):
                 }
 
         except Exception as e:
-            return {"response": f"Error checking doctor availability: {str(e)}"}
+            # An unavailable doctor can end the workflow before the update reaches it
+            try:
+                result = await handle.result()
+                await sessions.close(workflow_id)
+                return {"response": f"{result}"}
+            except:
+                return {"response": f"Error checking doctor availability: {str(e)}"}
 
     except Exception as e:
         return {"response": f"System error: {str(e)}"}
@@ -90,20 +163,18 @@ async def provide_phone(req: PhoneRequest):
     workflow_id = req.workflow_id
     phone_number = req.phone_number.strip()
 
-    if workflow_id not in active_workflows:
+    handle = await session_handle(workflow_id)
+    if handle is None:
         return {"response": "Session expired. Please start over."}
 
     if not re.match(r'^\+?[\d\s\-\(\)]+$', phone_number):
         return {"response": "Invalid phone number format. Please enter a valid phone number."}
 
     try:
-        handle = active_workflows[workflow_id]
-
         await handle.signal("provide_phone_number", phone_number)
-        await asyncio.sleep(3)
 
         try:
-            status = await handle.query("get_status")
+            status = await wait_for_step(handle, ["register_patient", "make_decision", "generate_prescription"])
 
             if status.get("step") == "register_patient":
                 return {
@@ -115,10 +186,12 @@ async def provide_phone(req: PhoneRequest):
             if status.get("step") == "make_decision" and status.get("wait_time") is not None:
                 patient_name = status.get("patient_info", {}).get("name", "Patient")
                 wait_time = status["wait_time"]
+                wait_time_p90 = status.get("wait_time_p90")
                 return {
-                    "response": f"Welcome, {patient_name}!\n No appointment found for today. Current wait time: {wait_time} minutes.\n\n Would you like to:\n• Continue (wait in queue)\n• Book for later",
+                    "response": f"Welcome, {patient_name}!\n No appointment found for today. Current wait time: about {wait_time} minutes{wait_range(wait_time_p90)}.\n\n Would you like to:\n• Continue (wait in queue)\n• Book for later",
                     "workflow_id": workflow_id,
                     "wait_time": wait_time,
+                    "wait_time_p90": wait_time_p90,
                     "patient_name": patient_name,
                     "requires_decision": True
                 }
@@ -132,17 +205,14 @@ async def provide_phone(req: PhoneRequest):
                     "status": "generating_prescription"
                 }
 
-            try:
-                result = await asyncio.wait_for(handle.result(), timeout=0.1)
-                del active_workflows[workflow_id]
-                return {"response": f"{result}"}
-            except asyncio.TimeoutError:
-                pass
+            if status.get("step") == "completed":
+                await sessions.close(workflow_id)
+                return {"response": f"{status['result']}"}
 
         except Exception as e:
             try:
                 result = await handle.result()
-                del active_workflows[workflow_id]
+                await sessions.close(workflow_id)
                 return {"response": f"{result}"}
             except:
                 return {"response": f"Error processing phone number: {str(e)}"}
@@ -154,15 +224,14 @@ async def provide_phone(req: PhoneRequest):
 async def register_patient(req: RegistrationRequest):
     workflow_id = req.workflow_id
 
-    if workflow_id not in active_workflows:
+    handle = await session_handle(workflow_id)
+    if handle is None:
         return {"response": "Session expired. Please start over."}
 
     if not all([req.name.strip(), req.gender.strip(), req.age.strip(), req.address.strip()]):
         return {"response": "All registration fields are required. Please fill in all details."}
 
     try:
-        handle = active_workflows[workflow_id]
-
         await handle.signal("provide_patient_info", {
             "name": req.name.strip(),
             "gender": req.gender.strip(),
@@ -170,33 +239,30 @@ async def register_patient(req: RegistrationRequest):
             "address": req.address.strip()
         })
 
-        await asyncio.sleep(4)
-
         try:
-            status = await handle.query("get_status")
+            status = await wait_for_step(handle, ["make_decision"])
 
             if status.get("step") == "make_decision" and status.get("wait_time") is not None:
                 patient_name = status.get("patient_info", {}).get("name", "Patient")
                 wait_time = status["wait_time"]
+                wait_time_p90 = status.get("wait_time_p90")
                 return {
-                    "response": f"Registration successful!\n Welcome, {patient_name}!\n No appointment found for today. Current wait time: {wait_time} minutes.\n\n Would you like to:\n• Continue (wait in queue)\n• Book for later",
+                    "response": f"Registration successful!\n Welcome, {patient_name}!\n No appointment found for today. Current wait time: about {wait_time} minutes{wait_range(wait_time_p90)}.\n\n Would you like to:\n• Continue (wait in queue)\n• Book for later",
                     "workflow_id": workflow_id,
                     "wait_time": wait_time,
+                    "wait_time_p90": wait_time_p90,
                     "patient_name": patient_name,
                     "requires_decision": True
                 }
 
-            try:
-                result = await asyncio.wait_for(handle.result(), timeout=0.1)
-                del active_workflows[workflow_id]
-                return {"response": f"Registration successful!\n {result}"}
-            except asyncio.TimeoutError:
-                pass
+            if status.get("step") == "completed":
+                await sessions.close(workflow_id)
+                return {"response": f"Registration successful!\n {status['result']}"}
 
         except Exception as e:
             try:
                 result = await handle.result()
-                del active_workflows[workflow_id]
+                await sessions.close(workflow_id)
                 return {"response": f"Registration successful!\n {result}"}
             except:
                 return {"response": f"Error processing registration: {str(e)}"}
@@ -209,32 +275,33 @@ async def make_decision(req: DecisionRequest):
     workflow_id = req.workflow_id
     decision = req.decision.lower()
 
-    if workflow_id not in active_workflows:
+    handle = await session_handle(workflow_id)
+    if handle is None:
         return {"response": "Session expired. Please start over."}
 
     if decision not in ["continue", "book_later"]:
         return {"response": "Invalid choice. Please select 'continue' or 'book_later'."}
 
     try:
-        handle = active_workflows[workflow_id]
-
         if decision == "continue":
             await handle.signal("make_decision", decision)
-            await asyncio.sleep(1)
 
             try:
-                status = await handle.query("get_status")
-                if status.get("step") == "add_to_queue":
-                    await asyncio.sleep(2)
-                    status = await handle.query("get_status")
-                    if status.get("step") == "generate_prescription":
-                        return {
-                            "response": "Added to queue successfully!\n Generating your prescription slip...\n Please wait while we prepare your slip.",
-                            "workflow_id": workflow_id,
-                            "requires_prescription_check": True,
-                            "status": "generating_prescription"
-                        }
-        
+                status = await wait_for_step(handle, ["generate_prescription"])
+                if status.get("step") == "generate_prescription":
+                    return {
+                        "response": "Added to queue successfully!\n Generating your prescription slip...\n Please wait while we prepare your slip.",
+                        "workflow_id": workflow_id,
+                        "requires_prescription_check": True,
+                        "status": "generating_prescription"
+                    }
+                return {
+                    "response": "Processing your request...\n We'll notify you when your prescription is ready.",
+                    "workflow_id": workflow_id,
+                    "requires_prescription_check": True,
+                    "status": "processing"
+                }
+
             except Exception:
                 return {
                     "response": "Processing your request...\n We'll notify you when your prescription is ready.",
@@ -245,11 +312,10 @@ async def make_decision(req: DecisionRequest):
 
         else:
             await handle.signal("make_decision", decision)
-            await asyncio.sleep(3)
 
             try:
                 result = await handle.result()
-                del active_workflows[workflow_id]
+                await sessions.close(workflow_id)
                 return {"response": f"Appointment scheduled!\n {result}"}
             except Exception as e:
                 return {"response": f"Error booking appointment: {str(e)}"}
@@ -259,18 +325,14 @@ async def make_decision(req: DecisionRequest):
 
 @app.get("/check_prescription/{workflow_id}")
 async def check_prescription_status(workflow_id: str):
-    if workflow_id not in active_workflows:
+    handle = await session_handle(workflow_id)
+    if handle is None:
         return {"response": "Workflow not found or completed."}
 
     try:
-        handle = active_workflows[workflow_id]
-
         try:
             result = await asyncio.wait_for(handle.result(), timeout=0.1)
-            del active_workflows[workflow_id]
-            # Clean up the tracking when workflow completes
-            if workflow_id in prescription_messages_sent:
-                del prescription_messages_sent[workflow_id]
+            await sessions.close(workflow_id)
             return {
                 "status": "completed",
                 "response": f"{result}"
@@ -290,9 +352,8 @@ async def check_prescription_status(workflow_id: str):
         elif current_step == "generate_prescription":
             prescription_slip = status.get("prescription_slip")
             if prescription_slip and prescription_slip.get("pdf_url"):
-                # Check if we've already sent the prescription ready message
-                if workflow_id not in prescription_messages_sent:
-                    prescription_messages_sent[workflow_id] = True
+                # Only the first poll announces the slip, whichever API process serves it
+                if await sessions.announce_prescription(workflow_id):
                     return {
                         "status": "prescription_ready",
                         "response": f"Your initial prescription slip is ready!\n Download: {prescription_slip['pdf_url']}\n",
@@ -304,7 +365,10 @@ async def check_prescription_status(workflow_id: str):
                         "status": "consultation_in_progress",
                         "response": "Doctor consultation in progress...\n Generating diagnosis and finalizing prescription..."
                     }
-
+            return {
+                "status": "processing",
+                "response": "Generating your prescription slip...\n Please wait..."
+            }
 
         else:
             return {
@@ -316,4 +380,77 @@ async def check_prescription_status(workflow_id: str):
         return {
             "status": "error",
             "response": f"Error checking prescription status: {str(e)}"
-        }
\ No newline at end of file
+        }
+async def session_finished(workflow_id: str):
+    await sessions.close(workflow_id)
+
+def sse_event(event_id: int, event: dict) -> str:
+    return f"id: {event_id}\ndata: {json.dumps(event)}\n\n"
+
+@app.get("/status_stream/{workflow_id}")
+async def status_stream(workflow_id: str, request: Request):
+    """
+    Server-sent events for one reception as its status changes (adding_to_queue, prescription_ready,
+    diagnosis_generation, finalizing_prescription, completed or error), ending after the last one.
+    A reconnecting EventSource sends Last-Event-ID and only gets what it missed.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if workflow_id not in status_streams.watchers and not await sessions.touch(workflow_id):
+        gone = {"status": "error", "response": "Workflow not found or completed."}
+        return StreamingResponse(iter([sse_event(0, gone)]), media_type="text/event-stream", headers=headers)
+
+    last_event_id = request.headers.get("last-event-id", "0")
+    watcher, queue = await status_streams.subscribe(
+        workflow_id, int(last_event_id) if last_event_id.isdigit() else 0, on_completed=session_finished
+    )
+
+    async def events():
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout=STATUS_STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if item is None:
+                    break
+                yield sse_event(*item)
+        finally:
+            status_streams.unsubscribe(watcher, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+async def doctor_queue_handle(doctor_id: int):
+    client = await temporal_clients.get()
+    return client.get_workflow_handle(f"{DOCTOR_QUEUE_WORKFLOW_ID_PREFIX}{doctor_id}")
+
+@app.get("/doctor/{doctor_id}/queue")
+async def doctor_queue(doctor_id: int):
+    """The doctor's live walk-in queue, in order, as held by their queue workflow."""
+    try:
+        return await (await doctor_queue_handle(doctor_id)).query("get_queue")
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            # Nobody has joined this doctor's queue yet
+            return {"doctor_id": doctor_id, "length": 0, "served": 0, "patients": []}
+        return {"status": "error", "response": f"Error reading queue: {str(e)}"}
+
+@app.get("/doctor/{doctor_id}/queue/{patient_id}")
+async def queue_position(doctor_id: int, patient_id: int):
+    try:
+        return await (await doctor_queue_handle(doctor_id)).query("get_position", patient_id)
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            return {"position": None, "wait_time": None}
+        return {"status": "error", "response": f"Error reading queue: {str(e)}"}
+
+@app.post("/doctor/{doctor_id}/seen")
+async def patient_seen(doctor_id: int, req: SeenRequest):
+    """Called from the doctor's side: the patient (default: the next in line) has been seen."""
+    try:
+        await (await doctor_queue_handle(doctor_id)).signal("patient_seen", req.patient_id)
+        return {"response": "Queue updated."}
+    except RPCError as e:
+        if e.status == RPCStatusCode.NOT_FOUND:
+            return {"response": "This doctor has no walk-in queue yet."}
+        return {"response": f"Error updating queue: {str(e)}"}
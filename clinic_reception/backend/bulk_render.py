@@ -0,0 +1,55 @@
+"""
+Start a bulk prescription render and wait for its result.
+
+The records file is JSON lines, one slip per line as the reception returns
+them ({"unique_id", "data", ...}, optionally with "diagnosis" and
+"medicines") or one ConsultationWorkflow result. The render workers read it
+themselves, so it must be at the same path on their hosts. PDFs are written
+to static/prescriptions/bulk/<name>/, with the records that failed listed in
+failures-*.jsonl beside them; the same name picks up a run already in
+progress instead of starting another.
+
+    cd backend
+    python bulk_render.py records.jsonl --name 2025-07-03-reprint
+"""
+import argparse
+import asyncio
+import os
+import re
+
+from temporalio.client import Client
+from temporalio.common import WorkflowIDConflictPolicy
+
+from config import TEMPORAL_ADDRESS, TEMPORAL_NAMESPACE, RECEPTION_TASK_QUEUE
+from workflows import BulkPrescriptionRenderWorkflow
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("records", help="JSON lines file of prescription records")
+    parser.add_argument("--name", required=True, help="output directory name, also part of the workflow ID")
+    args = parser.parse_args()
+    if not re.fullmatch(r"[\w.-]+", args.name):
+        parser.error("--name may only contain letters, digits, '_', '.' and '-'")
+    if not os.path.isfile(args.records):
+        parser.error(f"{args.records} is not a file")
+
+    source = os.path.abspath(args.records)
+    client = await Client.connect(TEMPORAL_ADDRESS, namespace=TEMPORAL_NAMESPACE)
+    handle = await client.start_workflow(
+        BulkPrescriptionRenderWorkflow.run,
+        args=[source, args.name],
+        id=f"bulk-render-{args.name}",
+        task_queue=RECEPTION_TASK_QUEUE,
+        id_conflict_policy=WorkflowIDConflictPolicy.USE_EXISTING,
+    )
+    print(f"Rendering {source} as workflow {handle.id}")
+    result = await handle.result()
+    output_dir = f"static/prescriptions/bulk/{result['name']}/"
+    print(f"Rendered {result['rendered']} of {result['records']} to {output_dir}")
+    if result["failed"]:
+        print(f"{result['failed']} failed; see {output_dir}failures-*.jsonl")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+import os
+
+# Temporal connection settings shared by the API server and the workers
+TEMPORAL_ADDRESS = os.getenv("TEMPORAL_ADDRESS", "localhost:7233")
+TEMPORAL_NAMESPACE = os.getenv("TEMPORAL_NAMESPACE", "default")
+RECEPTION_TASK_QUEUE = os.getenv("RECEPTION_TASK_QUEUE", "reception-task-queue")
+# Slip rendering is CPU heavy, so it has its own queue and can be scaled separately from DB lookups
+PRESCRIPTION_RENDER_TASK_QUEUE = os.getenv("PRESCRIPTION_RENDER_TASK_QUEUE", "prescription-render")
+# Consultations run as child workflows on their own queue, with the reception's workflow ID plus this suffix
+CONSULTATION_TASK_QUEUE = os.getenv("CONSULTATION_TASK_QUEUE", "consultation-task-queue")
+CONSULTATION_WORKFLOW_ID_SUFFIX = os.getenv("CONSULTATION_WORKFLOW_ID_SUFFIX", "-consultation")
+
+# Number of client channels the API process keeps open, and how often they are health checked
+TEMPORAL_CLIENT_POOL_SIZE = int(os.getenv("TEMPORAL_CLIENT_POOL_SIZE", "1"))
+TEMPORAL_HEALTH_CHECK_INTERVAL = float(os.getenv("TEMPORAL_HEALTH_CHECK_INTERVAL", "15"))
+
+# Each doctor's live walk-in queue is a long-running workflow with this ID prefix plus the doctor ID.
+# It writes queue changes to SQLite in batches of up to QUEUE_CHECKPOINT_BATCH_SIZE, at most
+# QUEUE_CHECKPOINT_INTERVAL seconds late, and continues as new past QUEUE_MAX_HISTORY_EVENTS.
+DOCTOR_QUEUE_WORKFLOW_ID_PREFIX = os.getenv("DOCTOR_QUEUE_WORKFLOW_ID_PREFIX", "doctor-queue-")
+QUEUE_CHECKPOINT_BATCH_SIZE = int(os.getenv("QUEUE_CHECKPOINT_BATCH_SIZE", "20"))
+QUEUE_CHECKPOINT_INTERVAL = float(os.getenv("QUEUE_CHECKPOINT_INTERVAL", "10"))
+QUEUE_MAX_HISTORY_EVENTS = int(os.getenv("QUEUE_MAX_HISTORY_EVENTS", "10000"))
+# Walk-in wait estimates learn each doctor's consultation time, starting from AVG_CONSULTATION_MINUTES.
+# WAIT_ESTIMATE_ALPHA weighs the newest consultation; longer gaps than MAX_CONSULTATION_MINUTES
+# (breaks, shift changes) are not counted. Booked appointments within the horizon (hours) go first.
+AVG_CONSULTATION_MINUTES = int(os.getenv("AVG_CONSULTATION_MINUTES", "15"))
+WAIT_ESTIMATE_ALPHA = float(os.getenv("WAIT_ESTIMATE_ALPHA", "0.1"))
+MAX_CONSULTATION_MINUTES = float(os.getenv("MAX_CONSULTATION_MINUTES", "120"))
+WAIT_ESTIMATE_HORIZON_HOURS = float(os.getenv("WAIT_ESTIMATE_HORIZON_HOURS", "12"))
+
+# The quick SQLite calls of a reception (doctor availability, patient lookup, registration, appointment
+# check, wait estimate) run as local activities on the workflow worker, saving a server round trip and
+# several history events each. Set to false to run them as regular activities on the DB workers; only
+# switch it with no receptions in flight, since their histories record which kind was used.
+RECEPTION_LOCAL_ACTIVITIES = os.getenv("RECEPTION_LOCAL_ACTIVITIES", "true").lower() in ("1", "true", "yes")
+
+# Upper bound on how long an API request waits for the workflow to reach its next interactive step
+STEP_WAIT_TIMEOUT = float(os.getenv("STEP_WAIT_TIMEOUT", "15"))
+# Reception sessions of the API tier live in this SQLite file, shared by every API process on the host,
+# and expire after SESSION_TTL seconds without a request
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "../sessions.db")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+
+# Status streams follow each workflow with one long wait per change, renewed after this many seconds,
+# send subscribers a keep-alive comment this often, and stop following a workflow once it has had no
+# subscribers for STATUS_STREAM_IDLE_TIMEOUT seconds (long enough for an EventSource to reconnect)
+STATUS_STREAM_WAIT_TIMEOUT = float(os.getenv("STATUS_STREAM_WAIT_TIMEOUT", "60"))
+STATUS_STREAM_KEEPALIVE = float(os.getenv("STATUS_STREAM_KEEPALIVE", "15"))
+STATUS_STREAM_IDLE_TIMEOUT = float(os.getenv("STATUS_STREAM_IDLE_TIMEOUT", "30"))
+
+# Prescriptions are rendered straight to PDF; DOCX copies are only written when this is enabled
+SAVE_PRESCRIPTION_DOCX = os.getenv("SAVE_PRESCRIPTION_DOCX", "true").lower() in ("1", "true", "yes")
+
+# Blocking work runs off the worker event loop: SQLite calls on the DB pool, slip rendering on the
+# render pool ("process" or "thread"). PyMuPDF is not thread-safe, so rendering defaults to processes;
+# threads save their memory on small hosts. Each worker's activity slots cover its pool plus some queueing.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+RENDER_POOL_SIZE = int(os.getenv("RENDER_POOL_SIZE", str(os.cpu_count() or 2)))
+RENDER_POOL_KIND = os.getenv("RENDER_POOL_KIND", "process")
+MAX_CONCURRENT_DB_ACTIVITIES = int(os.getenv("MAX_CONCURRENT_DB_ACTIVITIES", str(2 * DB_POOL_SIZE)))
+MAX_CONCURRENT_RENDER_ACTIVITIES = int(os.getenv("MAX_CONCURRENT_RENDER_ACTIVITIES", str(2 * RENDER_POOL_SIZE)))
+# Bulk prescription renders (reprints, end-of-day archives) have their own queue, taken one at a time by each
+# render worker so live slips keep the render pool. A bulk activity reads up to BULK_RENDER_BATCH_SIZE
+# records from the source file and renders them on the worker's BULK_RENDER_PROCESSES processes, handing
+# them out BULK_RENDER_CHUNK_SIZE at a time; the workflow continues as new every BULK_RENDER_BATCHES_PER_RUN.
+BULK_RENDER_TASK_QUEUE = os.getenv("BULK_RENDER_TASK_QUEUE", "prescription-bulk-render")
+BULK_RENDER_PROCESSES = int(os.getenv("BULK_RENDER_PROCESSES", str(os.cpu_count() or 2)))
+BULK_RENDER_BATCH_SIZE = int(os.getenv("BULK_RENDER_BATCH_SIZE", "500"))
+BULK_RENDER_CHUNK_SIZE = int(os.getenv("BULK_RENDER_CHUNK_SIZE", "20"))
+BULK_RENDER_BATCHES_PER_RUN = int(os.getenv("BULK_RENDER_BATCHES_PER_RUN", "50"))
+EXECUTOR_STATS_INTERVAL = float(os.getenv("EXECUTOR_STATS_INTERVAL", "60"))
+
+# SQLite tuning: WAL lets readers run alongside the single writer, NORMAL sync is durable in WAL mode
+DB_PATH = os.getenv("CLINIC_DB_PATH", "../clinic.db")
+DB_JOURNAL_MODE = os.getenv("DB_JOURNAL_MODE", "WAL")
+DB_SYNCHRONOUS = os.getenv("DB_SYNCHRONOUS", "NORMAL")
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Workers answer doctor schedule lookups from memory and check the schedule's data version at most
+# this often (seconds); send SIGHUP to a worker to reload immediately
+SCHEDULE_VERSION_CHECK_INTERVAL = float(os.getenv("SCHEDULE_VERSION_CHECK_INTERVAL", "5"))
+
+# Patient records by phone, cached per worker process that looks patients up: entry limit and lifetime
+# in seconds. Each cache checks the patients data version at most every PATIENT_CACHE_VERSION_CHECK_INTERVAL
+# seconds and empties itself when a record was changed or deleted, by any process.
+PATIENT_CACHE_SIZE = int(os.getenv("PATIENT_CACHE_SIZE", "10000"))
+PATIENT_CACHE_TTL = float(os.getenv("PATIENT_CACHE_TTL", "300"))
+PATIENT_CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("PATIENT_CACHE_VERSION_CHECK_INTERVAL", "5"))
+
+# Telemetry (backend/telemetry.py), all off by default. TRACING_EXPORTER is "none", "otlp" (a local
+# collector at OTEL_EXPORTER_OTLP_ENDPOINT, default localhost:4317), "console" or "file" (JSON lines in
+# TRACING_FILE). With PROMETHEUS_METRICS on, the API serves /metrics and each worker process serves them on
+# WORKER_METRICS_PORT. TEMPORAL_METRICS_ADDRESS (host:port) additionally exposes the Temporal SDK's own
+# worker metrics, task slot usage among them.
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "../traces.jsonl")
+PROMETHEUS_METRICS = os.getenv("PROMETHEUS_METRICS", "false").lower() in ("1", "true", "yes")
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+TEMPORAL_METRICS_ADDRESS = os.getenv("TEMPORAL_METRICS_ADDRESS", "")
@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from config import DB_POOL_SIZE, RENDER_POOL_SIZE, RENDER_POOL_KIND, BULK_RENDER_PROCESSES
+from prescription_template import TEMPLATE_PATH, get_template
+from telemetry import pool_task
+
+
+class InstrumentedExecutor:
+    """
+    A bounded executor that keeps blocking work off the worker event loop
+    and tracks how much work is in flight and waiting for a free worker.
+    `factory` builds the pool, and builds it again if a process pool breaks.
+    """
+
+    def __init__(self, name: str, factory, max_workers: int):
+        self.name = name
+        self.factory = factory
+        self.executor = factory()
+        self.max_workers = max_workers
+        self.is_thread_pool = isinstance(self.executor, ThreadPoolExecutor)
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+
+    async def run(self, fn, *args):
+        with pool_task(self.name, getattr(fn, "__name__", "call")):
+            # Thread pools get the caller's context so activity.info() keeps working and
+            # spans started in the thread nest under this one; process pools can't carry
+            # it, so their functions must not rely on it
+            if self.is_thread_pool:
+                fn = functools.partial(contextvars.copy_context().run, fn)
+
+            self.submitted += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            executor = self.executor
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+            except BrokenExecutor:
+                self.failed += 1
+                # A process that died (out of memory, a crash in native code) breaks the whole
+                # pool; replace it once so later work doesn't fail with it
+                if self.executor is executor:
+                    self.executor = self.factory()
+                    self.restarts += 1
+                    executor.shutdown(wait=False)
+                raise
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+            self.completed += 1
+            return result
+
+    async def warm_up(self):
+        """Start every worker of a process pool now, so the first jobs don't wait for a new interpreter."""
+        if not self.is_thread_pool:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(self.executor, os.getpid) for _ in range(self.max_workers)))
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "queue_depth": max(0, self.in_flight - self.max_workers),
+            "peak_in_flight": self.peak_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "restarts": self.restarts,
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+def render_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    A process pool for prescription rendering. Processes are spawned, not forked, since the
+    worker already runs the Temporal core's threads, and each compiles the template before
+    taking work.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=get_template,
+        initargs=(TEMPLATE_PATH,),
+    )
+
+
+def _render_pool():
+    if RENDER_POOL_KIND == "process":
+        return render_process_pool(RENDER_POOL_SIZE)
+    return ThreadPoolExecutor(max_workers=RENDER_POOL_SIZE, thread_name_prefix="render")
+
+
+DB_EXECUTOR = InstrumentedExecutor(
+    "db", functools.partial(ThreadPoolExecutor, max_workers=DB_POOL_SIZE, thread_name_prefix="db"), DB_POOL_SIZE
+)
+RENDER_EXECUTOR = InstrumentedExecutor("render", _render_pool, RENDER_POOL_SIZE)
+# Bulk renders get processes of their own so a long batch doesn't hold up live slips
+BULK_RENDER_EXECUTOR = InstrumentedExecutor(
+    "bulk_render", functools.partial(render_process_pool, BULK_RENDER_PROCESSES), BULK_RENDER_PROCESSES
+)
+
+EXECUTORS = [DB_EXECUTOR, RENDER_EXECUTOR, BULK_RENDER_EXECUTOR]
+
+
+def in_executor(executor: InstrumentedExecutor):
+    """Turn a blocking function into a coroutine function that runs on `executor`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args):
+            return await executor.run(fn, *args)
+        return wrapper
+    return decorator
+
+
+def executor_stats() -> dict:
+    return {executor.name: executor.stats() for executor in EXECUTORS}
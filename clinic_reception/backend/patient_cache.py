@@ -0,0 +1,106 @@
+"""
+Worker-side cache of patient records keyed by phone number.
+
+Returning patients make up most sessions, so their lookup is served from
+memory. Entries expire after PATIENT_CACHE_TTL seconds and the least recently
+used ones are evicted beyond PATIENT_CACHE_SIZE. register_patient writes new
+records through; ReceptionWorkflow runs it where it runs the lookups, so a
+fresh registration isn't looked up again in that process. Misses are not
+cached: an unknown phone is about to be registered, possibly by another
+worker.
+
+Other processes see a registration on their first lookup of it, so no cache
+relies on seeing the writes. Changed or deleted patient records bump the patients data
+version (see schema.py), which each cache checks at most every
+PATIENT_CACHE_VERSION_CHECK_INTERVAL seconds before dropping all its entries.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from config import PATIENT_CACHE_SIZE, PATIENT_CACHE_TTL, PATIENT_CACHE_VERSION_CHECK_INTERVAL
+import repository
+
+
+class PatientCache:
+    def __init__(
+        self,
+        max_entries: int = PATIENT_CACHE_SIZE,
+        ttl: float = PATIENT_CACHE_TTL,
+        check_interval: float = PATIENT_CACHE_VERSION_CHECK_INTERVAL,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self._entries = OrderedDict()  # phone -> (expires_at, record)
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+        self.invalidations = 0
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def version_check_due(self) -> bool:
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    def check_version(self):
+        """Empty the cache if patient records changed since the last check. Reads the DB, so call it off the event loop."""
+        version = repository.data_version("patients")
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._entries.clear()
+                self.invalidations += 1
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def get(self, phone: str):
+        """A copy of the cached record for `phone`, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.get(phone)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, record = entry
+            if expires_at <= time.monotonic():
+                del self._entries[phone]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(phone)
+            self.hits += 1
+            return dict(record)
+
+    def put(self, phone: str, record: dict):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[phone] = (time.monotonic() + self.ttl, dict(record))
+            self._entries.move_to_end(phone)
+            self.writes += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, phone: str):
+        with self._lock:
+            self._entries.pop(phone, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "writes": self.writes,
+        }
+
+
+patient_cache = PatientCache()
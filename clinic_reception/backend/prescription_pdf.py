@@ -0,0 +1,154 @@
+import re
+import threading
+from functools import lru_cache
+
+import pymupdf
+from docx.enum.style import WD_STYLE_TYPE
+from docx.enum.text import WD_ALIGN_PARAGRAPH
+
+# Base-14 PDF fonts, so rendering needs no font files or external converters
+REGULAR_FONT = "helv"
+BOLD_FONT = "hebo"
+DEFAULT_FONT_SIZE = 11
+LINE_SPACING = 1.2
+PARAGRAPH_SPACING = 6
+
+
+def document_layout(doc) -> dict:
+    """
+    Extract page geometry and styled runs from a python-docx Document.
+    Each paragraph becomes {"align": ..., "runs": [(text, bold, size), ...]}.
+    """
+    section = doc.sections[0]
+    normal_size = doc.styles.default(WD_STYLE_TYPE.PARAGRAPH).font.size
+    default_size = normal_size.pt if normal_size else DEFAULT_FONT_SIZE
+
+    paragraphs = []
+    for p in doc.paragraphs:
+        runs = [
+            (run.text, bool(run.bold), run.font.size.pt if run.font.size else default_size)
+            for run in p.runs
+        ]
+        align = "center" if p.alignment == WD_ALIGN_PARAGRAPH.CENTER else "left"
+        paragraphs.append({"align": align, "runs": runs})
+
+    return {
+        "page_width": section.page_width.pt,
+        "page_height": section.page_height.pt,
+        "margin_left": section.left_margin.pt,
+        "margin_right": section.right_margin.pt,
+        "margin_top": section.top_margin.pt,
+        "margin_bottom": section.bottom_margin.pt,
+        "default_size": default_size,
+        "paragraphs": paragraphs,
+    }
+
+
+_local = threading.local()
+
+
+def _fonts():
+    """This thread's regular and bold fonts; PyMuPDF objects must not be shared between threads."""
+    fonts = getattr(_local, "fonts", None)
+    if fonts is None:
+        fonts = _local.fonts = {False: pymupdf.Font(REGULAR_FONT), True: pymupdf.Font(BOLD_FONT)}
+    return fonts
+
+
+@lru_cache(maxsize=4096)
+def _text_width(text, bold, size):
+    return _fonts()[bold].text_length(text, fontsize=size)
+
+
+def _split_lines(runs):
+    """Split runs on explicit line breaks into a list of lines of (text, bold, size) segments."""
+    lines = [[]]
+    for text, bold, size in runs:
+        parts = text.replace("\t", "    ").split("\n")
+        for i, part in enumerate(parts):
+            if i > 0:
+                lines.append([])
+            if part:
+                lines[-1].append((part, bold, size))
+    return lines
+
+
+def _wrap(line, max_width):
+    """Greedy word wrap of one line of segments to max_width points."""
+    wrapped = [[]]
+    width = 0
+    for text, bold, size in line:
+        for token in re.split(r"(\s+)", text):
+            if not token:
+                continue
+            token_width = _text_width(token, bold, size)
+            if width + token_width > max_width and wrapped[-1]:
+                if token.isspace():
+                    continue
+                wrapped.append([])
+                width = 0
+            # A single token wider than the line is broken by characters
+            while token_width > max_width and len(token) > 1:
+                cut = len(token)
+                while cut > 1 and _text_width(token[:cut], bold, size) > max_width - width:
+                    cut -= 1
+                wrapped[-1].append((token[:cut], bold, size))
+                wrapped.append([])
+                width = 0
+                token = token[cut:]
+                token_width = _text_width(token, bold, size)
+            wrapped[-1].append((token, bold, size))
+            width += token_width
+    return [_merge(line) for line in wrapped]
+
+
+def _merge(line):
+    """Join adjacent segments with the same style so each styled run is drawn once."""
+    merged = []
+    for text, bold, size in line:
+        if merged and merged[-1][1:] == (bold, size):
+            merged[-1] = (merged[-1][0] + text, bold, size)
+        else:
+            merged.append((text, bold, size))
+    return merged
+
+
+def render_pdf(layout: dict, pdf_path: str):
+    """Render a layout produced by document_layout() to a PDF file."""
+    page_width = layout["page_width"]
+    page_height = layout["page_height"]
+    left = layout["margin_left"]
+    max_width = page_width - left - layout["margin_right"]
+    bottom = page_height - layout["margin_bottom"]
+
+    fonts = _fonts()
+    pdf = pymupdf.open()
+    # Text is batched per page in a TextWriter; Page.insert_text would rebuild page content per call
+    page = pdf.new_page(width=page_width, height=page_height)
+    writer = pymupdf.TextWriter(page.rect)
+    y = layout["margin_top"]
+
+    for paragraph in layout["paragraphs"]:
+        for source_line in _split_lines(paragraph["runs"]):
+            for line in _wrap(source_line, max_width):
+                size = max((segment[2] for segment in line), default=layout["default_size"])
+                if y + size * LINE_SPACING > bottom:
+                    writer.write_text(page)
+                    page = pdf.new_page(width=page_width, height=page_height)
+                    writer = pymupdf.TextWriter(page.rect)
+                    y = layout["margin_top"]
+
+                x = left
+                if paragraph["align"] == "center":
+                    line_width = sum(_text_width(text, bold, s) for text, bold, s in line)
+                    x = left + (max_width - line_width) / 2
+
+                for text, bold, s in line:
+                    writer.append((x, y + s), text, font=fonts[bold], fontsize=s)
+                    x += _text_width(text, bold, s)
+                y += size * LINE_SPACING
+        y += PARAGRAPH_SPACING
+
+    writer.write_text(page)
+    pdf.save(pdf_path, deflate=True)
+    pdf.close()
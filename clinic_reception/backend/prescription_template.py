@@ -0,0 +1,144 @@
+import io
+import os
+import re
+import threading
+
+from docx import Document
+
+from prescription_pdf import document_layout
+
+# Workers run from backend/
+TEMPLATE_PATH = "../prescription/prescription_template.docx"
+
+PLACEHOLDER_PATTERN = re.compile(r"\{\{(\w+)\}\}")
+RX_HEADINGS = {"rx -", "rx:", "rx"}
+
+
+def _compile_text(text):
+    """Split text into a tuple of literal strings and ("key",) placeholder markers."""
+    parts = []
+    position = 0
+    for match in PLACEHOLDER_PATTERN.finditer(text):
+        if match.start() > position:
+            parts.append(text[position:match.start()])
+        parts.append((match.group(1),))
+        position = match.end()
+    if position < len(text):
+        parts.append(text[position:])
+    return tuple(parts)
+
+
+def _fill(parts, values):
+    return "".join(
+        part if isinstance(part, str) else str(values.get(part[0], "{{%s}}" % part[0]))
+        for part in parts
+    )
+
+
+class CompiledTemplate:
+    """
+    A prescription template parsed once into placeholder positions.
+
+    Placeholders are indexed per (paragraph, run), so filling touches only the
+    runs that contain them and keeps each run's formatting. A placeholder that
+    Word has split across several runs makes that paragraph fall back to a
+    single run.
+
+    Both fill methods accept `appendix`, a list of plain paragraphs that
+    replace everything after the "Rx -" heading (diagnosis and medicines).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, "rb") as f:
+            self.source = f.read()
+
+        doc = Document(io.BytesIO(self.source))
+        self.layout = document_layout(doc)
+        self.run_placeholders = {}  # (paragraph index, run index) -> compiled run text
+        self.merged_paragraphs = {}  # paragraph index -> compiled paragraph text
+        self.paragraphs = []  # per paragraph: list of (compiled text, bold, size)
+
+        for p_index, (p, paragraph) in enumerate(zip(doc.paragraphs, self.layout["paragraphs"])):
+            runs = [(_compile_text(text), bold, size) for text, bold, size in paragraph["runs"]]
+            found = sum(isinstance(part, tuple) for parts, _, _ in runs for part in parts)
+            if len(PLACEHOLDER_PATTERN.findall(p.text)) > found:
+                parts = _compile_text(p.text)
+                self.merged_paragraphs[p_index] = parts
+                first = runs[0] if runs else ((), False, self.layout["default_size"])
+                runs = [(parts, first[1], first[2])]
+            else:
+                for r_index, (parts, _, _) in enumerate(runs):
+                    if any(isinstance(part, tuple) for part in parts):
+                        self.run_placeholders[(p_index, r_index)] = parts
+            self.paragraphs.append(runs)
+
+        # Content appended to the slip goes right after the "Rx -" heading
+        self.rx_index = next(
+            (
+                i + 1
+                for i, paragraph in enumerate(self.layout["paragraphs"])
+                if "".join(text for text, _, _ in paragraph["runs"]).strip().lower() in RX_HEADINGS
+            ),
+            len(self.layout["paragraphs"]),
+        )
+
+        self.keys = {
+            part[0]
+            for runs in self.paragraphs
+            for parts, _, _ in runs
+            for part in parts
+            if isinstance(part, tuple)
+        }
+
+    def fill_layout(self, values: dict, appendix: list = None) -> dict:
+        """Return a render_pdf() layout with the placeholders replaced by `values`."""
+        paragraphs = [
+            {
+                "align": source["align"],
+                "runs": [(_fill(parts, values), bold, size) for parts, bold, size in runs],
+            }
+            for source, runs in zip(self.layout["paragraphs"], self.paragraphs)
+        ]
+        if appendix is not None:
+            default_size = self.layout["default_size"]
+            paragraphs = paragraphs[:self.rx_index] + [
+                {"align": "left", "runs": [(text, False, default_size)]} for text in appendix
+            ]
+        return {**self.layout, "paragraphs": paragraphs}
+
+    def fill_document(self, values: dict, appendix: list = None):
+        """Return a python-docx Document of the template with the placeholders replaced."""
+        doc = Document(io.BytesIO(self.source))
+        paragraphs = doc.paragraphs
+        for (p_index, r_index), parts in self.run_placeholders.items():
+            paragraphs[p_index].runs[r_index].text = _fill(parts, values)
+        for p_index, parts in self.merged_paragraphs.items():
+            paragraphs[p_index].text = _fill(parts, values)
+        if appendix is not None:
+            for p in paragraphs[self.rx_index:]:
+                p._element.getparent().remove(p._element)
+            for text in appendix:
+                doc.add_paragraph(text)
+        return doc
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+
+
+def get_template(path: str) -> CompiledTemplate:
+    """Return the compiled template for `path`, recompiling it when the file changes on disk."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Prescription template not found at {path}")
+
+    mtime_ns = os.stat(path).st_mtime_ns
+    template = _templates.get(path)
+    if template is None or template.mtime_ns != mtime_ns:
+        with _templates_lock:
+            template = _templates.get(path)
+            if template is None or template.mtime_ns != mtime_ns:
+                template = CompiledTemplate(path)
+                _templates[path] = template
+    return template
@@ -0,0 +1,283 @@
+"""
+SQLite data access for the reception activities.
+
+Each thread of the DB executor keeps one long-lived connection in WAL mode,
+so readers never block the writer and statements stay in the connection's
+prepared-statement cache instead of being re-parsed per activity call.
+"""
+import sqlite3
+import threading
+
+from telemetry import timed_query
+from wait_estimator import consultation_minutes, consultation_start, parse_timestamp, prior_stats, update_stats
+from config import (
+    DB_PATH,
+    DB_JOURNAL_MODE,
+    DB_SYNCHRONOUS,
+    DB_BUSY_TIMEOUT_MS,
+    DB_STATEMENT_CACHE_SIZE,
+)
+
+
+class ConnectionPool:
+    """One connection per thread, opened lazily and tuned once."""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=DB_STATEMENT_CACHE_SIZE,
+            # Writers take the lock when the transaction starts, so contention
+            # waits on busy_timeout instead of failing on a read-to-write upgrade
+            isolation_level="IMMEDIATE",
+        )
+        conn.execute(f"PRAGMA journal_mode={DB_JOURNAL_MODE}")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    def get(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+pool = ConnectionPool()
+
+
+def get_connection():
+    return pool.get()
+
+
+@timed_query
+def list_schedule() -> list:
+    """Every schedule row as (doctor_id, name, day_of_week, start_time, end_time)."""
+    return get_connection().execute("""
+        SELECT doctor_id, name, day_of_week, start_time, end_time FROM doctor_schedule
+    """).fetchall()
+
+
+@timed_query
+def data_version(table: str) -> int:
+    """Change counter for `table`, bumped by triggers on the writes schema.VERSIONED_TABLES lists for it."""
+    row = get_connection().execute(
+        "SELECT version FROM data_versions WHERE table_name = ?", (table,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+@timed_query
+def find_patient_by_phone(phone: str):
+    row = get_connection().execute("""
+        SELECT patient_id, name, phone, gender, age, address FROM patients
+        WHERE phone = ?
+    """, (phone,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "patient_id": row[0],
+        "name": row[1],
+        "phone_number": row[2],
+        "gender": row[3],
+        "age": row[4],
+        "address": row[5]
+    }
+
+
+@timed_query
+def has_scheduled_appointment(patient_id: int, doctor_id: int, start: str, end: str = None) -> bool:
+    """Whether the patient has a scheduled appointment with the doctor in [start, end)."""
+    if end is None:
+        end = "9999-12-31"
+    row = get_connection().execute("""
+        SELECT 1 FROM appointments
+        WHERE patient_id = ? AND doctor_id = ?
+        AND appointment_datetime >= ? AND appointment_datetime < ?
+        AND status = 'scheduled'
+        LIMIT 1
+    """, (patient_id, doctor_id, start, end)).fetchone()
+    return row is not None
+
+
+@timed_query
+def create_patient(name: str, phone: str, gender: str, age: str, address: str, idempotency_key: str = None):
+    """
+    Insert a patient unless the phone is already registered. Returns (patient_id, created).
+
+    IDs come from AUTOINCREMENT and the phone is unique, so concurrent registrations
+    can neither share an ID nor register the same phone twice. A retry carrying the
+    idempotency key of the insert that won is reported as created.
+    """
+    conn = get_connection()
+    with conn:
+        cursor = conn.execute("""
+            INSERT INTO patients (name, phone, gender, age, address, idempotency_key)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, (name, phone, gender, age, address, idempotency_key))
+        if cursor.rowcount:
+            return cursor.lastrowid, True
+        patient_id, existing_key = conn.execute(
+            "SELECT patient_id, idempotency_key FROM patients WHERE phone = ?", (phone,)
+        ).fetchone()
+    return patient_id, idempotency_key is not None and existing_key == idempotency_key
+
+
+@timed_query
+def count_open_queue(doctor_id: int) -> int:
+    """Open queue entries for the doctor, read from the trigger-maintained counter."""
+    row = get_connection().execute(
+        "SELECT open_count FROM doctor_queue_counts WHERE doctor_id = ?", (doctor_id,)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+@timed_query
+def open_queue_entries(doctor_id: int) -> list:
+    """The doctor's open queue entries in arrival order, as DoctorQueueWorkflow keeps them."""
+    rows = get_connection().execute("""
+        SELECT q.patient_id, p.name, q.queued_at FROM doctor_queue q
+        JOIN patients p ON p.patient_id = q.patient_id
+        WHERE q.doctor_id = ? AND q.seen = 'no'
+        ORDER BY q.queued_at
+    """, (doctor_id,)).fetchall()
+    return [
+        {"patient_id": patient_id, "patient_name": name, "workflow_id": None, "queued_at": queued_at}
+        for patient_id, name, queued_at in rows
+    ]
+
+
+@timed_query
+def booked_slots(doctor_id: int, start: str, end: str) -> set:
+    """Datetimes of the doctor's scheduled appointments in [start, end), in one index range scan."""
+    rows = get_connection().execute("""
+        SELECT appointment_datetime FROM appointments
+        WHERE doctor_id = ? AND appointment_datetime >= ? AND appointment_datetime < ?
+        AND status = 'scheduled'
+    """, (doctor_id, start, end)).fetchall()
+    return {row[0] for row in rows}
+
+
+@timed_query
+def find_appointment_by_key(idempotency_key: str):
+    """The (patient_id, doctor_id, appointment_datetime) booked under this key, if any."""
+    return get_connection().execute("""
+        SELECT patient_id, doctor_id, appointment_datetime FROM appointments
+        WHERE idempotency_key = ?
+    """, (idempotency_key,)).fetchone()
+
+
+@timed_query
+def reserve_slot(patient_id: int, doctor_id: int, slots, idempotency_key: str = None):
+    """
+    Book the first of `slots` still free for the doctor and return it, or None if all are taken.
+
+    Slots taken since the caller read the booked set are skipped by the unique
+    (doctor_id, appointment_datetime) index rather than a check-then-insert. If
+    the idempotency key already booked a slot, that slot is returned instead.
+    """
+    conn = get_connection()
+    with conn:
+        for slot in slots:
+            cursor = conn.execute("""
+                INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status, idempotency_key)
+                VALUES (?, ?, ?, 'scheduled', ?)
+                ON CONFLICT DO NOTHING
+            """, (patient_id, doctor_id, slot, idempotency_key))
+            if cursor.rowcount:
+                return slot
+            if idempotency_key is not None:
+                existing = find_appointment_by_key(idempotency_key)
+                if existing:
+                    return existing[2]
+    return None
+
+
+@timed_query
+def apply_queue_events(doctor_id: int, events: list):
+    """
+    Write a batch of walk-in queue changes for one doctor, in order and in one transaction.
+
+    Events are {"type": "enqueued" | "seen", "patient_id", "queued_at"}, plus
+    "seen_at" on seen events. A patient has at most one open entry per doctor, so
+    joining again while an older entry is open keeps that one, and a seen event
+    closes the patient's open entry queued at or before its queued_at; replaying
+    a batch after a retry changes nothing. Each newly seen entry also updates the
+    doctor's consultation statistics.
+    """
+    conn = get_connection()
+    with conn:
+        for event in events:
+            if event["type"] == "enqueued":
+                conn.execute("""
+                    INSERT INTO doctor_queue (doctor_id, patient_id, queued_at, seen)
+                    VALUES (?, ?, ?, 'no')
+                    ON CONFLICT DO NOTHING
+                """, (doctor_id, event["patient_id"], event["queued_at"]))
+            else:
+                cursor = conn.execute("""
+                    UPDATE doctor_queue SET seen = 'yes', seen_at = ?
+                    WHERE doctor_id = ? AND patient_id = ? AND queued_at <= ? AND seen = 'no'
+                """, (event.get("seen_at"), doctor_id, event["patient_id"], event["queued_at"]))
+                if cursor.rowcount and event.get("seen_at"):
+                    _record_consultation(conn, doctor_id, event["queued_at"], event["seen_at"])
+
+
+def _record_consultation(conn, doctor_id: int, queued_at: str, seen_at: str):
+    row = conn.execute("""
+        SELECT samples, mean_minutes, variance, last_seen_at FROM doctor_service_stats
+        WHERE doctor_id = ?
+    """, (doctor_id,)).fetchone()
+    stats = {"samples": row[0], "mean": row[1], "variance": row[2]} if row else prior_stats()
+    start = consultation_start(queued_at, row[3] if row else None)
+    # Appointments are stored in naive local time, as consultation_start returns
+    appointments_between = conn.execute("""
+        SELECT COUNT(*) FROM appointments
+        WHERE doctor_id = ? AND appointment_datetime > ? AND appointment_datetime <= ?
+        AND status = 'scheduled'
+    """, (doctor_id, start.isoformat(), parse_timestamp(seen_at).isoformat())).fetchone()[0]
+    minutes = consultation_minutes(start, seen_at, appointments_between)
+    if minutes is not None:
+        stats = update_stats(stats, minutes)
+    conn.execute("""
+        INSERT INTO doctor_service_stats (doctor_id, samples, mean_minutes, variance, last_seen_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (doctor_id) DO UPDATE SET
+            samples = excluded.samples,
+            mean_minutes = excluded.mean_minutes,
+            variance = excluded.variance,
+            last_seen_at = excluded.last_seen_at
+    """, (doctor_id, stats["samples"], stats["mean"], stats["variance"], seen_at))
+
+
+@timed_query
+def get_service_stats(doctor_id: int):
+    """The doctor's consultation statistics as a wait_estimator stats dict, or None without history."""
+    row = get_connection().execute(
+        "SELECT samples, mean_minutes, variance FROM doctor_service_stats WHERE doctor_id = ?", (doctor_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {"samples": row[0], "mean": row[1], "variance": row[2]}
+
+
+@timed_query
+def list_diagnoses() -> list:
+    return get_connection().execute("SELECT diagnosis, medicines FROM diagnosis_medicines").fetchall()
@@ -1,43 +1,198 @@
+import argparse
 import asyncio
+import logging
+import signal
 from temporalio.client import Client
 from temporalio.worker import Worker
 
-from workflows import ReceptionWorkflow
+from config import (
+    TEMPORAL_ADDRESS,
+    TEMPORAL_NAMESPACE,
+    RECEPTION_TASK_QUEUE,
+    PRESCRIPTION_RENDER_TASK_QUEUE,
+    CONSULTATION_TASK_QUEUE,
+    BULK_RENDER_TASK_QUEUE,
+    MAX_CONCURRENT_DB_ACTIVITIES,
+    MAX_CONCURRENT_RENDER_ACTIVITIES,
+    EXECUTOR_STATS_INTERVAL,
+    RECEPTION_LOCAL_ACTIVITIES,
+)
+from executors import DB_EXECUTOR, RENDER_EXECUTOR, BULK_RENDER_EXECUTOR, EXECUTORS, executor_stats
+from schedule_index import schedule_index
+from patient_cache import patient_cache
+import telemetry
+
+from workflows import ReceptionWorkflow, ConsultationWorkflow, DoctorQueueWorkflow, BulkPrescriptionRenderWorkflow
+from prescription_template import get_template
 from activities import (
+    TEMPLATE_PATH,
+    QueueActivities,
     check_doctor_availability,
     get_patient_by_phone,
     confirm_patient_appointment,
     estimate_wait_time_for_walkin,
     book_later_appointment,
-    add_to_walkin_queue,
+    checkpoint_doctor_queue,
+    load_doctor_queue,
     register_patient,
     generate_prescription_slip,
+    discard_prescription_slip,
     prescription_with_diagnosis,
+    render_prescription_batch,
     get_random_diagnosis_and_medicines
 )
 
+ROLES = ["workflow", "consultation", "db", "render"]
+
+DB_ACTIVITIES = [
+    check_doctor_availability,
+    get_patient_by_phone,
+    confirm_patient_appointment,
+    estimate_wait_time_for_walkin,
+    book_later_appointment,
+    checkpoint_doctor_queue,
+    load_doctor_queue,
+    register_patient,
+    get_random_diagnosis_and_medicines
+]
+
+# Quick DB calls ReceptionWorkflow runs as local activities when RECEPTION_LOCAL_ACTIVITIES is on
+LOOKUP_ACTIVITIES = [
+    check_doctor_availability,
+    get_patient_by_phone,
+    register_patient,
+    confirm_patient_appointment,
+    estimate_wait_time_for_walkin,
+]
+
+RENDER_ACTIVITIES = [
+    generate_prescription_slip,
+    discard_prescription_slip,
+    prescription_with_diagnosis
+]
+
+logger = logging.getLogger("run_worker")
+
+async def log_executor_stats():
+    while True:
+        await asyncio.sleep(EXECUTOR_STATS_INTERVAL)
+        for name, stats in executor_stats().items():
+            logger.info("%s pool: %s", name, stats)
+        if schedule_index.reloads:
+            logger.info("schedule index: %s", schedule_index.stats())
+        logger.info("patient cache: %s", patient_cache.stats())
+
+# Reloads started from the SIGHUP handler, kept referenced until they finish
+reload_tasks = set()
+
+def reload_done(task):
+    reload_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Reloading doctor schedule failed", exc_info=task.exception())
+
+def reload_schedule():
+    logger.info("Reloading doctor schedule")
+    task = asyncio.ensure_future(DB_EXECUTOR.run(schedule_index.reload))
+    reload_tasks.add(task)
+    task.add_done_callback(reload_done)
+
+def build_workers(client, roles):
+    workers = []
+
+    if "workflow" in roles:
+        workers.append(Worker(
+            client=client,
+            task_queue=RECEPTION_TASK_QUEUE,
+            workflows=[ReceptionWorkflow, DoctorQueueWorkflow, BulkPrescriptionRenderWorkflow],
+            # Local activities run in this worker; it still leaves regular activity tasks to the DB workers
+            activities=LOOKUP_ACTIVITIES if RECEPTION_LOCAL_ACTIVITIES else [],
+            no_remote_activities=True,
+            max_concurrent_local_activities=MAX_CONCURRENT_DB_ACTIVITIES,
+            interceptors=telemetry.worker_interceptors(),
+        ))
+
+    if "consultation" in roles:
+        workers.append(Worker(
+            client=client,
+            task_queue=CONSULTATION_TASK_QUEUE,
+            workflows=[ConsultationWorkflow],
+        ))
+
+    if "db" in roles:
+        # DB lookups share the reception queue; a workflow-only worker never polls activity tasks
+        workers.append(Worker(
+            client=client,
+            task_queue=RECEPTION_TASK_QUEUE,
+            # Queue activities signal-with-start the doctor queue workflows, so they need the client
+            activities=DB_ACTIVITIES + [QueueActivities(client).join_doctor_queue],
+            # Activities are async and hand their blocking work to the DB pool themselves;
+            # any synchronous activity added later shares it
+            activity_executor=DB_EXECUTOR.executor,
+            max_concurrent_activities=MAX_CONCURRENT_DB_ACTIVITIES,
+            interceptors=telemetry.worker_interceptors(),
+        ))
+
+    if "render" in roles:
+        # Parse the prescription template before taking work so the first slip doesn't pay for it
+        get_template(TEMPLATE_PATH)
+        workers.append(Worker(
+            client=client,
+            task_queue=PRESCRIPTION_RENDER_TASK_QUEUE,
+            activities=RENDER_ACTIVITIES,
+            max_concurrent_activities=MAX_CONCURRENT_RENDER_ACTIVITIES,
+            interceptors=telemetry.worker_interceptors(),
+        ))
+        # A bulk batch keeps the worker's whole bulk render pool busy, so one at a time
+        workers.append(Worker(
+            client=client,
+            task_queue=BULK_RENDER_TASK_QUEUE,
+            activities=[render_prescription_batch],
+            max_concurrent_activities=1,
+            interceptors=telemetry.worker_interceptors(),
+        ))
+
+    return workers
+
 async def main():
-    client = await Client.connect("localhost:7233", namespace="default")
-
-    worker = Worker(
-        client=client,
-        task_queue="reception-task-queue",
-        workflows=[ReceptionWorkflow],
-        activities=[
-            check_doctor_availability,
-            get_patient_by_phone,
-            confirm_patient_appointment,
-            estimate_wait_time_for_walkin,
-            book_later_appointment,
-            add_to_walkin_queue,
-            register_patient,
-            generate_prescription_slip,
-            prescription_with_diagnosis,
-            get_random_diagnosis_and_medicines
-        ]
+    parser = argparse.ArgumentParser(description="Run clinic reception Temporal workers")
+    parser.add_argument(
+        "--role",
+        choices=ROLES + ["all"],
+        action="append",
+        help="Which worker to run; repeat to combine roles in one process (default: all)",
+    )
+    args = parser.parse_args()
+    roles = ROLES if not args.role or "all" in args.role else args.role
+
+    logging.basicConfig(level=logging.INFO)
+
+    telemetry.setup("clinic-worker")
+    telemetry.start_metrics_server()
+    # Workers created from this client trace with its interceptors too
+    client = await Client.connect(
+        TEMPORAL_ADDRESS, namespace=TEMPORAL_NAMESPACE,
+        interceptors=telemetry.client_interceptors(), runtime=telemetry.temporal_runtime(),
     )
+    workers = build_workers(client, roles)
+    logger.info("Starting workers for roles: %s", ", ".join(roles))
+
+    if "db" in roles or ("workflow" in roles and RECEPTION_LOCAL_ACTIVITIES):
+        # Load the schedule before taking work; SIGHUP reloads it without waiting for the version check
+        await DB_EXECUTOR.run(schedule_index.reload)
+        if hasattr(signal, "SIGHUP"):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_schedule)
+
+    if "render" in roles:
+        await RENDER_EXECUTOR.warm_up()
+        await BULK_RENDER_EXECUTOR.warm_up()
 
-    await worker.run()
+    stats_task = asyncio.create_task(log_executor_stats())
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        stats_task.cancel()
+        for executor in EXECUTORS:
+            executor.shutdown()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,168 @@
+"""
+In-memory index of the doctor schedule for availability checks and booking.
+
+The schedule changes rarely, so each worker loads it once and answers from
+memory: doctor name to ids, and per doctor and weekday a sorted list of
+non-overlapping shifts searched with bisect. The whole index is swapped out
+when the doctor_schedule data version (bumped by triggers, see schema.py)
+moves, checked at most every SCHEDULE_VERSION_CHECK_INTERVAL seconds, or when
+reload() is called.
+"""
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+
+from config import SCHEDULE_VERSION_CHECK_INTERVAL
+import repository
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    version: int
+    doctors_by_name: dict  # casefolded name -> doctor ids
+    shifts: dict  # (doctor_id, weekday) -> sorted, merged [(start, end)]
+    starts: dict  # (doctor_id, weekday) -> shift start times, for bisect
+
+
+def _merge(intervals):
+    """Sort shifts and merge overlapping ones, so a bisect on start times finds the covering shift."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _build(rows, version) -> _Snapshot:
+    doctors_by_name = {}
+    intervals = {}
+    for doctor_id, name, weekday, start, end in rows:
+        ids = doctors_by_name.setdefault(name.casefold(), [])
+        if doctor_id not in ids:
+            ids.append(doctor_id)
+        intervals.setdefault((doctor_id, weekday), []).append((start, end))
+
+    shifts = {key: _merge(value) for key, value in intervals.items()}
+    starts = {key: [start for start, _ in value] for key, value in shifts.items()}
+    return _Snapshot(version, doctors_by_name, shifts, starts)
+
+
+class ScheduleIndex:
+    def __init__(self, check_interval: float = SCHEDULE_VERSION_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.unchecked = 0  # lookups answered within the check interval, without touching the DB
+        self.version_checks = 0
+        self.changed = 0  # version checks that found the schedule changed and reloaded it
+        self.reloads = 0
+        self.loaded_at = None
+
+    def _load(self) -> _Snapshot:
+        # Read the version before the rows: a change landing in between only causes one extra reload
+        version = repository.data_version("doctor_schedule")
+        snapshot = self._snapshot = _build(repository.list_schedule(), version)
+        self._checked_at = time.monotonic()
+        self.reloads += 1
+        self.loaded_at = time.time()
+        return snapshot
+
+    def reload(self):
+        """Load the schedule now, regardless of its data version."""
+        with self._lock:
+            self._load()
+
+    def _current(self) -> _Snapshot:
+        self.lookups += 1
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+            self.unchecked += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and time.monotonic() - self._checked_at < self.check_interval:
+                self.unchecked += 1
+                return snapshot
+
+            if snapshot is not None:
+                self.version_checks += 1
+                if repository.data_version("doctor_schedule") == snapshot.version:
+                    self._checked_at = time.monotonic()
+                    return snapshot
+                self.changed += 1
+
+            return self._load()
+
+    @staticmethod
+    def _covering_shift(snapshot, doctor_id, weekday, time_now):
+        key = (doctor_id, weekday)
+        starts = snapshot.starts.get(key)
+        if not starts:
+            return None
+        i = bisect.bisect_right(starts, time_now) - 1
+        if i >= 0 and snapshot.shifts[key][i][1] >= time_now:
+            return snapshot.shifts[key][i]
+        return None
+
+    def doctor_ids(self, doctor_name: str) -> list:
+        return list(self._current().doctors_by_name.get(doctor_name.casefold(), ()))
+
+    def find_doctor_on_shift(self, doctor_name: str, weekday: str, time_now: str):
+        """Id of the doctor with this name (case-insensitive) on shift at `time_now`, or None."""
+        snapshot = self._current()
+        for doctor_id in snapshot.doctors_by_name.get(doctor_name.casefold(), ()):
+            if self._covering_shift(snapshot, doctor_id, weekday, time_now):
+                return doctor_id
+        return None
+
+    def get_schedule(self, doctor_id: int, weekday: str) -> list:
+        """The doctor's shifts on `weekday` as sorted (start_time, end_time) pairs."""
+        return list(self._current().shifts.get((doctor_id, weekday), ()))
+
+    def next_shift(self, doctor_id: int, weekday: str, time_now: str):
+        """
+        The shift in progress at `time_now` or else the next one to start, looking
+        up to a week ahead, as (weekday, start_time, end_time); None if there is none.
+        """
+        snapshot = self._current()
+        shift = self._covering_shift(snapshot, doctor_id, weekday, time_now)
+        if shift:
+            return (weekday, *shift)
+
+        today = WEEKDAYS.index(weekday)
+        for days_ahead in range(8):
+            day = WEEKDAYS[(today + days_ahead) % 7]
+            key = (doctor_id, day)
+            starts = snapshot.starts.get(key)
+            if not starts:
+                continue
+            # Today only shifts starting later count; on later days the first one does
+            i = bisect.bisect_right(starts, time_now) if days_ahead == 0 else 0
+            if i < len(starts):
+                return (day, *snapshot.shifts[key][i])
+        return None
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": snapshot.version if snapshot else None,
+            "doctors": sum(len(ids) for ids in snapshot.doctors_by_name.values()) if snapshot else 0,
+            "lookups": self.lookups,
+            "unchecked": self.unchecked,
+            "version_checks": self.version_checks,
+            # Share of version checks that found a change; near zero means the interval could be longer
+            "changed_rate": round(self.changed / self.version_checks, 3) if self.version_checks else None,
+            "reloads": self.reloads,
+            "loaded_at": self.loaded_at,
+        }
+
+
+schedule_index = ScheduleIndex()
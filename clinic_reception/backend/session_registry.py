@@ -0,0 +1,97 @@
+"""
+Reception sessions of the API tier, in a SQLite file shared by every API process on the host.
+
+A session is only its workflow ID; request handlers rebuild the workflow handle
+from it with client.get_workflow_handle, so any API process can serve any step
+of any session and a restart loses nothing. Every access pushes a session's
+expiry SESSION_TTL seconds out, and abandoned sessions are purged once
+expired. The one per-session flag, whether the initial slip was already
+announced to a polling client, is a column set with a single UPDATE so only
+one request ever announces it.
+"""
+import asyncio
+import sqlite3
+import threading
+import time
+
+from config import SESSION_DB_PATH, SESSION_TTL, DB_BUSY_TIMEOUT_MS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_sessions (
+    workflow_id TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL,
+    prescription_announced INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_api_sessions_expires_at ON api_sessions (expires_at);
+"""
+
+
+class SessionRegistry:
+    def __init__(self, path: str = SESSION_DB_PATH, ttl: float = SESSION_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connection(self):
+        # One connection per thread of the default executor that asyncio.to_thread uses
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(
+                self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000, isolation_level="IMMEDIATE"
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._schema_lock:
+                if not self._schema_ready:
+                    conn.executescript(SCHEMA)
+                    self._schema_ready = True
+        return conn
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        conn = self._connection()
+        with conn:
+            return conn.execute(sql, params).rowcount
+
+    def _open(self, workflow_id: str):
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM api_sessions WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO api_sessions (workflow_id, expires_at) VALUES (?, ?)",
+                (workflow_id, now + self.ttl),
+            )
+
+    async def open(self, workflow_id: str):
+        """Register a new session, purging expired ones on the way."""
+        await asyncio.to_thread(self._open, workflow_id)
+
+    async def touch(self, workflow_id: str) -> bool:
+        """Whether the session is live, extending it if so."""
+        now = time.time()
+        return await asyncio.to_thread(
+            self._execute,
+            "UPDATE api_sessions SET expires_at = ? WHERE workflow_id = ? AND expires_at > ?",
+            (now + self.ttl, workflow_id, now),
+        ) == 1
+
+    async def close(self, workflow_id: str):
+        await asyncio.to_thread(self._execute, "DELETE FROM api_sessions WHERE workflow_id = ?", (workflow_id,))
+
+    async def announce_prescription(self, workflow_id: str) -> bool:
+        """True for the first caller only, across all API processes."""
+        return await asyncio.to_thread(
+            self._execute,
+            "UPDATE api_sessions SET prescription_announced = 1 WHERE workflow_id = ? AND prescription_announced = 0",
+            (workflow_id,),
+        ) == 1
+
+    def _count(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM api_sessions WHERE expires_at > ?", (time.time(),)
+        ).fetchone()[0]
+
+    async def stats(self) -> dict:
+        return {"sessions": await asyncio.to_thread(self._count), "ttl": self.ttl}
@@ -0,0 +1,190 @@
+"""
+Server-pushed status of reception workflows.
+
+Every workflow with stream subscribers is followed by a single watcher task in
+the API process. The watcher calls the workflow's wait_for_change update, which
+answers once per status change and is renewed every STATUS_STREAM_WAIT_TIMEOUT
+seconds when nothing happens. While the patient is with the doctor it follows
+the ConsultationWorkflow child instead. Changes become events that are fanned
+out to all subscribers, so Temporal load grows with state changes, not with
+connected clients. A subscriber first receives the events it has not seen yet,
+and a watcher outlives its last subscriber by STATUS_STREAM_IDLE_TIMEOUT so a
+reconnecting client picks up where it left off.
+"""
+import asyncio
+import logging
+
+from temporalio.client import WorkflowFailureError, WorkflowUpdateFailedError
+from temporalio.service import RPCError, RPCStatusCode
+
+from config import CONSULTATION_WORKFLOW_ID_SUFFIX, STATUS_STREAM_WAIT_TIMEOUT, STATUS_STREAM_IDLE_TIMEOUT
+
+logger = logging.getLogger("status_stream")
+
+
+def reception_event(status: dict):
+    """The stream event for a ReceptionWorkflow status, or None if there is nothing to tell."""
+    step = status.get("step")
+    if step == "add_to_queue":
+        return {
+            "status": "adding_to_queue",
+            "response": "Adding you to the queue...\n Please take a seat and wait for your turn."
+        }
+    if step == "generate_prescription" and status.get("prescription_slip"):
+        pdf_url = status["prescription_slip"].get("pdf_url")
+        return {
+            "status": "prescription_ready",
+            "response": f"Your initial prescription slip is ready!\n Download: {pdf_url}\n",
+            "prescription_url": pdf_url
+        }
+    if step == "completed":
+        return {"status": "completed", "response": f"{status['result']}"}
+    return None
+
+
+def consultation_event(status: dict):
+    """The stream event for a ConsultationWorkflow status, or None if there is nothing to tell."""
+    step = status.get("step")
+    if step == "diagnosis_generation":
+        return {
+            "status": "diagnosis_generation",
+            "response": "Doctor consultation in progress...\n Generating diagnosis and finalizing prescription..."
+        }
+    if step == "finalize_prescription":
+        return {
+            "status": "finalizing_prescription",
+            "response": f"Diagnosis: {status['diagnosis']}\n Finalizing your prescription..."
+        }
+    return None
+
+
+class StatusWatcher:
+    def __init__(self, client, workflow_id: str, on_completed=None):
+        # on_completed: coroutine function called with the workflow ID once it has completed
+        self.client = client
+        self.workflow_id = workflow_id
+        self.on_completed = on_completed
+        self.events = []  # everything published so far; its position + 1 is the SSE event id
+        self.subscribers = set()
+        self.done = False
+        self.task = None
+        self.idle_timer = None
+
+    def subscribe(self, last_event_id: int = 0) -> asyncio.Queue:
+        """A queue of (event id, event) pairs, then None once the workflow is finished."""
+        queue = asyncio.Queue()
+        for index, event in enumerate(self.events[last_event_id:], start=last_event_id + 1):
+            queue.put_nowait((index, event))
+        if self.done:
+            queue.put_nowait(None)
+        self.subscribers.add(queue)
+        return queue
+
+    def _publish(self, event):
+        if self.events and self.events[-1] == event:
+            return
+        self.events.append(event)
+        for queue in self.subscribers:
+            queue.put_nowait((len(self.events), event))
+
+    async def _follow(self, workflow_id: str, to_event, until, status: dict = None, start_retries: int = 0):
+        """
+        Publish the events of a workflow's status changes after `status` until `until(status)` holds.
+        Returns the last status, or None once the workflow has closed. A workflow that
+        may still be starting is looked for `start_retries` more times.
+        """
+        handle = self.client.get_workflow_handle(workflow_id)
+        while True:
+            try:
+                status = await handle.execute_update("wait_for_change", args=[status, STATUS_STREAM_WAIT_TIMEOUT])
+            except RPCError as e:
+                if e.status == RPCStatusCode.NOT_FOUND and status is None and start_retries > 0:
+                    start_retries -= 1
+                    await asyncio.sleep(0.2)
+                    continue
+                return None
+            except WorkflowUpdateFailedError:
+                # Closed workflows don't take updates
+                return None
+            event = to_event(status)
+            if event:
+                self._publish(event)
+            if until(status):
+                return status
+
+    async def run(self):
+        try:
+            status = await self._follow(
+                self.workflow_id, reception_event,
+                lambda s: s["step"] == "completed" or (s["step"] == "generate_prescription" and s["prescription_slip"]),
+            )
+            if status and status["step"] != "completed":
+                # With the doctor: the child has the detail until it hands back to the reception
+                await self._follow(
+                    f"{self.workflow_id}{CONSULTATION_WORKFLOW_ID_SUFFIX}", consultation_event,
+                    lambda s: s["step"] == "completed", start_retries=5,
+                )
+                status = await self._follow(
+                    self.workflow_id, reception_event, lambda s: s["step"] == "completed", status=status
+                )
+            if status is None:
+                result = await self.client.get_workflow_handle(self.workflow_id).result()
+                self._publish({"status": "completed", "response": f"{result}"})
+            if self.on_completed:
+                await self.on_completed(self.workflow_id)
+        except asyncio.CancelledError:
+            raise
+        except WorkflowFailureError as e:
+            self._publish({"status": "error", "response": f"Workflow failed: {e.cause or e}"})
+        except Exception as e:
+            logger.exception("Status watcher for %s failed", self.workflow_id)
+            self._publish({"status": "error", "response": f"Error checking prescription status: {str(e)}"})
+        finally:
+            self.done = True
+            for queue in self.subscribers:
+                queue.put_nowait(None)
+
+
+class StatusStreams:
+    """The watchers of one API process, started by their first subscriber and stopped after their last."""
+
+    def __init__(self, clients):
+        self.clients = clients
+        self.watchers = {}
+
+    async def subscribe(self, workflow_id: str, last_event_id: int = 0, on_completed=None):
+        client = await self.clients.get()
+        watcher = self.watchers.get(workflow_id)
+        if watcher is None:
+            watcher = self.watchers[workflow_id] = StatusWatcher(client, workflow_id, on_completed)
+            watcher.task = asyncio.create_task(watcher.run())
+        elif watcher.idle_timer:
+            watcher.idle_timer.cancel()
+            watcher.idle_timer = None
+        return watcher, watcher.subscribe(last_event_id)
+
+    def unsubscribe(self, watcher: StatusWatcher, queue: asyncio.Queue):
+        watcher.subscribers.discard(queue)
+        if not watcher.subscribers:
+            watcher.idle_timer = asyncio.get_running_loop().call_later(
+                STATUS_STREAM_IDLE_TIMEOUT, self._drop_if_idle, watcher
+            )
+
+    def _drop_if_idle(self, watcher: StatusWatcher):
+        watcher.idle_timer = None
+        if watcher.subscribers:
+            return
+        if self.watchers.get(watcher.workflow_id) is watcher:
+            del self.watchers[watcher.workflow_id]
+        watcher.task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "watchers": len(self.watchers),
+            "subscribers": sum(len(watcher.subscribers) for watcher in self.watchers.values()),
+        }
+
+    async def close(self):
+        for watcher in list(self.watchers.values()):
+            watcher.task.cancel()
+        self.watchers.clear()
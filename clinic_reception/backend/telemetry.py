@@ -0,0 +1,212 @@
+"""
+OpenTelemetry tracing and Prometheus metrics for the API and the workers.
+
+Both are off unless configured (see config.py) and their packages are only
+imported then (requirements-telemetry.txt). Traces follow a reception from the
+API request through the Temporal client calls (start, signal, query, update)
+into the workflow and every activity, by way of Temporal's TracingInterceptor
+on the client, which workers created from that client pick up as well. Within
+an activity, repository queries and executor runs get spans of their own.
+
+Metrics recorded here:
+    clinic_activity_seconds                 activity run time by type, local or regular, and outcome
+    clinic_activity_schedule_to_start_seconds  time an activity waited for a worker slot
+    clinic_activities_in_flight             running activities per task queue
+    clinic_db_query_seconds                 repository calls, lock waits included
+    clinic_pool_task_seconds                DB and render pool work by function, queueing included
+    clinic_pool_in_flight                   work submitted to each pool and not yet finished
+Temporal's own worker metrics (slots available and used, poll and schedule
+latencies) come from the SDK runtime at TEMPORAL_METRICS_ADDRESS.
+"""
+import asyncio
+import contextlib
+import functools
+import logging
+import time
+from datetime import datetime, timezone
+
+from temporalio import activity
+from temporalio.worker import ActivityInboundInterceptor, ExecuteActivityInput, Interceptor
+
+from config import (
+    TRACING_EXPORTER,
+    TRACING_FILE,
+    PROMETHEUS_METRICS,
+    WORKER_METRICS_PORT,
+    TEMPORAL_METRICS_ADDRESS,
+)
+
+logger = logging.getLogger("telemetry")
+
+_tracer = None
+_metrics = None
+
+
+class _Metrics:
+    def __init__(self):
+        from prometheus_client import Gauge, Histogram
+
+        self.activity_seconds = Histogram(
+            "clinic_activity_seconds", "Activity run time", ["activity", "kind", "outcome"]
+        )
+        self.schedule_to_start_seconds = Histogram(
+            "clinic_activity_schedule_to_start_seconds", "Time from scheduling an activity attempt to its start",
+            ["activity", "kind"],
+        )
+        self.activities_in_flight = Gauge(
+            "clinic_activities_in_flight", "Activities running in this process", ["task_queue"]
+        )
+        self.db_query_seconds = Histogram(
+            "clinic_db_query_seconds", "Repository call time", ["query"],
+            buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+        )
+        self.pool_task_seconds = Histogram(
+            "clinic_pool_task_seconds", "Executor work from submission to result", ["pool", "function"]
+        )
+        self.pool_in_flight = Gauge("clinic_pool_in_flight", "Executor work in flight", ["pool"])
+
+
+def _span_exporter():
+    if TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    if TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    if TRACING_EXPORTER == "file":
+        return ConsoleSpanExporter(
+            out=open(TRACING_FILE, "a"), formatter=lambda span: span.to_json(indent=None) + "\n"
+        )
+    raise ValueError(f"Unknown TRACING_EXPORTER {TRACING_EXPORTER!r}; use none, otlp, console or file")
+
+
+def setup(service_name: str):
+    """Configure tracing and metrics for this process as set in config.py. Safe to call more than once."""
+    global _tracer, _metrics
+    if TRACING_EXPORTER != "none" and _tracer is None:
+        from opentelemetry import trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(_span_exporter()))
+        trace.set_tracer_provider(provider)
+        _tracer = trace.get_tracer("clinic_reception")
+        logger.info("Tracing to %s", TRACING_FILE if TRACING_EXPORTER == "file" else TRACING_EXPORTER)
+    if PROMETHEUS_METRICS and _metrics is None:
+        _metrics = _Metrics()
+
+
+def start_metrics_server():
+    """Serve this worker process's metrics on WORKER_METRICS_PORT."""
+    if _metrics is not None:
+        from prometheus_client import start_http_server
+
+        start_http_server(WORKER_METRICS_PORT)
+        logger.info("Serving metrics on port %s", WORKER_METRICS_PORT)
+
+
+def metrics_exposition():
+    """(body, content type) of the current metrics in Prometheus text format, or None if they are off."""
+    if _metrics is None:
+        return None
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def client_interceptors() -> list:
+    if _tracer is None:
+        return []
+    from temporalio.contrib.opentelemetry import TracingInterceptor
+
+    return [TracingInterceptor()]
+
+
+def worker_interceptors() -> list:
+    return [ActivityMetricsInterceptor()] if _metrics is not None else []
+
+
+def temporal_runtime():
+    """A Temporal runtime exporting the SDK's metrics to TEMPORAL_METRICS_ADDRESS, or None for the default one."""
+    if not TEMPORAL_METRICS_ADDRESS:
+        return None
+    from temporalio.runtime import PrometheusConfig, Runtime, TelemetryConfig
+
+    return Runtime(telemetry=TelemetryConfig(metrics=PrometheusConfig(bind_address=TEMPORAL_METRICS_ADDRESS)))
+
+
+def span(name: str, **attributes):
+    """A span under the current one, or a no-op context when tracing is off."""
+    if _tracer is None:
+        return contextlib.nullcontext()
+    return _tracer.start_as_current_span(name, attributes=attributes)
+
+
+def timed_query(fn):
+    """Trace and time a repository function."""
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _tracer is None and _metrics is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            with span(f"db {name}"):
+                return fn(*args, **kwargs)
+        finally:
+            if _metrics is not None:
+                _metrics.db_query_seconds.labels(name).observe(time.perf_counter() - start)
+    return wrapper
+
+
+@contextlib.contextmanager
+def pool_task(pool: str, function: str):
+    """Trace and time one piece of work handed to an executor."""
+    if _tracer is None and _metrics is None:
+        yield
+        return
+    if _metrics is not None:
+        _metrics.pool_in_flight.labels(pool).inc()
+    start = time.perf_counter()
+    try:
+        with span(f"{pool} pool {function}"):
+            yield
+    finally:
+        if _metrics is not None:
+            _metrics.pool_in_flight.labels(pool).dec()
+            _metrics.pool_task_seconds.labels(pool, function).observe(time.perf_counter() - start)
+
+
+class ActivityMetricsInterceptor(Interceptor):
+    """Per-activity latency, slot wait and in-flight metrics, for regular and local activities alike."""
+
+    def intercept_activity(self, next: ActivityInboundInterceptor) -> ActivityInboundInterceptor:
+        return _ActivityMetricsInbound(next)
+
+
+class _ActivityMetricsInbound(ActivityInboundInterceptor):
+    async def execute_activity(self, input: ExecuteActivityInput):
+        info = activity.info()
+        kind = "local" if info.is_local else "regular"
+        if info.current_attempt_scheduled_time:
+            waited = (datetime.now(timezone.utc) - info.current_attempt_scheduled_time).total_seconds()
+            _metrics.schedule_to_start_seconds.labels(info.activity_type, kind).observe(max(0.0, waited))
+        in_flight = _metrics.activities_in_flight.labels(info.task_queue)
+        in_flight.inc()
+        start = time.perf_counter()
+        outcome = "failed"
+        try:
+            result = await super().execute_activity(input)
+            outcome = "completed"
+            return result
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+        finally:
+            in_flight.dec()
+            _metrics.activity_seconds.labels(info.activity_type, kind, outcome).observe(time.perf_counter() - start)
@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+import logging
+
+from temporalio.client import Client
+
+from config import (
+    TEMPORAL_ADDRESS,
+    TEMPORAL_NAMESPACE,
+    TEMPORAL_CLIENT_POOL_SIZE,
+    TEMPORAL_HEALTH_CHECK_INTERVAL,
+)
+from telemetry import client_interceptors
+
+logger = logging.getLogger(__name__)
+
+
+class TemporalClientPool:
+    """
+    Process-wide pool of Temporal clients.
+
+    Each slot owns its own gRPC channel. Clients are handed out round-robin,
+    health checked in the background and reconnected when a check fails.
+    """
+
+    def __init__(self, address: str = TEMPORAL_ADDRESS, namespace: str = TEMPORAL_NAMESPACE,
+                 size: int = TEMPORAL_CLIENT_POOL_SIZE,
+                 health_check_interval: float = TEMPORAL_HEALTH_CHECK_INTERVAL):
+        self.address = address
+        self.namespace = namespace
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self.connect_count = 0
+        self.reconnect_count = 0
+        self.failed_health_checks = 0
+        self._clients = [None] * self.size
+        self._locks = [asyncio.Lock() for _ in range(self.size)]
+        self._next_slot = itertools.cycle(range(self.size))
+        self._health_task = None
+
+    async def _connect(self, slot: int) -> Client:
+        async with self._locks[slot]:
+            if self._clients[slot] is None:
+                self._clients[slot] = await Client.connect(
+                    self.address, namespace=self.namespace, interceptors=client_interceptors()
+                )
+                self.connect_count += 1
+            return self._clients[slot]
+
+    async def start(self):
+        for slot in range(self.size):
+            await self._connect(slot)
+        if self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        # Clients have no explicit close; dropping the references releases the channels
+        self._clients = [None] * self.size
+
+    async def get(self) -> Client:
+        slot = next(self._next_slot)
+        client = self._clients[slot]
+        if client is None:
+            client = await self._connect(slot)
+        return client
+
+    async def check_health(self) -> bool:
+        healthy = True
+        for slot, client in enumerate(self._clients):
+            try:
+                if client is None:
+                    raise RuntimeError("not connected")
+                await client.service_client.check_health()
+            except Exception as e:
+                healthy = False
+                self.failed_health_checks += 1
+                logger.warning("Temporal client %d failed health check: %s", slot, e)
+                self._clients[slot] = None
+                try:
+                    await self._connect(slot)
+                    self.reconnect_count += 1
+                except Exception as connect_error:
+                    logger.warning("Reconnecting Temporal client %d failed: %s", slot, connect_error)
+        return healthy
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            await self.check_health()
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.size,
+            "connected": sum(client is not None for client in self._clients),
+            "connect_count": self.connect_count,
+            "reconnect_count": self.reconnect_count,
+            "failed_health_checks": self.failed_health_checks,
+        }
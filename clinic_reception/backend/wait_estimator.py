@@ -0,0 +1,85 @@
+"""
+Walk-in wait estimates from observed consultation durations.
+
+A consultation starts when the doctor finishes the previous patient or when the
+patient joins the queue, whichever is later, and ends when the patient is
+marked seen. Per doctor, an exponentially weighted mean and variance of those
+durations is kept (doctor_service_stats), starting from AVG_CONSULTATION_MINUTES
+so a doctor with little history gets the old flat estimate.
+
+A walk-in joining now waits for everyone already in the queue (the first one
+about half done) plus any booked appointment that falls due before their turn.
+The sum of those consultations is treated as roughly normal, so p50 is its
+mean and p90 adds 1.28 standard deviations.
+"""
+import math
+from datetime import datetime
+
+from config import AVG_CONSULTATION_MINUTES, WAIT_ESTIMATE_ALPHA, MAX_CONSULTATION_MINUTES
+
+Z_90 = 1.2816
+
+
+def parse_timestamp(value: str) -> datetime:
+    """
+    Naive local datetime from an ISO string. Workflow timestamps are UTC-aware;
+    everything else in the database is naive local time.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def prior_stats() -> dict:
+    return {"samples": 0, "mean": float(AVG_CONSULTATION_MINUTES), "variance": (AVG_CONSULTATION_MINUTES / 2) ** 2}
+
+
+def consultation_start(queued_at: str, previous_seen_at: str = None) -> datetime:
+    """When the doctor could start on a patient: on arrival, or once the previous patient was seen."""
+    start = parse_timestamp(queued_at)
+    if previous_seen_at is not None:
+        start = max(start, parse_timestamp(previous_seen_at))
+    return start
+
+
+def consultation_minutes(start: datetime, seen_at: str, appointments_between: int = 0):
+    """
+    Length of the consultation from `start` to `seen_at`, or None if it can't be trusted.
+    Booked appointments the doctor saw in between share the interval equally.
+    """
+    minutes = (parse_timestamp(seen_at) - start).total_seconds() / 60 / (1 + appointments_between)
+    if minutes <= 0 or minutes > MAX_CONSULTATION_MINUTES:
+        return None
+    return minutes
+
+
+def update_stats(stats: dict, minutes: float, alpha: float = WAIT_ESTIMATE_ALPHA) -> dict:
+    """Fold one consultation into the exponentially weighted mean and variance."""
+    diff = minutes - stats["mean"]
+    increment = alpha * diff
+    return {
+        "samples": stats["samples"] + 1,
+        "mean": stats["mean"] + increment,
+        "variance": (1 - alpha) * (stats["variance"] + diff * increment),
+    }
+
+
+def estimate_wait(walkins_ahead: int, appointment_offsets: list, stats: dict) -> dict:
+    """
+    p50 and p90 minutes until a walk-in joining now is called in, given the open
+    queue ahead of them and the booked appointments as minutes from now.
+    """
+    mean = stats["mean"]
+    ahead = walkins_ahead
+    # The first patient in the queue is usually already with the doctor, about half way through
+    expected = max(ahead - 0.5, 0) * mean
+    # Appointments due before the walk-in's turn go first and push it back
+    for offset in sorted(appointment_offsets):
+        if offset >= expected:
+            break
+        ahead += 1
+        expected += mean
+
+    p90 = expected + Z_90 * math.sqrt(ahead * stats["variance"])
+    return {"p50": round(expected), "p90": round(p90), "patients_ahead": ahead}
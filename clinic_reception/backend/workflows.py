@@ -1,23 +1,48 @@
 from temporalio import workflow
+from temporalio.exceptions import ActivityError
 import asyncio
 from datetime import timedelta
-from activities import (
-    check_doctor_availability,
-    get_patient_by_phone,
-    confirm_patient_appointment,
-    estimate_wait_time_for_walkin,
-    book_later_appointment,
-    add_to_walkin_queue,
-    register_patient,
-    generate_prescription_slip,
-    prescription_with_diagnosis,
-    get_random_diagnosis_and_medicines
-)
+from typing import Optional
+
+# Activities pull in sqlite3, python-docx and PyMuPDF; keep them out of the workflow sandbox
+with workflow.unsafe.imports_passed_through():
+    from config import (
+        RECEPTION_TASK_QUEUE,
+        PRESCRIPTION_RENDER_TASK_QUEUE,
+        CONSULTATION_TASK_QUEUE,
+        CONSULTATION_WORKFLOW_ID_SUFFIX,
+        DOCTOR_QUEUE_WORKFLOW_ID_PREFIX,
+        QUEUE_CHECKPOINT_BATCH_SIZE,
+        QUEUE_CHECKPOINT_INTERVAL,
+        QUEUE_MAX_HISTORY_EVENTS,
+        RECEPTION_LOCAL_ACTIVITIES,
+        BULK_RENDER_TASK_QUEUE,
+        BULK_RENDER_BATCH_SIZE,
+        BULK_RENDER_BATCHES_PER_RUN,
+    )
+    from activities import (
+        QueueActivities,
+        check_doctor_availability,
+        get_patient_by_phone,
+        confirm_patient_appointment,
+        estimate_wait_time_for_walkin,
+        book_later_appointment,
+        checkpoint_doctor_queue,
+        load_doctor_queue,
+        register_patient,
+        generate_prescription_slip,
+        discard_prescription_slip,
+        prescription_with_diagnosis,
+        render_prescription_batch,
+        get_random_diagnosis_and_medicines
+    )
+    from wait_estimator import estimate_wait, prior_stats
 
 @workflow.defn
 class ReceptionWorkflow:
     def __init__(self):
         self.wait_time = None
+        self.wait_time_p90 = None
         self.decision = None
         self.phone_number = None
         self.patient_info = None
@@ -28,6 +53,8 @@ class ReceptionWorkflow:
         self.medicines = None
         self.doctor_id = None
         self.doctor_name = None
+        self.result = None
+        self.slip = None  # handle of the initial slip render, started before it is known to be needed
 
     @workflow.signal
     async def provide_phone_number(self, phone_number: str):
@@ -52,6 +79,7 @@ class ReceptionWorkflow:
         return {
             "step": self.step,
             "wait_time": self.wait_time,
+            "wait_time_p90": self.wait_time_p90,
             "decision": self.decision,
             "phone_number": self.phone_number,
             "patient_info": self.patient_info,
@@ -60,25 +88,114 @@ class ReceptionWorkflow:
             "diagnosis": self.diagnosis,
             "medicines": self.medicines,
             "doctor_name": self.doctor_name,
+            "result": self.result,
         }
 
+    @workflow.update
+    async def wait_for_step(self, steps: list, timeout_seconds: float) -> dict:
+        """
+        Block until the workflow reaches one of `steps` (or completes), then return the status.
+        Lets the API return as soon as the next interactive step is ready instead of sleeping.
+        """
+        try:
+            await workflow.wait_condition(
+                lambda: self.step in steps or self.step == "completed",
+                timeout=timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            pass
+        return self.get_status()
+
+    @workflow.update
+    async def wait_for_change(self, known: Optional[dict], timeout_seconds: float) -> dict:
+        """
+        Block until the status differs from `known` (the last one the caller saw), then return it.
+        The API's status stream follows the workflow with this, one call per change.
+        """
+        try:
+            await workflow.wait_condition(lambda: self.get_status() != known, timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self.get_status()
+
+    @staticmethod
+    def _start_db_call(activity, *args):
+        """Start a quick DB call, as a local activity unless RECEPTION_LOCAL_ACTIVITIES is off."""
+        if RECEPTION_LOCAL_ACTIVITIES:
+            return workflow.start_local_activity(activity, args=list(args), start_to_close_timeout=timedelta(seconds=10))
+        return workflow.start_activity(activity, args=list(args), start_to_close_timeout=timedelta(seconds=10))
+
+    def _slip_data(self) -> dict:
+        return {
+            "name": self.patient_info["name"],
+            "phone": self.patient_info["phone_number"],
+            "age": self.patient_info["age"],
+            "gender": self.patient_info["gender"],
+            "address": self.patient_info["address"],
+        }
+
+    async def _consult(self, patient_id: int, walk_in: bool) -> str:
+        """Hand the patient and their slip to a ConsultationWorkflow child and wait for the final prescription."""
+        self.step = "generate_prescription"
+        self.prescription_slip = await self.slip
+        consultation = await workflow.execute_child_workflow(
+            ConsultationWorkflow.run,
+            args=[{"patient_id": patient_id, **self._slip_data()}, self.doctor_id, walk_in, self.prescription_slip],
+            id=f"{workflow.info().workflow_id}{CONSULTATION_WORKFLOW_ID_SUFFIX}",
+            task_queue=CONSULTATION_TASK_QUEUE,
+        )
+        self.prescription_slip = consultation["prescription_slip"]
+        self.diagnosis = consultation["diagnosis"]
+        self.medicines = consultation["medicines"]
+        return (f"Consultation completed for {self.patient_info['name']}!\n Final prescription with diagnosis: "
+                f"{consultation['final_pdf_url']}\n Diagnosis: {self.diagnosis}")
+
+    async def _discard_slip(self):
+        """Cancel the slip rendered ahead of time and delete it if it was rendered anyway."""
+        self.slip.cancel()
+        try:
+            # A render already running can't be stopped, so this waits for it to finish
+            slip = await self.slip
+        except ActivityError:
+            return
+        await workflow.execute_activity(
+            discard_prescription_slip,
+            slip,
+            task_queue=PRESCRIPTION_RENDER_TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=10)
+        )
+
     @workflow.run
     async def run(self, doctor_name: str) -> str:
+        try:
+            self.result = await self._run(doctor_name)
+        except asyncio.CancelledError:
+            # An abandoned session cancelled before the slip went to the consultation
+            if self.slip is not None and self.prescription_slip is None:
+                await self._discard_slip()
+            raise
+        self.step = "completed"
+        # Let pending wait_for_step updates return the final status before completing
+        await workflow.wait_condition(workflow.all_handlers_finished)
+        return self.result
+
+    async def _run(self, doctor_name: str) -> str:
         self.doctor_name = doctor_name
         self.step = "check_doctor"
 
         # Step 1: Check doctor availability
-        result = await workflow.execute_activity(
-            check_doctor_availability,
-            args=[doctor_name],
-            start_to_close_timeout=timedelta(seconds=10)
-        )
+        result = await self._start_db_call(check_doctor_availability, doctor_name)
 
         if result["available"]:
             self.doctor_id = result["doctor_id"]
             self.doctor_available = True
         else:
             self.doctor_available = False
+            next_shift = result.get("next_shift")
+            if next_shift:
+                return (f"Dr. {doctor_name} is not available at this time. Their next shift is "
+                        f"{next_shift['day']} {next_shift['start']}-{next_shift['end']}. "
+                        f"Please come back then or choose another doctor.")
             return f"Dr. {doctor_name} is not available at this time. Please try again later or choose another doctor."
 
         # Step 2: Wait for phone number
@@ -86,35 +203,22 @@ class ReceptionWorkflow:
         await workflow.wait_condition(lambda: self.phone_number is not None)
 
         # Step 3: Look up patient by phone        
-        self.patient_info = await workflow.execute_activity(
-            get_patient_by_phone,
-            args=[self.phone_number],
-            start_to_close_timeout=timedelta(seconds=10)
-        )
+        self.patient_info = await self._start_db_call(get_patient_by_phone, self.phone_number)
 
         if not self.patient_info:
             # Patient not found - need registration
             self.step = "register_patient"
             await workflow.wait_condition(lambda: self.patient_info is not None)
 
-            # Register the patient
-            await workflow.execute_activity(
+            # Register the patient; the activity returns the stored record. It runs where the phone
+            # lookups do, so it writes the new record through to the patient cache they read.
+            self.patient_info = await self._start_db_call(
                 register_patient,
-                args=[
-                    self.patient_info["name"], 
-                    self.phone_number, 
-                    self.patient_info["gender"], 
-                    self.patient_info["age"], 
-                    self.patient_info["address"]
-                ],
-                start_to_close_timeout=timedelta(seconds=10)
-            )
-
-            # Fetch the newly registered patient
-            self.patient_info = await workflow.execute_activity(
-                get_patient_by_phone,
-                args=[self.phone_number],
-                start_to_close_timeout=timedelta(seconds=10)
+                self.patient_info["name"],
+                self.phone_number,
+                self.patient_info["gender"],
+                self.patient_info["age"],
+                self.patient_info["address"],
             )
 
             if not self.patient_info:
@@ -123,67 +227,30 @@ class ReceptionWorkflow:
         patient_id = self.patient_info["patient_id"]
         patient_name = self.patient_info["name"]
 
-        # Step 4: Check for existing appointment
+        # Step 4: Check for an existing appointment and estimate the walk-in wait together. The
+        # initial slip is needed whenever the patient is seen, so start rendering it now too; it is
+        # dropped if they book for later instead.
         self.step = "check_appointment"
-        
-        has_appointment = await workflow.execute_activity(
-            confirm_patient_appointment,
-            args=[patient_id, self.doctor_id],
-            start_to_close_timeout=timedelta(seconds=10)
+        self.slip = workflow.start_activity(
+            generate_prescription_slip,
+            args=[self._slip_data()],
+            task_queue=PRESCRIPTION_RENDER_TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=20),
+            # Cancelled, it still reports a slip it went on to write, so the slip can be deleted
+            cancellation_type=workflow.ActivityCancellationType.WAIT_CANCELLATION_COMPLETED,
+        )
+        has_appointment, estimate = await asyncio.gather(
+            self._start_db_call(confirm_patient_appointment, patient_id, self.doctor_id),
+            self._start_db_call(estimate_wait_time_for_walkin, self.doctor_id),
         )
 
         if has_appointment:
             # Patient has appointment - direct to consultation
-            self.step = "generate_prescription"
-            
-            # Generate initial prescription slip
-            slip_result = await workflow.execute_activity(
-                generate_prescription_slip,
-                args=[{
-                    "name": self.patient_info["name"],
-                    "phone": self.patient_info["phone_number"],
-                    "age": self.patient_info["age"],
-                    "gender": self.patient_info["gender"],
-                    "address": self.patient_info["address"],
-                }],
-                start_to_close_timeout=timedelta(seconds=20)
-            )
-
-            self.prescription_slip = slip_result
-            
-            # Wait 8 seconds before proceeding to diagnosis
-            await asyncio.sleep(8)
-            
-            # Add diagnosis generation step
-            self.step = "diagnosis_generation"
-            
-            # Get diagnosis and medicines (simulate doctor consultation)
-            diagnosis_data = await workflow.execute_activity(
-                get_random_diagnosis_and_medicines,
-                start_to_close_timeout=timedelta(seconds=10)
-            )
-            self.diagnosis = diagnosis_data["diagnosis"]
-            self.medicines = diagnosis_data["medicines"]
+            return await self._consult(patient_id, walk_in=False)
 
-            self.step = "finalize_prescription"
-            
-            # Generate final prescription with diagnosis and medicines
-            final_pdf_url = await workflow.execute_activity(
-                prescription_with_diagnosis,
-                args=[self.prescription_slip["unique_id"], self.diagnosis, self.medicines],
-                start_to_close_timeout=timedelta(seconds=20)
-            )
-                          
-            return f"Consultation completed for {patient_name}!\n Final prescription with diagnosis: {final_pdf_url}\n Diagnosis: {self.diagnosis}"
-
-        # No appointment - calculate wait time
-        self.step = "calculate_wait"
-        
-        self.wait_time = await workflow.execute_activity(
-            estimate_wait_time_for_walkin,
-            args=[self.doctor_id],
-            start_to_close_timeout=timedelta(seconds=10)
-        )
+        # No appointment - offer the walk-in wait
+        self.wait_time = estimate["p50"]
+        self.wait_time_p90 = estimate["p90"]
 
         # Wait for patient decision
         self.step = "make_decision"
@@ -191,70 +258,307 @@ class ReceptionWorkflow:
 
         # Process decision
         if self.decision == "continue":
-            # Add to walk-in queue
+            # Add to the doctor's live walk-in queue
             self.step = "add_to_queue"
             
-            await workflow.execute_activity(
-                add_to_walkin_queue,
-                args=[patient_id, self.doctor_id],
-                start_to_close_timeout=timedelta(seconds=10)
-            )
-
-            await asyncio.sleep(1)
-
-            # Generate prescription slip
-            self.step = "generate_prescription"
-            
-            slip_result = await workflow.execute_activity(
-                generate_prescription_slip,
-                args=[{
-                    "name": self.patient_info["name"],
-                    "phone": self.patient_info["phone_number"],
-                    "age": self.patient_info["age"],
-                    "gender": self.patient_info["gender"],
-                    "address": self.patient_info["address"],
+            await workflow.execute_activity_method(
+                QueueActivities.join_doctor_queue,
+                args=[self.doctor_id, {
+                    "patient_id": patient_id,
+                    "patient_name": patient_name,
+                    "workflow_id": workflow.info().workflow_id,
+                    "queued_at": workflow.now().isoformat(),
                 }],
-                start_to_close_timeout=timedelta(seconds=20)
-            )
-
-            self.prescription_slip = slip_result
-            
-            # Wait 8 seconds before proceeding to diagnosis
-            await asyncio.sleep(8)
-            
-            # Add diagnosis generation step
-            self.step = "diagnosis_generation"
-            
-            # Get diagnosis and medicines (simulate doctor consultation)
-            diagnosis_data = await workflow.execute_activity(
-                get_random_diagnosis_and_medicines,
                 start_to_close_timeout=timedelta(seconds=10)
             )
-            self.diagnosis = diagnosis_data["diagnosis"]
-            self.medicines = diagnosis_data["medicines"]
-            
-            self.step = "finalize_prescription"
-            
-            # Generate final prescription
-            final_pdf_url = await workflow.execute_activity(
-                prescription_with_diagnosis,
-                args=[self.prescription_slip["unique_id"], self.diagnosis, self.medicines],
-                start_to_close_timeout=timedelta(seconds=20)
-            )
 
-            return f"Consultation completed for {patient_name}!\n Final prescription with diagnosis: {final_pdf_url}\n Diagnosis: {self.diagnosis}"
+            return await self._consult(patient_id, walk_in=True)
 
-        # Book later appointment
+        # Book later appointment; the speculative slip is not needed, so it goes while booking
         self.step = "book_appointment"
-        
+        discarded = asyncio.create_task(self._discard_slip())
+
         result = await workflow.execute_activity(
             book_later_appointment,
             args=[patient_id, self.doctor_id],
             start_to_close_timeout=timedelta(seconds=20)
         )
+        await discarded
 
         if isinstance(result, str):
             return f"Booking failed: {result}"
 
         patient_id, doctor_id, appointment_time = result
-        return f"Appointment scheduled successfully!\n Patient: {patient_name}\n Doctor: Dr. {doctor_name}\n Appointment time: {appointment_time}\n Please arrive 15 minutes early."
\ No newline at end of file
+        return f"Appointment scheduled successfully!\n Patient: {patient_name}\n Doctor: Dr. {doctor_name}\n Appointment time: {appointment_time}\n Please arrive 15 minutes early."
+
+
+@workflow.defn
+class ConsultationWorkflow:
+    """
+    One consultation: initial slip, the doctor's diagnosis, final prescription.
+
+    Started as a child of ReceptionWorkflow for both booked and walk-in
+    patients, so the reception history only records the child's start and
+    result. It runs on CONSULTATION_TASK_QUEUE. The initial slip comes rendered
+    from the parent. Walk-ins leave the doctor's queue once diagnosed.
+    """
+
+    def __init__(self):
+        self.step = "generate_prescription"
+        self.prescription_slip = None
+        self.diagnosis = None
+        self.medicines = None
+
+    @workflow.query
+    def get_status(self) -> dict:
+        return {
+            "step": self.step,
+            "prescription_slip": self.prescription_slip,
+            "diagnosis": self.diagnosis,
+            "medicines": self.medicines,
+        }
+
+    @workflow.update
+    async def wait_for_change(self, known: Optional[dict], timeout_seconds: float) -> dict:
+        """Block until the status differs from `known`, then return it; see ReceptionWorkflow.wait_for_change."""
+        try:
+            await workflow.wait_condition(lambda: self.get_status() != known, timeout=timeout_seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self.get_status()
+
+    @workflow.run
+    async def run(self, patient: dict, doctor_id: int, walk_in: bool, prescription_slip: dict) -> dict:
+        self.prescription_slip = prescription_slip
+
+        # Wait 8 seconds before proceeding to diagnosis
+        await asyncio.sleep(8)
+
+        # Get diagnosis and medicines (simulate doctor consultation)
+        self.step = "diagnosis_generation"
+        diagnosis_data = await workflow.execute_activity(
+            get_random_diagnosis_and_medicines,
+            task_queue=RECEPTION_TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=10)
+        )
+        self.diagnosis = diagnosis_data["diagnosis"]
+        self.medicines = diagnosis_data["medicines"]
+
+        if walk_in:
+            # The doctor has seen the patient, so they leave the queue
+            await workflow.get_external_workflow_handle(
+                f"{DOCTOR_QUEUE_WORKFLOW_ID_PREFIX}{doctor_id}"
+            ).signal("patient_seen", patient["patient_id"])
+
+        # Generate final prescription with diagnosis and medicines
+        self.step = "finalize_prescription"
+        final_pdf_url = await workflow.execute_activity(
+            prescription_with_diagnosis,
+            args=[self.prescription_slip, self.diagnosis, self.medicines],
+            task_queue=PRESCRIPTION_RENDER_TASK_QUEUE,
+            start_to_close_timeout=timedelta(seconds=20)
+        )
+        self.step = "completed"
+        # Let pending wait_for_change updates return the final status before completing
+        await workflow.wait_condition(workflow.all_handlers_finished)
+        return {
+            "prescription_slip": self.prescription_slip,
+            "diagnosis": self.diagnosis,
+            "medicines": self.medicines,
+            "final_pdf_url": final_pdf_url,
+        }
+
+
+@workflow.defn
+class DoctorQueueWorkflow:
+    """
+    The live walk-in queue of one doctor, one long-running workflow per doctor.
+
+    Reception workflows join it with signal-with-start, the doctor's side
+    signals when a patient has been seen, and positions and waits are queried
+    straight from memory. Changes are written to SQLite in batches, and the
+    workflow continues as new before its history grows large, carrying the
+    queue and any unwritten changes with it. A first run takes over the open
+    entries already in SQLite, so patients queued before it started keep their
+    place and are closed when seen. Waits come from the doctor's
+    learned consultation statistics, as of the last checkpoint, so they match
+    the estimate a walk-in is given at reception.
+    """
+
+    def __init__(self):
+        self.doctor_id = None
+        self.queue = []  # open entries in arrival order
+        self.pending = []  # changes not yet written to SQLite
+        self.served = 0
+        self.service_stats = prior_stats()
+
+    def _wait(self, position: int) -> dict:
+        """The walk-in estimate for someone with position - 1 patients ahead, without booked appointments."""
+        estimate = estimate_wait(position - 1, [], self.service_stats)
+        return {"wait_time": estimate["p50"], "wait_time_p90": estimate["p90"]}
+
+    @workflow.signal
+    async def enqueue(self, entry: dict):
+        if any(queued["patient_id"] == entry["patient_id"] for queued in self.queue):
+            return
+        self.queue.append(entry)
+        self.pending.append({"type": "enqueued", "patient_id": entry["patient_id"], "queued_at": entry["queued_at"]})
+
+    @workflow.signal
+    async def patient_seen(self, patient_id: Optional[int] = None):
+        """The doctor has seen this patient, or the one at the head of the queue when None."""
+        if patient_id is None:
+            index = 0 if self.queue else None
+        else:
+            index = next((i for i, queued in enumerate(self.queue) if queued["patient_id"] == patient_id), None)
+        if index is None:
+            return
+        entry = self.queue.pop(index)
+        self.served += 1
+        self.pending.append({
+            "type": "seen",
+            "patient_id": entry["patient_id"],
+            "queued_at": entry["queued_at"],
+            "seen_at": workflow.now().isoformat(),
+        })
+
+    @workflow.query
+    def get_queue(self) -> dict:
+        return {
+            "doctor_id": self.doctor_id,
+            "length": len(self.queue),
+            "served": self.served,
+            "patients": [
+                {**entry, "position": position, **self._wait(position)}
+                for position, entry in enumerate(self.queue, start=1)
+            ],
+        }
+
+    @workflow.query
+    def get_position(self, patient_id: int) -> dict:
+        for position, entry in enumerate(self.queue, start=1):
+            if entry["patient_id"] == patient_id:
+                return {"position": position, **self._wait(position)}
+        return {"position": None, "wait_time": None, "wait_time_p90": None}
+
+    def _history_full(self) -> bool:
+        info = workflow.info()
+        return info.is_continue_as_new_suggested() or info.get_current_history_length() >= QUEUE_MAX_HISTORY_EVENTS
+
+    async def _load_open_entries(self):
+        entries = await workflow.execute_activity(
+            load_doctor_queue,
+            self.doctor_id,
+            start_to_close_timeout=timedelta(seconds=10)
+        )
+        stored = {entry["patient_id"] for entry in entries}
+        # Signals handled while loading: a stored patient joining again keeps the older entry,
+        # and one already seen doesn't come back
+        seen = {event["patient_id"] for event in self.pending if event["type"] == "seen"}
+        self.queue = [entry for entry in entries if entry["patient_id"] not in seen] + [
+            entry for entry in self.queue if entry["patient_id"] not in stored
+        ]
+        self.pending = [
+            event for event in self.pending if event["type"] == "seen" or event["patient_id"] not in stored
+        ]
+
+    async def _checkpoint(self):
+        batch, self.pending = self.pending, []
+        stats = await workflow.execute_activity(
+            checkpoint_doctor_queue,
+            args=[self.doctor_id, batch],
+            start_to_close_timeout=timedelta(seconds=10)
+        )
+        # Checkpoints recorded before the statistics were returned have no result
+        if stats:
+            self.service_stats = stats
+
+    @workflow.run
+    async def run(self, doctor_id: int, state: Optional[dict] = None):
+        self.doctor_id = doctor_id
+        if state:
+            self.queue = state["queue"]
+            self.pending = state["pending"]
+            self.served = state["served"]
+            self.service_stats = state.get("service_stats", self.service_stats)
+        else:
+            await self._load_open_entries()
+
+        while True:
+            # Idle until something changes; no timers run while the queue is quiet
+            await workflow.wait_condition(lambda: bool(self.pending) or self._history_full())
+
+            if self.pending:
+                # Let the batch fill up for a while before writing it
+                try:
+                    await workflow.wait_condition(
+                        lambda: len(self.pending) >= QUEUE_CHECKPOINT_BATCH_SIZE,
+                        timeout=QUEUE_CHECKPOINT_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    pass
+                await self._checkpoint()
+
+            if self._history_full():
+                await workflow.wait_condition(workflow.all_handlers_finished)
+                workflow.continue_as_new(args=[doctor_id, {
+                    "queue": self.queue,
+                    "pending": self.pending,
+                    "served": self.served,
+                    "service_stats": self.service_stats,
+                }])
+
+
+@workflow.defn
+class BulkPrescriptionRenderWorkflow:
+    """
+    Renders a JSON lines file of prescription records (slips or consultation
+    results) to PDFs under one name, for reprints after a template change and
+    end-of-day archives. Only the file's path goes into the history: each
+    heartbeating activity on BULK_RENDER_TASK_QUEUE reads its own batch of
+    BULK_RENDER_BATCH_SIZE records from where the last one stopped, so a worker
+    crash costs at most the records since the last heartbeat. The workflow
+    continues as new every BULK_RENDER_BATCHES_PER_RUN batches, carrying the
+    position and counts; failed records are listed in files beside the PDFs.
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.rendered = 0
+        self.failed = 0
+
+    @workflow.query
+    def get_progress(self) -> dict:
+        """Progress as of the last finished batch."""
+        return {"records": self.records, "rendered": self.rendered, "failed": self.failed}
+
+    @workflow.run
+    async def run(self, source: str, name: str, state: Optional[dict] = None) -> dict:
+        position = 0
+        if state:
+            position = state["position"]
+            self.records = state["records"]
+            self.rendered = state["rendered"]
+            self.failed = state["failed"]
+
+        for _ in range(BULK_RENDER_BATCHES_PER_RUN):
+            result = await workflow.execute_activity(
+                render_prescription_batch,
+                args=[source, name, position, self.records],
+                task_queue=BULK_RENDER_TASK_QUEUE,
+                start_to_close_timeout=timedelta(hours=1),
+                heartbeat_timeout=timedelta(seconds=60),
+            )
+            position = result["next_position"]
+            self.records += result["records"]
+            self.rendered += result["rendered"]
+            self.failed += result["failed"]
+            if result["records"] < BULK_RENDER_BATCH_SIZE:
+                return {"name": name, "records": self.records, "rendered": self.rendered, "failed": self.failed}
+
+        workflow.continue_as_new(args=[source, name, {
+            "position": position,
+            "records": self.records,
+            "rendered": self.rendered,
+            "failed": self.failed,
+        }])
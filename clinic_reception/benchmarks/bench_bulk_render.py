@@ -0,0 +1,101 @@
+"""
+Bulk prescription rendering: one record at a time vs the bulk render activity.
+
+One at a time is what a reprint through the live path costs: each final
+prescription rendered in turn by render_final_prescription (DOCX copy plus
+PDF). The bulk activity, render_prescription_batch, reads the same records
+from a JSON lines file and renders them as one batch on the bulk render pool's
+--processes processes, PDF only. The pool is started first, as the worker does,
+and its startup reported apart. The activity is run through Temporal's activity
+test environment, and once more resuming from a heartbeat halfway through, as
+a retry after a worker crash would.
+
+    cd benchmarks
+    python bench_bulk_render.py --records 500 --processes 4
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+
+def make_records(count):
+    return [
+        {
+            "unique_id": f"bench-{n:06d}",
+            "data": {"name": f"Patient{n}", "phone": f"555{n:07d}", "age": "30", "gender": "Female",
+                     "address": "Somewhere", "date": "2025-07-03"},
+            "diagnosis": "Viral Fever",
+            "medicines": ["Paracetamol 500mg", "Cetrizine 10mg", "Vitamin C"],
+        }
+        for n in range(count)
+    ]
+
+
+async def run(args):
+    import activities
+    from executors import BULK_RENDER_EXECUTOR
+    from temporalio.testing import ActivityEnvironment
+
+    records = make_records(args.records)
+    source = os.path.abspath("records.jsonl")
+    with open(source, "w") as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+    start = time.perf_counter()
+    for record in records:
+        activities.render_final_prescription(record, record["diagnosis"], record["medicines"])
+    serial = time.perf_counter() - start
+    print(f"one at a time: {serial:6.2f}s  {args.records / serial:7.1f} prescriptions/s")
+
+    start = time.perf_counter()
+    await BULK_RENDER_EXECUTOR.warm_up()
+    print(f"pool startup:  {time.perf_counter() - start:6.2f}s  ({args.processes} processes)")
+
+    heartbeats = []
+    env = ActivityEnvironment()
+    env.on_heartbeat = lambda *details: heartbeats.append(details[0])
+    start = time.perf_counter()
+    result = await env.run(activities.render_prescription_batch, source, "bench", 0, 0)
+    bulk = time.perf_counter() - start
+    print(f"bulk:          {bulk:6.2f}s  {args.records / bulk:7.1f} prescriptions/s  "
+          f"({serial / bulk:.1f}x, {len(heartbeats)} heartbeats, {result['failed']} failed)")
+
+    # A retry sees the last heartbeat and only renders what is left
+    halfway = args.records // 2
+    env.info = dataclasses.replace(env.info, heartbeat_details=[halfway, []])
+    start = time.perf_counter()
+    result = await env.run(activities.render_prescription_batch, source, "bench", 0, 0)
+    resumed = time.perf_counter() - start
+    written = len(os.listdir(os.path.join(activities.BULK_OUTPUT_DIR, "bench")))
+    print(f"resumed at {result['resumed_from']}: {resumed:6.2f}s, {result['rendered']} rendered, {written} files")
+    BULK_RENDER_EXECUTOR.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=500)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Configuration is read at import time
+        os.environ["BULK_RENDER_PROCESSES"] = str(args.processes)
+        os.environ["BULK_RENDER_BATCH_SIZE"] = str(args.records)
+        # Activities resolve the template and their output relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.symlink(os.path.join(os.path.abspath(ROOT_DIR), "prescription"), os.path.join(tmp, "prescription"))
+        os.chdir(os.path.join(tmp, "backend"))
+        sys.path.insert(0, BACKEND_DIR)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
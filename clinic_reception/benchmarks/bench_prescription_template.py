@@ -0,0 +1,75 @@
+"""
+Slips/sec for prescription rendering: re-parsing the DOCX per slip vs the compiled template.
+
+    cd benchmarks
+    python bench_prescription_template.py --slips 200
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from docx import Document
+
+from prescription_pdf import document_layout, render_pdf
+from prescription_template import get_template
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prescription", "prescription_template.docx")
+
+SAMPLE = {
+    "name": "Alice",
+    "phone": "1234567890",
+    "age": "35",
+    "gender": "Female",
+    "address": "123 Elm Street, NY",
+    "date": "2025-07-03",
+}
+
+
+def reparse_per_slip(out_dir, i):
+    """The previous approach: open the template and scan every paragraph for every key."""
+    doc = Document(TEMPLATE_PATH)
+    for p in doc.paragraphs:
+        for key, value in SAMPLE.items():
+            placeholder = f"{{{{{key}}}}}"
+            if placeholder in p.text:
+                p.text = p.text.replace(placeholder, str(value))
+    doc.save(os.path.join(out_dir, f"{i}.docx"))
+    render_pdf(document_layout(doc), os.path.join(out_dir, f"{i}.pdf"))
+
+
+def compiled_with_docx(out_dir, i):
+    template = get_template(TEMPLATE_PATH)
+    template.fill_document(SAMPLE).save(os.path.join(out_dir, f"{i}.docx"))
+    render_pdf(template.fill_layout(SAMPLE), os.path.join(out_dir, f"{i}.pdf"))
+
+
+def compiled_pdf_only(out_dir, i):
+    render_pdf(get_template(TEMPLATE_PATH).fill_layout(SAMPLE), os.path.join(out_dir, f"{i}.pdf"))
+
+
+def run(name, fn, slips):
+    with tempfile.TemporaryDirectory() as out_dir:
+        fn(out_dir, -1)  # warm up (and compile the template once)
+        start = time.perf_counter()
+        for i in range(slips):
+            fn(out_dir, i)
+        elapsed = time.perf_counter() - start
+    print(f"{name:<24} {slips / elapsed:8.1f} slips/sec  {elapsed / slips * 1000:6.2f} ms/slip")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slips", type=int, default=200)
+    args = parser.parse_args()
+
+    run("re-parse per slip", reparse_per_slip, args.slips)
+    run("compiled + docx", compiled_with_docx, args.slips)
+    run("compiled, pdf only", compiled_pdf_only, args.slips)
+
+
+if __name__ == "__main__":
+    main()
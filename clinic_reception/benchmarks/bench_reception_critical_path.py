@@ -0,0 +1,166 @@
+"""
+Reception critical path with the per-patient activities run one after another vs together.
+
+Once ReceptionWorkflow knows the patient it needs the appointment check, the
+walk-in wait estimate and the initial slip. Sequentially, a walk-in's decision
+prompt waits for the check plus the estimate, and their slip is only rendered
+after they choose to stay. Concurrently, the prompt waits for the slower of the
+two, and the slip is rendered while the patient decides. This runs both
+orders with the real activities on a scratch database, --sessions patients
+arriving over --arrival-seconds per round, and adds --dispatch-ms per activity for the Temporal round trip
+(scheduling the task and delivering its result). Walk-ins take
+--decision-seconds to decide, which is not counted.
+
+    cd benchmarks
+    python bench_reception_critical_path.py --sessions 20 --arrival-seconds 1
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, ROOT_DIR)
+
+from schema import migrate
+
+DOCTOR_ID = 1
+PATIENTS = 1000
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def seed_database(path):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, 'Doctor1', 'General', ?, '00:00:00', '23:59:59')",
+        [(DOCTOR_ID, day) for day in WEEKDAYS],
+    )
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, 'Female', '30', 'Somewhere')",
+        [(p, f"Patient{p}", f"555{p:07d}") for p in range(1, PATIENTS + 1)],
+    )
+    # Every other patient has an appointment today
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    conn.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status) VALUES (?, ?, ?, 'scheduled')",
+        [(p, DOCTOR_ID, (today + timedelta(seconds=p)).isoformat()) for p in range(1, PATIENTS + 1, 2)],
+    )
+    conn.commit()
+    conn.close()
+
+
+class Reception:
+    """The activity calls of one reception after the patient is known, with a dispatch delay per call."""
+
+    def __init__(self, activities, dispatch, decision):
+        self.activities = activities
+        self.dispatch = dispatch
+        self.decision = decision
+
+    async def call(self, fn, *args):
+        await asyncio.sleep(self.dispatch / 2)
+        result = await fn(*args)
+        await asyncio.sleep(self.dispatch / 2)
+        return result
+
+    async def arrive(self, mode, patient_id, delay):
+        await asyncio.sleep(delay)
+        return await getattr(self, mode)(patient_id)
+
+    def slip(self, patient_id):
+        return self.call(self.activities.generate_prescription_slip, {
+            "name": f"Patient{patient_id}", "phone": f"555{patient_id:07d}",
+            "age": "30", "gender": "Female", "address": "Somewhere",
+        })
+
+    async def sequential(self, patient_id):
+        """(seconds to the decision prompt or None, seconds to the slip), human time excluded."""
+        start = time.perf_counter()
+        if await self.call(self.activities.confirm_patient_appointment, patient_id, DOCTOR_ID):
+            await self.slip(patient_id)
+            return None, time.perf_counter() - start
+        await self.call(self.activities.estimate_wait_time_for_walkin, DOCTOR_ID)
+        prompt = time.perf_counter() - start
+        await asyncio.sleep(self.decision)
+        # The patient stays; the slip is only started now
+        decided = time.perf_counter()
+        await self.slip(patient_id)
+        return prompt, time.perf_counter() - decided
+
+    async def concurrent(self, patient_id):
+        start = time.perf_counter()
+        slip = asyncio.ensure_future(self.slip(patient_id))
+        has_appointment, _ = await asyncio.gather(
+            self.call(self.activities.confirm_patient_appointment, patient_id, DOCTOR_ID),
+            self.call(self.activities.estimate_wait_time_for_walkin, DOCTOR_ID),
+        )
+        if has_appointment:
+            await slip
+            return None, time.perf_counter() - start
+        prompt = time.perf_counter() - start
+        await asyncio.sleep(self.decision)
+        decided = time.perf_counter()
+        await slip
+        return prompt, time.perf_counter() - decided
+
+
+def summarize(name, values):
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"{name:<34} p50 {statistics.median(values) * 1000:7.1f} ms  p95 {p95 * 1000:7.1f} ms"
+
+
+async def run(args):
+    import activities
+
+    reception = Reception(activities, args.dispatch_ms / 1000, args.decision_seconds)
+    for mode in ("sequential", "concurrent"):
+        prompts, appointment_slips, walkin_slips = [], [], []
+        for _ in range(args.rounds):
+            patients = random.sample(range(1, PATIENTS + 1), args.sessions)
+            sessions = (reception.arrive(mode, p, random.uniform(0, args.arrival_seconds)) for p in patients)
+            for prompt, slip in await asyncio.gather(*sessions):
+                if prompt is None:
+                    appointment_slips.append(slip)
+                else:
+                    prompts.append(prompt)
+                    walkin_slips.append(slip)
+        print(f"{mode}:")
+        print("  " + summarize("walk-in: to decision prompt", prompts))
+        print("  " + summarize("walk-in: decision to slip ready", walkin_slips))
+        print("  " + summarize("appointment: to slip ready", appointment_slips))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="receptions per round")
+    parser.add_argument("--arrival-seconds", type=float, default=1, help="window over which a round's patients arrive")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--dispatch-ms", type=float, default=10, help="Temporal round trip added to every activity")
+    parser.add_argument("--decision-seconds", type=float, default=1, help="time a walk-in takes to decide to stay")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "clinic.db")
+        seed_database(db_path)
+
+        # Configuration is read at import time, so point it at the scratch database first
+        os.environ["CLINIC_DB_PATH"] = db_path
+        # Activities resolve the template and their output relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.symlink(os.path.join(os.path.abspath(ROOT_DIR), "prescription"), os.path.join(tmp, "prescription"))
+        os.chdir(os.path.join(tmp, "backend"))
+        sys.path.insert(0, BACKEND_DIR)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Lookup latency on the legacy (pandas.to_sql, no keys or indexes) tables vs the migrated schema.
+
+Builds a legacy database at the requested scale, copies it and runs the
+schema migrations on the copy, then times the lookups the activities issue.
+
+    cd benchmarks
+    python bench_schema_lookups.py --patients 1000000 --appointments 10000000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from schema import migrate
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+START = datetime(2023, 1, 2, 8, 0)
+SLOTS_PER_DAY = 48
+
+
+def slot(i):
+    """The i-th 15-minute slot from START, over 12-hour days."""
+    day, offset = divmod(i, SLOTS_PER_DAY)
+    return (START + timedelta(days=day, minutes=15 * offset)).isoformat()
+
+
+def build_legacy(path, args):
+    rng = random.Random(42)
+    conn = sqlite3.connect(path)
+    conn.executescript("""
+        PRAGMA journal_mode=OFF;
+        PRAGMA synchronous=OFF;
+        CREATE TABLE doctor_schedule (doctor_id INTEGER, name TEXT, specialization TEXT,
+                                      day_of_week TEXT, start_time TEXT, end_time TEXT);
+        CREATE TABLE patients (patient_id INTEGER, name TEXT, phone TEXT, gender TEXT, age INTEGER, address TEXT);
+        CREATE TABLE appointments (patient_id INTEGER, doctor_id INTEGER, appointment_datetime TEXT, status TEXT);
+        CREATE TABLE doctor_queue (doctor_id INTEGER, patient_id INTEGER, queued_at TEXT, seen TEXT);
+        CREATE TABLE diagnosis_medicines (diagnosis TEXT, medicines TEXT);
+    """)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, ?, 'General', ?, '08:00:00', '20:00:00')",
+        ((d, f"Doctor{d}", day) for d in range(1, args.doctors + 1) for day in WEEKDAYS),
+    )
+    conn.executemany(
+        "INSERT INTO patients VALUES (?, ?, ?, 'Female', 30, 'Somewhere')",
+        ((p, f"Patient{p}", f"9{p:09d}") for p in range(1, args.patients + 1)),
+    )
+    conn.executemany(
+        "INSERT INTO appointments VALUES (?, ?, ?, ?)",
+        (
+            (rng.randint(1, args.patients), rng.randint(1, args.doctors), slot(rng.randrange(args.days * SLOTS_PER_DAY)),
+             "scheduled" if rng.random() < 0.2 else "completed")
+            for _ in range(args.appointments)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO doctor_queue VALUES (?, ?, ?, ?)",
+        (
+            (rng.randint(1, args.doctors), rng.randint(1, args.patients), slot(i % (args.days * SLOTS_PER_DAY)),
+             "no" if rng.random() < 0.001 else "yes")
+            for i in range(args.queue)
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+LEGACY_QUERIES = {
+    "patient by phone": "SELECT patient_id FROM patients WHERE phone = ?",
+    "doctor on shift": """SELECT doctor_id FROM doctor_schedule WHERE LOWER(name) = LOWER(?) AND day_of_week = ?
+                          AND start_time <= ? AND end_time >= ?""",
+    "appointment today": """SELECT 1 FROM appointments WHERE patient_id = ? AND doctor_id = ?
+                            AND appointment_datetime >= ? AND appointment_datetime < ? AND status = 'scheduled' LIMIT 1""",
+    "slot booked": "SELECT 1 FROM appointments WHERE doctor_id = ? AND appointment_datetime = ? AND status = 'scheduled'",
+    "open queue count": "SELECT COUNT(*) FROM doctor_queue WHERE doctor_id = ? AND (seen IS NULL OR seen = 'no')",
+}
+
+SCHEMA_QUERIES = {
+    **LEGACY_QUERIES,
+    "doctor on shift": """SELECT doctor_id FROM doctor_schedule WHERE name = ? AND day_of_week = ?
+                          AND start_time <= ? AND end_time >= ?""",
+    "open queue count": "SELECT COUNT(*) FROM doctor_queue WHERE doctor_id = ? AND seen = 'no'",
+}
+
+
+def lookup_params(name, rng, args):
+    day = START + timedelta(days=rng.randrange(args.days))
+    if name == "patient by phone":
+        return (f"9{rng.randint(1, args.patients):09d}",)
+    if name == "doctor on shift":
+        return (f"doctor{rng.randint(1, args.doctors)}", rng.choice(WEEKDAYS), "12:00:00", "12:00:00")
+    if name == "appointment today":
+        return (rng.randint(1, args.patients), rng.randint(1, args.doctors), day.isoformat(),
+                (day + timedelta(days=1)).isoformat())
+    if name == "slot booked":
+        return (rng.randint(1, args.doctors), slot(rng.randrange(args.days * SLOTS_PER_DAY)))
+    return (rng.randint(1, args.doctors),)
+
+
+def time_lookups(path, queries, repeats, args):
+    conn = sqlite3.connect(path)
+    results = {}
+    for name, sql in queries.items():
+        rng = random.Random(7)
+        params = [lookup_params(name, rng, args) for _ in range(repeats)]
+        start = time.perf_counter()
+        for p in params:
+            conn.execute(sql, p).fetchall()
+        results[name] = (time.perf_counter() - start) / repeats
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--appointments", type=int, default=10_000_000)
+    parser.add_argument("--queue", type=int, default=1_000_000, help="doctor_queue history rows")
+    parser.add_argument("--doctors", type=int, default=200)
+    parser.add_argument("--days", type=int, default=3 * 365, help="days of appointment history")
+    parser.add_argument("--legacy-repeats", type=int, default=5, help="lookups per query on the unindexed tables")
+    parser.add_argument("--repeats", type=int, default=2000, help="lookups per query on the migrated schema")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        migrated_path = os.path.join(tmp, "migrated.db")
+
+        start = time.perf_counter()
+        build_legacy(legacy_path, args)
+        print(f"built legacy database in {time.perf_counter() - start:.1f}s")
+
+        shutil.copy(legacy_path, migrated_path)
+        start = time.perf_counter()
+        conn = sqlite3.connect(migrated_path)
+        migrate(conn)
+        conn.close()
+        print(f"migrated copy in {time.perf_counter() - start:.1f}s")
+
+        legacy = time_lookups(legacy_path, LEGACY_QUERIES, args.legacy_repeats, args)
+        migrated = time_lookups(migrated_path, SCHEMA_QUERIES, args.repeats, args)
+
+    print(f"\n{args.patients:,} patients, {args.appointments:,} appointments, {args.queue:,} queue rows")
+    print(f"{'lookup':<20} {'legacy':>12} {'migrated':>12} {'speedup':>10}")
+    for name in LEGACY_QUERIES:
+        print(f"{name:<20} {legacy[name] * 1e6:10.0f}us {migrated[name] * 1e6:10.1f}us {legacy[name] / migrated[name]:9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
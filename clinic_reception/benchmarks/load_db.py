@@ -0,0 +1,142 @@
+"""
+Sustained DB throughput of the reception activities under concurrent sessions.
+
+Each simulated session runs the same activity sequence as ReceptionWorkflow
+(availability check, phone lookup, registration for new patients,
+appointment check, wait estimate, then queue checkpoint or booking) against a scratch
+SQLite database, through the real DB executor and repository.
+
+    cd benchmarks
+    python load_db.py --sessions 50 --duration 20
+    python load_db.py --sessions 50 --duration 20 --journal-mode DELETE
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, ROOT_DIR)
+
+from schema import migrate
+
+DOCTORS = 40
+RETURNING_PATIENTS = 5000
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def seed_database(path):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, ?, 'General', ?, '00:00:00', '23:59:59')",
+        [(d, f"Doctor{d}", day) for d in range(1, DOCTORS + 1) for day in WEEKDAYS],
+    )
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, 'Female', '30', 'Somewhere')",
+        [(p, f"Patient{p}", f"555{p:07d}") for p in range(1, RETURNING_PATIENTS + 1)],
+    )
+    conn.execute("INSERT INTO diagnosis_medicines (diagnosis, medicines) VALUES ('Viral Fever', 'Paracetamol 500mg,Vitamin C')")
+    conn.commit()
+    conn.close()
+
+
+async def timed(latencies, name, coro):
+    start = time.perf_counter()
+    result = await coro
+    latencies[name].append(time.perf_counter() - start)
+    return result
+
+
+async def session(activities, latencies, new_phone):
+    doctor = f"Doctor{random.randint(1, DOCTORS)}"
+    availability = await timed(latencies, "check_doctor_availability", activities.check_doctor_availability(doctor))
+    doctor_id = availability["doctor_id"]
+
+    if random.random() < 0.3:
+        phone = new_phone()
+    else:
+        phone = f"555{random.randint(1, RETURNING_PATIENTS):07d}"
+
+    patient = await timed(latencies, "get_patient_by_phone", activities.get_patient_by_phone(phone))
+    if patient is None:
+        patient = await timed(latencies, "register_patient",
+                              activities.register_patient("New Patient", phone, "Male", "40", "Elsewhere"))
+
+    patient_id = patient["patient_id"]
+    await timed(latencies, "confirm_patient_appointment",
+                activities.confirm_patient_appointment(patient_id, doctor_id))
+    await timed(latencies, "estimate_wait_time_for_walkin", activities.estimate_wait_time_for_walkin(doctor_id))
+
+    if random.random() < 0.5:
+        # The doctor queue workflow checkpoints in batches; a batch of one is the worst case
+        event = {"type": "enqueued", "patient_id": patient_id, "queued_at": datetime.now().isoformat()}
+        await timed(latencies, "checkpoint_doctor_queue", activities.checkpoint_doctor_queue(doctor_id, [event]))
+    else:
+        await timed(latencies, "book_later_appointment", activities.book_later_appointment(patient_id, doctor_id))
+
+
+async def run(args):
+    import activities
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    completed = 0
+    phones = iter(range(10**9))
+    deadline = time.perf_counter() + args.duration
+
+    async def client():
+        nonlocal completed
+        while time.perf_counter() < deadline:
+            try:
+                await session(activities, latencies, lambda: f"777{next(phones):07d}")
+                completed += 1
+            except Exception as e:
+                errors[type(e).__name__ + ": " + str(e)[:60]] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.sessions)))
+    elapsed = time.perf_counter() - start
+
+    calls = sum(len(v) for v in latencies.values())
+    print(f"journal_mode={args.journal_mode} sessions={args.sessions} duration={elapsed:.1f}s")
+    print(f"  completed sessions: {completed} ({completed / elapsed:.1f}/s), activity calls: {calls / elapsed:.1f}/s")
+    for name, values in sorted(latencies.items()):
+        values.sort()
+        p99 = values[min(len(values) - 1, int(len(values) * 0.99))]
+        print(f"  {name:<32} n={len(values):<7} p50={statistics.median(values) * 1000:7.2f}ms p99={p99 * 1000:7.2f}ms")
+    for message, count in errors.items():
+        print(f"  error x{count}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent reception sessions")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--journal-mode", default="WAL")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "clinic.db")
+        seed_database(db_path)
+
+        # Configuration is read at import time, so point it at the scratch database first
+        os.environ["CLINIC_DB_PATH"] = db_path
+        os.environ["DB_JOURNAL_MODE"] = args.journal_mode
+        # Activities resolve their output paths relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.chdir(os.path.join(tmp, "backend"))
+        sys.path.insert(0, BACKEND_DIR)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
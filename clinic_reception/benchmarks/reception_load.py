@@ -0,0 +1,432 @@
+"""
+Load test of the full reception flow through the HTTP API.
+
+Starts --worker-processes workers (all roles) and a uvicorn API server with
+--api-processes processes against a synthetic database, then has --concurrency
+virtual patients go through /chat, /phone, /register (new patients), /decision
+(walk-ins) and /check_prescription until --sessions receptions have finished.
+Returning patients have an appointment today with probability
+--appointment-share; new ones register and walk in. Walk-ins book for later with
+probability --book-later-share and otherwise join the queue. Each run uses its
+own task queues and doctor queue workflows, which are terminated at the end.
+
+Reports per-step and end-to-end latency percentiles, sessions per minute,
+workflow and activity throughput (activities counted from the workflow
+histories, local ones included) and CPU time of the worker and API processes.
+--output writes the same as JSON for comparison across runs; the exit status is
+1 if any session failed.
+
+Needs a Temporal server at TEMPORAL_ADDRESS, or --dev-server to start a local one:
+
+    cd benchmarks
+    python reception_load.py --dev-server --sessions 200 --concurrency 20 --output load.json
+    python reception_load.py --sessions 200 --concurrency 40 --worker-processes 2 --api-processes 2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+
+import psutil
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, ROOT_DIR)
+
+from schema import migrate
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+STEPS = ["chat", "phone", "register", "decision", "slip_ready", "completed"]
+
+
+class SessionFailed(Exception):
+    def __init__(self, step, response):
+        message = response.get("response", response) if isinstance(response, dict) else response
+        super().__init__(f"{step}: {str(message)[:80]}")
+        self.step = step
+
+
+def plan_sessions(args):
+    """One (flow, doctor ID, phone) per session; returning patients are numbered in session order."""
+    rng = random.Random(args.seed)
+    plan = []
+    for s in range(1, args.sessions + args.warmup + 1):
+        doctor_id = rng.randint(1, args.doctors)
+        if rng.random() < args.new_share:
+            kind, phone = "new", f"777{s:07d}"
+        else:
+            kind = "appointment" if rng.random() < args.appointment_share else "walk_in"
+            phone = f"555{s:07d}"
+        if kind != "appointment" and rng.random() < args.book_later_share:
+            kind += "_book_later"
+        plan.append((kind, doctor_id, phone))
+    return plan
+
+
+def seed_database(path, args, plan):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, ?, 'General', ?, '00:00:00', '23:59:59')",
+        [(d, f"Doctor{d}", day) for d in range(1, args.doctors + 1) for day in WEEKDAYS],
+    )
+    returning = [(s, phone) for s, (kind, _, phone) in enumerate(plan, start=1) if not kind.startswith("new")]
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, 'Female', '30', 'Somewhere')",
+        [(s, f"Patient{s}", phone) for s, phone in returning],
+    )
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    conn.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status) VALUES (?, ?, ?, 'scheduled')",
+        [(s, doctor_id, (today + timedelta(seconds=s)).isoformat())
+         for s, (kind, doctor_id, _) in enumerate(plan, start=1) if kind == "appointment"],
+    )
+    conn.execute("INSERT INTO diagnosis_medicines (diagnosis, medicines) VALUES ('Viral Fever', 'Paracetamol 500mg,Vitamin C')")
+    conn.commit()
+    conn.close()
+
+
+def json_reply(step, response):
+    """The JSON object an endpoint replied with; anything else (null, a list) fails the session."""
+    response.raise_for_status()
+    reply = response.json()
+    if not isinstance(reply, dict):
+        raise SessionFailed(step, reply)
+    return reply
+
+
+async def post(http, timings, step, path, body):
+    start = time.perf_counter()
+    response = await http.post(path, json=body)
+    reply = json_reply(step, response)
+    timings[step] = time.perf_counter() - start
+    return reply
+
+
+async def session(http, args, kind, doctor_id, phone):
+    """Drive one reception to its end; returns its workflow ID, seconds per step and from /chat to the result."""
+    timings = {}
+    start = time.perf_counter()
+    reply = await post(http, timings, "chat", "/chat", {"message": f"Doctor{doctor_id}"})
+    if not reply.get("requires_phone"):
+        raise SessionFailed("chat", reply)
+    workflow_id = reply["workflow_id"]
+
+    await asyncio.sleep(args.think_seconds)
+    reply = await post(http, timings, "phone", "/phone", {"workflow_id": workflow_id, "phone_number": phone})
+    if kind.startswith("new"):
+        if not reply.get("requires_registration"):
+            raise SessionFailed("phone", reply)
+        await asyncio.sleep(args.think_seconds)
+        reply = await post(http, timings, "register", "/register", {
+            "workflow_id": workflow_id, "name": f"New Patient {phone}", "gender": "Male", "age": "40", "address": "Elsewhere",
+        })
+
+    if kind != "appointment":
+        if not reply.get("requires_decision"):
+            raise SessionFailed("register" if kind.startswith("new") else "phone", reply)
+        await asyncio.sleep(args.think_seconds)
+        decision = "book_later" if kind.endswith("book_later") else "continue"
+        reply = await post(http, timings, "decision", "/decision", {"workflow_id": workflow_id, "decision": decision})
+        if decision == "book_later":
+            if not reply.get("response", "").startswith("Appointment scheduled"):
+                raise SessionFailed("decision", reply)
+            return workflow_id, timings, time.perf_counter() - start
+
+    if not reply.get("requires_prescription_check"):
+        raise SessionFailed("decision" if kind != "appointment" else "phone", reply)
+    # Polled like the frontend did before status streams, so each poll is a query round trip
+    waiting = time.perf_counter()
+    while True:
+        await asyncio.sleep(args.poll_interval)
+        reply = json_reply("check_prescription", await http.get(f"/check_prescription/{workflow_id}"))
+        status = reply.get("status")
+        if status == "prescription_ready":
+            timings["slip_ready"] = time.perf_counter() - waiting
+        elif status == "completed":
+            timings["completed"] = time.perf_counter() - waiting
+            return workflow_id, timings, time.perf_counter() - start
+        elif status not in ("adding_to_queue", "consultation_in_progress", "processing"):
+            raise SessionFailed("check_prescription", reply)
+
+
+def distribution(values):
+    """Milliseconds at the usual percentiles (nearest rank)."""
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 1)
+
+    return {"n": len(values), "p50": round(statistics.median(values) * 1000, 1),
+            "p90": at(0.90), "p99": at(0.99), "max": round(values[-1] * 1000, 1)}
+
+
+class CpuMeter:
+    """CPU seconds used by a set of processes and their children since the meter was created."""
+
+    def __init__(self, pids):
+        self.processes = [psutil.Process(pid) for pid in pids]
+        self.start = self.total()
+
+    def total(self):
+        seconds = 0.0
+        for process in self.processes:
+            try:
+                for p in [process] + process.children(recursive=True):
+                    times = p.cpu_times()
+                    seconds += times.user + times.system
+            except psutil.NoSuchProcess:
+                pass
+        return seconds
+
+    def used(self):
+        return self.total() - self.start
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_process(name, command, tmp, env):
+    log = open(os.path.join(tmp, f"{name}.log"), "w")
+    return subprocess.Popen(command, cwd=os.path.join(tmp, "backend"), env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def log_tail(tmp, name, lines=20):
+    with open(os.path.join(tmp, f"{name}.log")) as f:
+        return "".join(f.readlines()[-lines:])
+
+
+async def wait_for_api(http, process, tmp, timeout=60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited:\n{log_tail(tmp, 'api')}")
+        try:
+            if (await http.get("/health")).status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.5)
+    raise RuntimeError(f"API server did not come up in {timeout}s:\n{log_tail(tmp, 'api')}")
+
+
+async def count_activities(client, workflow_ids):
+    """Completed activities in the given workflows' histories, by regular and local."""
+    from temporalio.api.enums.v1 import EventType
+
+    counts = Counter()
+    limit = asyncio.Semaphore(20)
+
+    async def count(workflow_id):
+        async with limit:
+            history = await client.get_workflow_handle(workflow_id).fetch_history()
+        for event in history.events:
+            if event.event_type == EventType.EVENT_TYPE_ACTIVITY_TASK_COMPLETED:
+                counts["regular"] += 1
+            elif event.event_type == EventType.EVENT_TYPE_MARKER_RECORDED:
+                counts["local"] += 1
+
+    await asyncio.gather(*(count(workflow_id) for workflow_id in workflow_ids))
+    return counts
+
+
+async def run(args, tmp):
+    import httpx
+    from temporalio.client import Client
+    from temporalio.service import RPCError
+    from temporalio.testing import WorkflowEnvironment
+
+    from config import TEMPORAL_ADDRESS, TEMPORAL_NAMESPACE, CONSULTATION_WORKFLOW_ID_SUFFIX
+
+    started_at = datetime.now().isoformat(timespec="seconds")
+    plan = plan_sessions(args)
+    db_path = os.path.join(tmp, "clinic.db")
+    seed_database(db_path, args, plan)
+
+    async with AsyncExitStack() as stack:
+        if args.dev_server:
+            env = await stack.enter_async_context(await WorkflowEnvironment.start_local())
+            client = env.client
+            address = client.service_client.config.target_host
+        else:
+            address = TEMPORAL_ADDRESS
+            client = await Client.connect(address, namespace=TEMPORAL_NAMESPACE)
+
+        # Separate task queues and doctor queues per run, so runs against a shared server don't mix
+        run_id = uuid.uuid4().hex[:8]
+        queue_prefix = f"load-{run_id}-doctor-queue-"
+        process_env = dict(
+            os.environ,
+            PYTHONPATH=BACKEND_DIR,
+            TEMPORAL_ADDRESS=address,
+            TEMPORAL_NAMESPACE=TEMPORAL_NAMESPACE,
+            CLINIC_DB_PATH=db_path,
+            SESSION_DB_PATH=os.path.join(tmp, "sessions.db"),
+            RECEPTION_TASK_QUEUE=f"load-{run_id}-reception",
+            PRESCRIPTION_RENDER_TASK_QUEUE=f"load-{run_id}-render",
+            CONSULTATION_TASK_QUEUE=f"load-{run_id}-consultation",
+            DOCTOR_QUEUE_WORKFLOW_ID_PREFIX=queue_prefix,
+        )
+        port = free_port()
+        workers = [
+            start_process(f"worker{n}", [sys.executable, os.path.join(BACKEND_DIR, "run_worker.py")], tmp, process_env)
+            for n in range(args.worker_processes)
+        ]
+        api = start_process("api", [
+            sys.executable, "-m", "uvicorn", "api_server:app", "--app-dir", BACKEND_DIR,
+            "--port", str(port), "--workers", str(args.api_processes), "--log-level", "warning",
+        ], tmp, process_env)
+        http = await stack.enter_async_context(
+            httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=args.request_timeout)
+        )
+        try:
+            await wait_for_api(http, api, tmp)
+            for kind, doctor_id, phone in plan[:args.warmup]:
+                await session(http, args, kind, doctor_id, phone)
+            if any(worker.poll() is not None for worker in workers):
+                raise RuntimeError(f"Worker exited:\n{log_tail(tmp, 'worker0')}")
+
+            worker_cpu = CpuMeter([worker.pid for worker in workers])
+            api_cpu = CpuMeter([api.pid])
+            sessions = iter(enumerate(plan[args.warmup:], start=args.warmup + 1))
+            steps, end_to_end, errors = defaultdict(list), defaultdict(list), Counter()
+            finished, workflow_ids = [], []
+
+            async def virtual_patient():
+                for s, (kind, doctor_id, phone) in sessions:
+                    try:
+                        workflow_id, timings, total = await session(http, args, kind, doctor_id, phone)
+                    except SessionFailed as e:
+                        errors[str(e)] += 1
+                        continue
+                    except Exception as e:
+                        errors[f"{type(e).__name__}: {str(e)[:80]}"] += 1
+                        continue
+                    for step, seconds in timings.items():
+                        steps[step].append(seconds)
+                    end_to_end[kind].append(total)
+                    finished.append(kind)
+                    workflow_ids.append(workflow_id)
+                    if not kind.endswith("book_later"):
+                        workflow_ids.append(f"{workflow_id}{CONSULTATION_WORKFLOW_ID_SUFFIX}")
+
+            start = time.perf_counter()
+            await asyncio.gather(*(virtual_patient() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            cpu = {"worker": worker_cpu.used(), "api": api_cpu.used()}
+        finally:
+            for process in workers + [api]:
+                process.terminate()
+            for process in workers + [api]:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+        activities = await count_activities(client, workflow_ids)
+        for doctor_id in range(1, args.doctors + 1):
+            try:
+                await client.get_workflow_handle(f"{queue_prefix}{doctor_id}").terminate("load test done")
+            except RPCError:
+                pass
+
+    return {
+        "config": vars(args),
+        "started_at": started_at,
+        "elapsed_seconds": round(elapsed, 2),
+        "sessions": {"completed": len(finished), "failed": sum(errors.values()), "by_kind": Counter(finished)},
+        "errors": dict(errors),
+        "throughput": {
+            "sessions_per_minute": round(len(finished) / elapsed * 60, 1),
+            # Receptions plus their consultation children
+            "workflows_per_second": round(len(workflow_ids) / elapsed, 2),
+            "activities_per_second": round(sum(activities.values()) / elapsed, 2),
+        },
+        # Of the completed receptions and their consultations; doctor queue checkpoints are not counted
+        "activities": dict(activities),
+        "latency_ms": {
+            "steps": {step: distribution(steps[step]) for step in STEPS if steps[step]},
+            "end_to_end": {kind: distribution(values) for kind, values in sorted(end_to_end.items())},
+        },
+        "cpu": {
+            name: {
+                "seconds": round(seconds, 2),
+                "utilization": round(seconds / elapsed, 3),
+                "ms_per_session": round(seconds / max(len(finished), 1) * 1000, 1),
+            }
+            for name, seconds in cpu.items()
+        },
+    }
+
+
+def report(results):
+    sessions = results["sessions"]
+    throughput = results["throughput"]
+    print(f"{sessions['completed']} sessions completed, {sessions['failed']} failed in {results['elapsed_seconds']}s: "
+          f"{throughput['sessions_per_minute']}/min, {throughput['workflows_per_second']} workflows/s, "
+          f"{throughput['activities_per_second']} activities/s")
+    for section, rows in results["latency_ms"].items():
+        print(f"{section}:")
+        for name, d in rows.items():
+            print(f"  {name:<22} n={d['n']:<5} p50 {d['p50']:8.1f} ms  p90 {d['p90']:8.1f} ms  "
+                  f"p99 {d['p99']:8.1f} ms  max {d['max']:8.1f} ms")
+    for name, cpu in results["cpu"].items():
+        print(f"{name} CPU: {cpu['seconds']}s ({cpu['utilization'] * 100:.0f}% of one core), "
+              f"{cpu['ms_per_session']} ms per session")
+    for message, count in results["errors"].items():
+        print(f"  error x{count}: {message}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="receptions to complete")
+    parser.add_argument("--concurrency", type=int, default=10, help="virtual patients going through the flow at once")
+    parser.add_argument("--doctors", type=int, default=4)
+    parser.add_argument("--new-share", type=float, default=0.3, help="share of new patients, who register first")
+    parser.add_argument("--appointment-share", type=float, default=0.5,
+                        help="share of returning patients with an appointment today")
+    parser.add_argument("--book-later-share", type=float, default=0.2, help="share of walk-ins who book for later")
+    parser.add_argument("--think-seconds", type=float, default=0, help="pause before each patient input")
+    parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds between /check_prescription polls")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--warmup", type=int, default=2, help="sessions run one by one before measuring")
+    parser.add_argument("--worker-processes", type=int, default=1)
+    parser.add_argument("--api-processes", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1, help="random seed of the patient mix")
+    parser.add_argument("--dev-server", action="store_true", help="start a local Temporal dev server")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+    output = os.path.abspath(args.output) if args.output else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Workers and API resolve the template, slips and session store relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.makedirs(os.path.join(tmp, "static", "prescriptions"))
+        os.symlink(os.path.join(os.path.abspath(ROOT_DIR), "prescription"), os.path.join(tmp, "prescription"))
+        sys.path.insert(0, BACKEND_DIR)
+        results = asyncio.run(run(args, tmp))
+
+    report(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if results["sessions"]["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+History size and replay time of reception workflows.
+
+Runs --sessions receptions end to end on in-process workers (the real
+activities on a scratch database), half of them returning patients with an
+appointment today and half walk-ins who join the queue. It then fetches every
+ReceptionWorkflow history and that of its ConsultationWorkflow child, and
+reports events (by type for receptions) and bytes per execution. It then times
+replaying them, which is what a worker does whenever a workflow falls out of
+its cache. It also reports how long each reception took to reach its
+interactive steps: the phone prompt after the availability check, and the
+decision prompt or consultation after the patient lookup.
+
+Needs a Temporal server at TEMPORAL_ADDRESS, or --dev-server to start a local one.
+Compare local and regular lookup activities with RECEPTION_LOCAL_ACTIVITIES:
+
+    cd benchmarks
+    python replay_reception_history.py --sessions 20
+    RECEPTION_LOCAL_ACTIVITIES=false python replay_reception_history.py --sessions 20 --dev-server
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from contextlib import AsyncExitStack
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, ROOT_DIR)
+
+from schema import migrate
+
+DOCTOR_ID = 1
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def seed_database(path, sessions):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, 'Doctor1', 'General', ?, '00:00:00', '23:59:59')",
+        [(DOCTOR_ID, day) for day in WEEKDAYS],
+    )
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, 'Female', '30', 'Somewhere')",
+        [(p, f"Patient{p}", f"555{p:07d}") for p in range(1, sessions + 1)],
+    )
+    # Odd patients have an appointment today, even ones walk in
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    conn.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status) VALUES (?, ?, ?, 'scheduled')",
+        [(p, DOCTOR_ID, (today + timedelta(seconds=p)).isoformat()) for p in range(1, sessions + 1, 2)],
+    )
+    conn.execute("INSERT INTO diagnosis_medicines (diagnosis, medicines) VALUES ('Viral Fever', 'Paracetamol 500mg,Vitamin C')")
+    conn.commit()
+    conn.close()
+
+
+async def reception(client, workflow_id, patient_id):
+    """Drive one reception; returns seconds to the phone prompt and from the phone number to the next step."""
+    from config import RECEPTION_TASK_QUEUE
+    from workflows import ReceptionWorkflow
+
+    start = time.perf_counter()
+    handle = await client.start_workflow(
+        ReceptionWorkflow.run, "Doctor1", id=workflow_id, task_queue=RECEPTION_TASK_QUEUE
+    )
+    await handle.execute_update(ReceptionWorkflow.wait_for_step, args=[["get_phone"], 60])
+    to_phone_prompt = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await handle.signal(ReceptionWorkflow.provide_phone_number, f"555{patient_id:07d}")
+    await handle.execute_update(ReceptionWorkflow.wait_for_step, args=[["make_decision", "generate_prescription"], 60])
+    to_next_step = time.perf_counter() - start
+
+    if patient_id % 2 == 0:
+        await handle.signal(ReceptionWorkflow.make_decision, "continue")
+    await handle.result()
+    return to_phone_prompt, to_next_step
+
+
+def history_bytes(history):
+    from temporalio.api.history.v1 import History
+
+    return History(events=history.events).ByteSize()
+
+
+async def replay_times(replayer, histories, rounds):
+    """Mean milliseconds to replay one of `histories`."""
+    times = []
+    for _ in range(rounds):
+        for history in histories:
+            start = time.perf_counter()
+            await replayer.replay_workflow(history)
+            times.append((time.perf_counter() - start) * 1000)
+    return statistics.mean(times)
+
+
+async def run(args):
+    from temporalio.client import Client
+    from temporalio.testing import WorkflowEnvironment
+    from temporalio.worker import Replayer
+
+    from temporalio.api.enums.v1 import EventType
+
+    from config import (
+        TEMPORAL_ADDRESS, TEMPORAL_NAMESPACE, DOCTOR_QUEUE_WORKFLOW_ID_PREFIX, CONSULTATION_WORKFLOW_ID_SUFFIX,
+        RECEPTION_LOCAL_ACTIVITIES,
+    )
+    from run_worker import ROLES, build_workers
+    from workflows import ReceptionWorkflow, ConsultationWorkflow, DoctorQueueWorkflow
+
+    async with AsyncExitStack() as stack:
+        if args.dev_server:
+            env = await stack.enter_async_context(await WorkflowEnvironment.start_local())
+            client = env.client
+        else:
+            client = await Client.connect(TEMPORAL_ADDRESS, namespace=TEMPORAL_NAMESPACE)
+        for worker in build_workers(client, ROLES):
+            await stack.enter_async_context(worker)
+
+        run_id = uuid.uuid4().hex[:8]
+        workflow_ids = [f"replay-bench-{run_id}-{p}" for p in range(1, args.sessions + 1)]
+        start = time.perf_counter()
+        steps = await asyncio.gather(*(
+            reception(client, workflow_id, p) for p, workflow_id in enumerate(workflow_ids, start=1)
+        ))
+        print(f"{args.sessions} receptions completed in {time.perf_counter() - start:.1f}s "
+              f"(RECEPTION_LOCAL_ACTIVITIES={RECEPTION_LOCAL_ACTIVITIES})")
+        for name, values in (("to phone prompt", [s[0] for s in steps]),
+                             ("phone number to next step", [s[1] for s in steps])):
+            print(f"  {name:<26} p50 {statistics.median(values) * 1000:7.1f} ms  max {max(values) * 1000:7.1f} ms")
+
+        histories = {"ReceptionWorkflow": [], "ConsultationWorkflow": []}
+        for workflow_id in workflow_ids:
+            histories["ReceptionWorkflow"].append(await client.get_workflow_handle(workflow_id).fetch_history())
+            histories["ConsultationWorkflow"].append(
+                await client.get_workflow_handle(f"{workflow_id}{CONSULTATION_WORKFLOW_ID_SUFFIX}").fetch_history()
+            )
+        await client.get_workflow_handle(f"{DOCTOR_QUEUE_WORKFLOW_ID_PREFIX}{DOCTOR_ID}").terminate("benchmark done")
+
+    replayer = Replayer(workflows=[ReceptionWorkflow, ConsultationWorkflow, DoctorQueueWorkflow])
+    for name, items in histories.items():
+        events = [len(history.events) for history in items]
+        sizes = [history_bytes(history) for history in items]
+        replay_ms = await replay_times(replayer, items, args.rounds)
+        print(f"{name:<22} events mean {statistics.mean(events):6.1f} max {max(events):4d}  "
+              f"bytes mean {statistics.mean(sizes):8.0f}  replay {replay_ms:6.2f} ms")
+
+    by_type = Counter(EventType.Name(event.event_type) for history in histories["ReceptionWorkflow"] for event in history.events)
+    print("ReceptionWorkflow events per execution by type:")
+    for event_type, count in by_type.most_common():
+        print(f"  {event_type.removeprefix('EVENT_TYPE_'):<44} {count / len(workflow_ids):5.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20, help="receptions to run, half booked and half walk-ins")
+    parser.add_argument("--rounds", type=int, default=5, help="times each history is replayed")
+    parser.add_argument("--dev-server", action="store_true", help="start a local Temporal dev server")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "clinic.db")
+        seed_database(db_path, args.sessions)
+
+        # Configuration is read at import time, so point it at the scratch database first
+        os.environ["CLINIC_DB_PATH"] = db_path
+        # Activities resolve the template and their output relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.symlink(os.path.join(os.path.abspath(ROOT_DIR), "prescription"), os.path.join(tmp, "prescription"))
+        os.chdir(os.path.join(tmp, "backend"))
+        sys.path.insert(0, BACKEND_DIR)
+        asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
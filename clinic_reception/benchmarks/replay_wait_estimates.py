@@ -0,0 +1,168 @@
+"""
+Offline replay of walk-in wait estimates against what patients actually waited.
+
+Walks a doctor_queue history in time order. At each arrival it estimates the
+wait with the flat queue_count * 15 rule and with backend/wait_estimator.py,
+whose statistics are fed only by consultations that had finished by then. It
+then compares both with the real wait until the patient was called in.
+
+The history is either read from a clinic database (`--db`), using seen
+entries with a seen_at and the doctor's appointments, or simulated: one
+doctor per row of --doctors, each with their own consultation length,
+serving booked appointments when due and walk-ins in arrival order.
+
+    cd benchmarks
+    python replay_wait_estimates.py --doctors 20 --days 30
+    python replay_wait_estimates.py --db ../clinic.db
+"""
+import argparse
+import bisect
+import math
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from wait_estimator import (
+    consultation_minutes, consultation_start, estimate_wait, parse_timestamp, prior_stats, update_stats
+)
+
+FLAT_MINUTES = 15
+HORIZON_MINUTES = 12 * 60
+
+
+def simulate(args):
+    """Synthetic history: {doctor_id: (walk-ins, appointment times)} with walk-ins as (queued, started, seen)."""
+    rng = random.Random(args.seed)
+    history = {}
+    for doctor_id in range(1, args.doctors + 1):
+        mean = rng.uniform(6, 25)
+        sigma = 0.4
+        mu = math.log(mean) - sigma ** 2 / 2
+        walkins, appointments = [], []
+        for day in range(args.days):
+            opens = datetime(2024, 1, 1, 9) + timedelta(days=day)
+            closes = opens + timedelta(hours=8)
+            booked = [opens + timedelta(minutes=15 * i) for i in range(32) if rng.random() < args.booked_share]
+            arrivals, t = [], opens
+            while True:
+                t += timedelta(minutes=rng.expovariate(args.load / mean))
+                if t >= closes:
+                    break
+                arrivals.append(t)
+            appointments.extend(booked)
+
+            free_at, queue, due = opens, list(arrivals), list(booked)
+            while queue or due:
+                if due and due[0] <= max(free_at, queue[0] if queue else due[0]):
+                    start = max(free_at, due.pop(0))
+                    free_at = start + timedelta(minutes=rng.lognormvariate(mu, sigma))
+                    continue
+                queued = queue.pop(0)
+                start = max(free_at, queued)
+                free_at = start + timedelta(minutes=rng.lognormvariate(mu, sigma))
+                walkins.append((queued, start, free_at))
+        history[doctor_id] = (walkins, appointments)
+    return history
+
+
+def load(db_path):
+    """History from a clinic database; the call-in time is approximated by the previous patient being seen."""
+    conn = sqlite3.connect(db_path)
+    history = defaultdict(lambda: ([], []))
+    rows = conn.execute("""
+        SELECT doctor_id, queued_at, seen_at FROM doctor_queue
+        WHERE seen = 'yes' AND seen_at IS NOT NULL
+        ORDER BY doctor_id, seen_at
+    """).fetchall()
+    for doctor_id, queued_at, seen_at in rows:
+        history[doctor_id][0].append((parse_timestamp(queued_at), None, parse_timestamp(seen_at)))
+    for doctor_id, appointment_datetime in conn.execute("SELECT doctor_id, appointment_datetime FROM appointments"):
+        if doctor_id in history:
+            history[doctor_id][1].append(parse_timestamp(appointment_datetime))
+    conn.close()
+    return dict(history)
+
+
+def replay(history):
+    """Per walk-in (actual wait, flat estimate, p50, p90) in minutes."""
+    results = []
+    for walkins, appointments in history.values():
+        appointments = sorted(appointments)
+        walkins = sorted(walkins, key=lambda w: w[2])
+        seen_times = [w[2] for w in walkins]
+
+        # Arrivals and departures in time order; a departure at the same instant goes first
+        events = [(w[0], 1, i) for i, w in enumerate(walkins)] + [(w[2], 0, i) for i, w in enumerate(walkins)]
+        events.sort()
+
+        stats, open_count, previous_seen = prior_stats(), 0, None
+        for at, kind, i in events:
+            queued, started, seen = walkins[i]
+            if kind == 0:
+                start = consultation_start(queued.isoformat(), previous_seen.isoformat() if previous_seen else None)
+                between = bisect.bisect_right(appointments, seen) - bisect.bisect_right(appointments, start)
+                minutes = consultation_minutes(start, seen.isoformat(), between)
+                if minutes is not None:
+                    stats = update_stats(stats, minutes)
+                previous_seen = seen
+                open_count -= 1
+                continue
+
+            if started is None:
+                j = bisect.bisect_left(seen_times, seen)
+                started = max(queued, seen_times[j - 1]) if j > 0 else queued
+            lo = bisect.bisect_left(appointments, at)
+            hi = bisect.bisect_left(appointments, at + timedelta(minutes=HORIZON_MINUTES))
+            offsets = [(a - at).total_seconds() / 60 for a in appointments[lo:hi]]
+
+            estimate = estimate_wait(open_count, offsets, stats)
+            actual = (started - queued).total_seconds() / 60
+            results.append((actual, open_count * FLAT_MINUTES, estimate["p50"], estimate["p90"]))
+            open_count += 1
+    return results
+
+
+def summarize(name, errors):
+    absolute = [abs(e) for e in errors]
+    return (f"{name:<22} MAE {statistics.mean(absolute):7.1f}  median abs {statistics.median(absolute):7.1f}  "
+            f"bias {statistics.mean(errors):+7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", help="replay this clinic database instead of a simulated history")
+    parser.add_argument("--doctors", type=int, default=20)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--load", type=float, default=0.6, help="walk-in arrival rate relative to the doctor's capacity")
+    parser.add_argument("--booked-share", type=float, default=0.15, help="share of 15-minute slots booked in advance")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    history = load(args.db) if args.db else simulate(args)
+    start = time.perf_counter()
+    results = replay(history)
+    elapsed = time.perf_counter() - start
+    if not results:
+        print("No seen walk-ins with seen_at to replay.")
+        return
+
+    actual = [r[0] for r in results]
+    print(f"{len(results)} walk-ins across {len(history)} doctors, mean actual wait {statistics.mean(actual):.1f} min "
+          f"(replayed in {elapsed:.2f}s, {len(results) / elapsed:,.0f} estimates/s)")
+    print("errors in minutes (estimate - actual):")
+    print(summarize(f"flat {FLAT_MINUTES} min/patient", [r[1] - r[0] for r in results]))
+    print(summarize("estimator p50", [r[2] - r[0] for r in results]))
+    covered = sum(1 for r in results if r[0] <= r[3]) / len(results)
+    print(f"estimator p90 covers {covered:.1%} of actual waits "
+          f"(flat rule covers {sum(1 for r in results if r[0] <= r[1]) / len(results):.1%})")
+
+
+if __name__ == "__main__":
+    main()
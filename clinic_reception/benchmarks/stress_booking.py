@@ -0,0 +1,155 @@
+"""
+Concurrency stress test for slot reservation and patient registration.
+
+Runs N parallel book_later_appointment calls for different patients against
+the same doctor, each inside its own activity context on a DB executor with
+one thread per booking, then replays every call as a Temporal retry would
+(same workflow/activity IDs). Also registers patients in parallel with
+colliding phone numbers. Exits non-zero on any double-booking, lost retry,
+duplicate patient ID or unexpected error.
+
+    cd benchmarks
+    python stress_booking.py --parallel 200
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, ROOT_DIR)
+
+from schema import migrate
+
+DOCTOR_ID = 1
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def seed_database(path, patients):
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany(
+        "INSERT INTO doctor_schedule VALUES (?, 'Doctor1', 'General', ?, '00:00:00', '23:59:59')",
+        [(DOCTOR_ID, day) for day in WEEKDAYS],
+    )
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, 'Female', '30', 'Somewhere')",
+        [(p, f"Patient{p}", f"555{p:07d}") for p in range(1, patients + 1)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def activity_env(workflow_id):
+    from temporalio.testing import ActivityEnvironment
+
+    env = ActivityEnvironment()
+    env.info = dataclasses.replace(env.info, workflow_id=workflow_id, workflow_run_id=f"{workflow_id}-run", activity_id="1")
+    return env
+
+
+async def run_parallel(calls):
+    """Run (workflow_id, activity, args) calls concurrently, returning results or exceptions."""
+    return await asyncio.gather(
+        *(activity_env(workflow_id).run(fn, *args) for workflow_id, fn, args in calls),
+        return_exceptions=True,
+    )
+
+
+async def run(args, db_path):
+    import activities
+
+    failures = []
+
+    # Bookings: one patient per workflow, all for the same doctor and day
+    calls = [(f"booking-{p}", activities.book_later_appointment, (p, DOCTOR_ID)) for p in range(1, args.parallel + 1)]
+    start = time.perf_counter()
+    first = await run_parallel(calls)
+    elapsed = time.perf_counter() - start
+    retried = await run_parallel(calls)
+
+    errors = [r for r in first + retried if isinstance(r, Exception)]
+    booked = [r for r in first if isinstance(r, tuple)]
+    full = [r for r in first if isinstance(r, str)]
+    slot_counts = Counter(r[2] for r in booked)
+    double_booked = {slot: n for slot, n in slot_counts.items() if n > 1}
+    lost_retries = [(a, b) for a, b in zip(first, retried) if isinstance(a, tuple) and a != b]
+
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT COUNT(*) FROM appointments WHERE status = 'scheduled'").fetchone()[0]
+    db_doubles = conn.execute("""
+        SELECT COUNT(*) FROM (
+            SELECT 1 FROM appointments WHERE status = 'scheduled'
+            GROUP BY doctor_id, appointment_datetime HAVING COUNT(*) > 1
+        )
+    """).fetchone()[0]
+
+    print(f"bookings: {args.parallel} parallel in {elapsed:.2f}s -> {len(booked)} booked, "
+          f"{len(full)} told the day is full, {len(errors)} errors")
+    print(f"  scheduled rows: {rows}, double-booked slots: {len(double_booked)} returned / {db_doubles} in db, "
+          f"retries returning a different slot: {len(lost_retries)}")
+    if double_booked or db_doubles or lost_retries or errors or rows != len(booked):
+        failures.append("bookings")
+
+    # Registrations: a quarter of the phones are registered by two workflows at once
+    phones = [f"777{i % (args.parallel * 3 // 4):07d}" for i in range(args.parallel)]
+    calls = [
+        (f"register-{i}", activities.register_patient, ("New Patient", phone, "Male", "40", "Elsewhere"))
+        for i, phone in enumerate(phones)
+    ]
+    first = await run_parallel(calls)
+    retried = await run_parallel(calls)
+
+    errors = [r for r in first + retried if isinstance(r, Exception)]
+    ids_by_phone = {}
+    for phone, record in zip(phones + phones, first + retried):
+        if isinstance(record, dict):
+            ids_by_phone.setdefault(phone, set()).add(record["patient_id"])
+    split_phones = [phone for phone, ids in ids_by_phone.items() if len(ids) > 1]
+    rows = conn.execute("SELECT COUNT(DISTINCT patient_id) FROM patients WHERE phone LIKE '777%'").fetchone()[0]
+    conn.close()
+
+    print(f"registrations: {len(phones)} parallel for {len(set(phones))} phones -> {rows} patients, "
+          f"{len(errors)} errors")
+    print(f"  phones answered with more than one patient_id (incl. retries): {len(split_phones)}")
+    if errors or split_phones or rows != len(set(phones)) or len(ids_by_phone) != len(set(phones)):
+        failures.append("registrations")
+
+    for error in errors[:5]:
+        print(f"  error: {type(error).__name__}: {error}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--parallel", type=int, default=200, help="concurrent bookings and registrations")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "clinic.db")
+        seed_database(db_path, args.parallel)
+
+        # Configuration is read at import time, so point it at the scratch database first
+        os.environ["CLINIC_DB_PATH"] = db_path
+        # One DB thread per call, so every booking really runs in parallel
+        os.environ["DB_POOL_SIZE"] = str(args.parallel)
+        # Activities resolve their output paths relative to the backend directory
+        os.makedirs(os.path.join(tmp, "backend"))
+        os.chdir(os.path.join(tmp, "backend"))
+        sys.path.insert(0, BACKEND_DIR)
+        failures = asyncio.run(run(args, db_path))
+
+    if failures:
+        print(f"FAILED: {', '.join(failures)}")
+        sys.exit(1)
+    print("OK: no double-bookings, duplicate patients or lost retries")
+
+
+if __name__ == "__main__":
+    main()
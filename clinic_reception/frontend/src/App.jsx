@@ -14,11 +14,8 @@ function App() {
   const [currentWorkflowId, setCurrentWorkflowId] = useState(null);
   const [prescriptionUrl, setPrescriptionUrl] = useState(null);
   const [workflowStatus, setWorkflowStatus] = useState(null);
-  const [pollingInterval, setPollingInterval] = useState(null);
-  const [isPolling, setIsPolling] = useState(false);
-  
-  // Add this state to track which messages have been shown
-  const [shownMessages, setShownMessages] = useState(new Set());
+  const [statusStream, setStatusStream] = useState(null);
+  const [isStreaming, setIsStreaming] = useState(false);
 
   const [registrationData, setRegistrationData] = useState({
     name: "",
@@ -27,107 +24,74 @@ function App() {
     address: ""
   });
 
-  // Cleanup polling on component unmount
+  // Close the status stream on component unmount
   useEffect(() => {
     return () => {
-      if (pollingInterval) {
-        clearInterval(pollingInterval);
+      if (statusStream) {
+        statusStream.close();
       }
     };
-  }, [pollingInterval]);
+  }, [statusStream]);
 
-  // Start polling for prescription/workflow status
-  const startPolling = (workflowId) => {
-    if (isPolling) return; // Prevent multiple polling intervals
+  // Follow prescription/workflow status pushed by the backend
+  const startStatusStream = (workflowId) => {
+    if (isStreaming) return; // Prevent multiple streams
     
-    setIsPolling(true);
-    console.log("Starting polling for workflow:", workflowId);
+    setIsStreaming(true);
+    console.log("Starting status stream for workflow:", workflowId);
     
-    const interval = setInterval(async () => {
-      try {
-        const response = await fetch(`${API_URL}/check_prescription/${workflowId}`);
-        const data = await response.json();
-
-        console.log("Polling response:", data);
-
-        // Create a unique key for each message type to prevent duplicates
-        const messageKey = `${workflowId}-${data.status}`;
-
-        // Handle different statuses from the backend
-        if (data.status === "prescription_ready" && data.prescription_url) {
-          if (!shownMessages.has(messageKey)) {
-            setPrescriptionUrl(data.prescription_url);
-            setMessages((prev) => [
-              ...prev,
-              { role: "bot", content: data.response, prescriptionUrl: data.prescription_url }
-            ]);
-            setShownMessages(prev => new Set([...prev, messageKey]));
-          }
-        } else if (data.status === "consultation_in_progress") {
-          if (!shownMessages.has(messageKey)) {
-            setMessages((prev) => [
-              ...prev,
-              { role: "bot", content: data.response }
-            ]);
-            setShownMessages(prev => new Set([...prev, messageKey]));
-          }
-        } else if (data.status === "finalizing_prescription") {
-          if (!shownMessages.has(messageKey)) {
-            setMessages((prev) => [
-              ...prev,
-              { role: "bot", content: data.response }
-            ]);
-            setShownMessages(prev => new Set([...prev, messageKey]));
-          }
-        } else if (data.status === "adding_to_queue") {
-          if (!shownMessages.has(messageKey)) {
-            setMessages((prev) => [
-              ...prev,
-              { role: "bot", content: data.response }
-            ]);
-            setShownMessages(prev => new Set([...prev, messageKey]));
-          }
-        } else if (data.status === "completed") {
-          setMessages((prev) => [
-            ...prev,
-            { role: "bot", content: data.response }
-          ]);
-          clearInterval(interval);
-          setPollingInterval(null);
-          setCurrentWorkflowId(null);
-          setIsPolling(false);
-          setShownMessages(new Set()); // Clear shown messages for next session
-        } else if (data.status === "error") {
-          setMessages((prev) => [
-            ...prev,
-            { role: "bot", content: data.response }
-          ]);
-          clearInterval(interval);
-          setPollingInterval(null);
-          setCurrentWorkflowId(null);
-          setIsPolling(false);
-          setShownMessages(new Set()); // Clear shown messages for next session
+    const source = new EventSource(`${API_URL}/status_stream/${workflowId}`);
+    // Statuses already shown in this session, so a replayed event after a reconnect isn't repeated
+    const shown = new Set();
+
+    const finish = () => {
+      source.close();
+      setStatusStream(null);
+      setCurrentWorkflowId(null);
+      setIsStreaming(false);
+    };
+
+    source.onmessage = (event) => {
+      const data = JSON.parse(event.data);
+
+      console.log("Status event:", data);
+
+      if (data.status === "completed" || data.status === "error") {
+        setMessages((prev) => [
+          ...prev,
+          { role: "bot", content: data.response }
+        ]);
+        finish();
+      } else if (!shown.has(data.status)) {
+        if (data.prescription_url) {
+          setPrescriptionUrl(data.prescription_url);
         }
-      } catch (error) {
-        console.error("Error polling prescription status:", error);
-        clearInterval(interval);
-        setPollingInterval(null);
-        setCurrentWorkflowId(null);
-        setIsPolling(false);
-        setShownMessages(new Set()); // Clear shown messages for next session
+        setMessages((prev) => [
+          ...prev,
+          { role: "bot", content: data.response, prescriptionUrl: data.prescription_url }
+        ]);
+        shown.add(data.status);
       }
-    }, 3000); // 3-second interval (faster for better UX)
+    };
+
+    // The browser reconnects on its own after a dropped connection; only give up once it stops trying
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) {
+        console.error("Status stream closed for workflow:", workflowId);
+        finish();
+      }
+    };
 
-    setPollingInterval(interval);
+    setStatusStream(source);
   };
 
-  // Stop polling
-  const stopPolling = () => {
-    if (pollingInterval) {
-      clearInterval(pollingInterval);
-      setPollingInterval(null);
+  // Stop following the status stream
+  const stopStatusStream = () => {
+    if (statusStream) {
+      statusStream.close();
+      setStatusStream(null);
     }
-    setIsPolling(false);
+    setIsStreaming(false);
   };
 
   const sendMessage = async () => {
@@ -185,6 +149,7 @@ function App() {
         setPendingDecision({
           workflow_id: data.workflow_id,
           wait_time: data.wait_time,
+          wait_time_p90: data.wait_time_p90,
           patient_name: data.patient_name
         });
       } else if (data.requires_registration) {
@@ -193,9 +158,9 @@ function App() {
           phone_number: phoneInput
         });
       } else if (data.requires_prescription_check) {
-        // This is the key fix - start polling for patients with appointments
-        console.log("Starting prescription polling for workflow:", data.workflow_id);
-        startPolling(data.workflow_id);
+        // Patients with an appointment go straight to consultation; follow its progress
+        console.log("Starting status stream for workflow:", data.workflow_id);
+        startStatusStream(data.workflow_id);
       }
 
     } catch (error) {
@@ -234,6 +199,7 @@ function App() {
         setPendingDecision({
           workflow_id: data.workflow_id,
           wait_time: data.wait_time,
+          wait_time_p90: data.wait_time_p90,
           patient_name: data.patient_name
         });
       }
@@ -278,10 +244,10 @@ function App() {
       // Clear pending decision
       setPendingDecision(null);
 
-      // If continuing with appointment, start polling for updates
+      // If continuing with appointment, follow the status stream for updates
       if (decision === "continue" && data.requires_prescription_check) {
-        console.log("Starting prescription polling after decision");
-        startPolling(currentWorkflowId);
+        console.log("Starting status stream after decision");
+        startStatusStream(currentWorkflowId);
       } else if (decision === "book_later") {
         // For "book_later", clear the workflow
         setCurrentWorkflowId(null);
@@ -296,7 +262,7 @@ function App() {
 
   // Reset all states for a new conversation
   const resetChat = () => {
-    stopPolling();
+    stopStatusStream();
     setMessages([]);
     setInput("");
     setPhoneInput("");
@@ -307,7 +273,6 @@ function App() {
     setPrescriptionUrl(null);
     setWorkflowStatus(null);
     setRegistrationData({ name: "", gender: "", age: "", address: "" });
-    setShownMessages(new Set()); // Clear shown messages
   };
 
   const isInputDisabled = isLoading || pendingPhone || pendingDecision || pendingRegistration;
@@ -320,7 +285,7 @@ function App() {
         {currentWorkflowId && (
           <div className="workflow-status">
             <span className="workflow-id">Session: {currentWorkflowId.slice(-8)}</span>
-            {isPolling && <span className="polling-indicator">● Monitoring</span>}
+            {isStreaming && <span className="polling-indicator">● Monitoring</span>}
           </div>
         )}
       </div>
@@ -347,8 +312,8 @@ function App() {
           </div>
         )}
 
-        {/* Show workflow status if polling */}
-        {isPolling && (
+        {/* Show workflow status while following the stream */}
+        {isStreaming && (
           <div className="status-indicator">
             <div className="status-content">
               <div className="status-spinner"></div>
@@ -471,7 +436,8 @@ function App() {
             <h3>Decision Required</h3>
             <div className="decision-info">
               <p><strong>👤 Patient:</strong> {pendingDecision.patient_name}</p>
-              <p><strong>Estimated wait time:</strong> {pendingDecision.wait_time} minutes</p>
+              <p><strong>Estimated wait time:</strong> about {pendingDecision.wait_time} minutes
+                {pendingDecision.wait_time_p90 != null && ` (up to ${pendingDecision.wait_time_p90})`}</p>
               <p><strong>No scheduled appointment found for today</strong></p>
               <p>What would you like to do?</p>
             </div>
@@ -0,0 +1,228 @@
+"""
+Synthetic clinic.db at production scale, for performance work.
+
+Generates doctors with one to three shifts on five to seven days a week,
+patients with unique phone numbers, appointments in 15-minute slots within the
+shifts over --years up to --future-days ahead (past ones completed, the rest
+scheduled), and the walk-in queue history of every past shift with arrival and
+seen times. Output is deterministic for a given --seed.
+
+Rows go in with executemany from generators, in a single transaction with the
+secondary indexes and triggers of schema.py dropped; they are rebuilt once at
+the end, the per-doctor queue counters recomputed and consultation statistics
+learned from the queue history.
+
+    python generate_data.py --db clinic.db --patients 1000000 --appointments 6000000 --queue 3000000
+    python generate_data.py --db small.db --doctors 20 --patients 10000 --appointments 50000 --queue 20000 --years 1
+"""
+import argparse
+import csv
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+from schema import migrate, fill_service_stats, INDEXES, TRIGGERS
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+SPECIALIZATIONS = [
+    "General", "Cardiology", "Neurology", "Dermatology", "Pediatrics", "Orthopedics",
+    "Gynecology", "ENT", "Ophthalmology", "Psychiatry", "Gastroenterology", "Pulmonology",
+]
+# Shifts in seconds from midnight
+SHIFTS = [(8 * 3600, 12 * 3600), (13 * 3600, 17 * 3600), (18 * 3600, 22 * 3600)]
+SLOT_SECONDS = 15 * 60
+FIRST_NAMES = {
+    "Female": ["Alice", "Maria", "Priya", "Fatima", "Emma", "Olivia", "Aisha", "Sofia", "Mei", "Grace", "Anita", "Sara"],
+    "Male": ["Bob", "Rahul", "Omar", "James", "Liam", "Noah", "Arjun", "Wei", "David", "Carlos", "Ivan", "Yusuf"],
+}
+LAST_NAMES = [
+    "Smith", "Johnson", "Patel", "Garcia", "Khan", "Chen", "Williams", "Brown", "Singh", "Lopez", "Kim",
+    "Nguyen", "Ali", "Martin", "Rossi", "Müller", "Sato", "Okafor", "Silva", "Cohen",
+]
+STREETS = ["Elm Street", "Oak Avenue", "Maple Road", "Park Lane", "Main Street", "Cedar Drive", "Hill Road", "Lake View"]
+CITIES = ["NY", "Boston", "Chicago", "Austin", "Seattle", "Denver"]
+# Phones are a permutation of the 9-digit numbers, so they are unique without being sequential
+PHONE_MULTIPLIER = 742_938_497
+
+
+def clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def plan_schedules(rng, doctors):
+    """{doctor_id: (name, specialization, {weekday: [(start, end), ...]})}"""
+    plan = {}
+    for d in range(1, doctors + 1):
+        # Names are unique, as availability is looked up by name
+        name = LAST_NAMES[(d - 1) % len(LAST_NAMES)]
+        if d > len(LAST_NAMES):
+            name += str((d - 1) // len(LAST_NAMES) + 1)
+        days = sorted(rng.sample(range(7), rng.randint(5, 7)))
+        plan[d] = (name, rng.choice(SPECIALIZATIONS), {
+            day: sorted(rng.sample(SHIFTS, rng.randint(1, 3))) for day in days
+        })
+    return plan
+
+
+def schedule_rows(plan):
+    for doctor_id, (name, specialization, days) in plan.items():
+        for day, shifts in days.items():
+            for start, end in shifts:
+                yield doctor_id, name, specialization, WEEKDAYS[day], clock(start), clock(end)
+
+
+def patient_rows(rng, patients):
+    for p in range(1, patients + 1):
+        gender = rng.choice(("Female", "Male"))
+        yield (
+            p,
+            f"{rng.choice(FIRST_NAMES[gender])} {rng.choice(LAST_NAMES)}",
+            f"9{p * PHONE_MULTIPLIER % 10**9:09d}",
+            gender,
+            str(rng.randint(1, 90)),
+            f"{rng.randint(1, 999)} {rng.choice(STREETS)}, {rng.choice(CITIES)}",
+        )
+
+
+def shift_days(plan, first, last):
+    """(day, its ISO date, doctor ID, shift) for every shift worked from `first` up to `last`."""
+    day = first
+    while day <= last:
+        weekday, iso = day.weekday(), day.isoformat()
+        for doctor_id, (_, _, days) in plan.items():
+            for shift in days.get(weekday, ()):
+                yield day, iso, doctor_id, shift
+        day += timedelta(days=1)
+
+
+def slot_count(plan, first, last):
+    per_weekday = [
+        sum((end - start) // SLOT_SECONDS for _, _, days in plan.values() for start, end in days.get(weekday, ()))
+        for weekday in range(7)
+    ]
+    return sum(per_weekday[(first + timedelta(days=n)).weekday()] for n in range((last - first).days + 1))
+
+
+def appointment_rows(rng, plan, first, last, today, fill, patients):
+    """Each slot of each shift is booked with probability `fill`."""
+    for day, iso, doctor_id, (start, end) in shift_days(plan, first, last):
+        status = "completed" if day < today else "scheduled"
+        for slot in range(start, end - SLOT_SECONDS + 1, SLOT_SECONDS):
+            if rng.random() < fill:
+                yield rng.randint(1, patients), doctor_id, f"{iso}T{clock(slot)}", status
+
+
+def queue_rows(rng, plan, first, today, per_shift, patients):
+    """Walk-ins of every past shift, each seen after the one before them, about `per_shift` per shift."""
+    for _, iso, doctor_id, (start, end) in shift_days(plan, first, today - timedelta(days=1)):
+        arrivals = sorted(rng.sample(range(start, end), int(rng.uniform(0, 2 * per_shift) + 0.5)))
+        free_at = start
+        for queued in arrivals:
+            seen = max(queued, free_at) + int(max(3.0, rng.gauss(12, 5)) * 60)
+            if seen >= 24 * 3600:
+                break
+            free_at = seen
+            yield doctor_id, rng.randint(1, patients), f"{iso}T{clock(queued)}", "yes", f"{iso}T{clock(seen)}"
+
+
+def diagnosis_rows():
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "diagnosis_medicines.csv"), newline="") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row for row in reader if row]
+
+
+def load(conn, table, columns, rows):
+    start = time.perf_counter()
+    placeholders = ", ".join("?" for _ in columns)
+    count = conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows).rowcount
+    print(f"Loaded {count} records into {table} table in {time.perf_counter() - start:.1f}s")
+
+
+def generate(conn, args):
+    rng = random.Random(args.seed)
+    today = date.today()
+    first = today - timedelta(days=round(args.years * 365))
+    last = today + timedelta(days=args.future_days)
+
+    plan = plan_schedules(rng, args.doctors)
+    slots = slot_count(plan, first, last)
+    if args.appointments > slots:
+        print(f"Only {slots} slots in the schedules, booking all of them", file=sys.stderr)
+    shifts = sum(1 for _ in shift_days(plan, first, today - timedelta(days=1)))
+    per_shift = args.queue / max(shifts, 1)
+
+    load(conn, "doctor_schedule", ["doctor_id", "name", "specialization", "day_of_week", "start_time", "end_time"],
+         schedule_rows(plan))
+    load(conn, "patients", ["patient_id", "name", "phone", "gender", "age", "address"],
+         patient_rows(random.Random(args.seed + 1), args.patients))
+    load(conn, "appointments", ["patient_id", "doctor_id", "appointment_datetime", "status"],
+         appointment_rows(random.Random(args.seed + 2), plan, first, last, today,
+                          min(1.0, args.appointments / max(slots, 1)), args.patients))
+    load(conn, "doctor_queue", ["doctor_id", "patient_id", "queued_at", "seen", "seen_at"],
+         queue_rows(random.Random(args.seed + 3), plan, first, today, per_shift, args.patients))
+    load(conn, "diagnosis_medicines", ["diagnosis", "medicines"], diagnosis_rows())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="clinic.db")
+    parser.add_argument("--replace", action="store_true", help="overwrite --db if it exists")
+    parser.add_argument("--doctors", type=int, default=300)
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--appointments", type=int, default=6_000_000, help="about this many, spread over the slots")
+    parser.add_argument("--queue", type=int, default=3_000_000, help="about this many doctor_queue history rows")
+    parser.add_argument("--years", type=float, default=3, help="years of history before today")
+    parser.add_argument("--future-days", type=int, default=30, help="days of scheduled appointments from today")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        if not args.replace:
+            sys.exit(f"{args.db} already exists; pass --replace to overwrite it")
+        os.remove(args.db)
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(args.db, isolation_level=None)
+    try:
+        migrate(conn)
+        # Nothing to recover on failure, the file is removed
+        conn.execute("PRAGMA journal_mode=OFF")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute("PRAGMA cache_size=-262144")
+        conn.execute("BEGIN")
+        # Index and trigger maintenance per row is what makes bulk inserts slow; build them once at the end
+        for name in INDEXES:
+            conn.execute(f"DROP INDEX {name}")
+        for name in TRIGGERS:
+            conn.execute(f"DROP TRIGGER {name}")
+        generate(conn, args)
+
+        index_start = time.perf_counter()
+        for ddl in INDEXES.values():
+            conn.execute(ddl)
+        for ddl in TRIGGERS.values():
+            conn.execute(ddl)
+        conn.execute("""
+            INSERT INTO doctor_queue_counts (doctor_id, open_count)
+            SELECT doctor_id, COUNT(*) FROM doctor_queue WHERE seen = 'no' GROUP BY doctor_id
+        """)
+        print(f"Built indexes in {time.perf_counter() - index_start:.1f}s")
+        stats_start = time.perf_counter()
+        doctors = fill_service_stats(conn)
+        print(f"Learned consultation statistics of {doctors} doctors in {time.perf_counter() - stats_start:.1f}s")
+        conn.execute("COMMIT")
+        conn.execute("PRAGMA journal_mode=WAL")
+    except BaseException:
+        conn.close()
+        os.remove(args.db)
+        raise
+    conn.close()
+    print(f"Generated {args.db} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+"""
+Versioned schema for clinic.db.
+
+Migrations are applied in order and the applied version is tracked in
+PRAGMA user_version. Databases created by the old pandas-based setup have
+the tables but no keys or indexes (version 0); migration 1 rebuilds those
+tables in place, keeping their rows. TABLES and INDEXES always describe the
+latest schema, so each migration only has to bring older databases forward.
+"""
+import bisect
+import itertools
+import os
+import sqlite3
+import sys
+
+# The wait estimator lives with the backend, which reads its settings from the environment
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+
+TABLES = {
+    "doctor_schedule": """
+        CREATE TABLE doctor_schedule (
+            doctor_id INTEGER NOT NULL,
+            name TEXT NOT NULL COLLATE NOCASE,
+            specialization TEXT,
+            day_of_week TEXT NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT NOT NULL,
+            PRIMARY KEY (doctor_id, day_of_week, start_time)
+        )
+    """,
+    "patients": """
+        CREATE TABLE patients (
+            patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL,
+            gender TEXT,
+            age TEXT,
+            address TEXT,
+            idempotency_key TEXT
+        )
+    """,
+    "appointments": """
+        CREATE TABLE appointments (
+            appointment_id INTEGER PRIMARY KEY,
+            patient_id INTEGER NOT NULL REFERENCES patients (patient_id),
+            doctor_id INTEGER NOT NULL,
+            appointment_datetime TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'scheduled',
+            idempotency_key TEXT
+        )
+    """,
+    "doctor_queue": """
+        CREATE TABLE doctor_queue (
+            queue_id INTEGER PRIMARY KEY,
+            doctor_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL REFERENCES patients (patient_id),
+            queued_at TEXT NOT NULL,
+            seen TEXT NOT NULL DEFAULT 'no' CHECK (seen IN ('no', 'yes')),
+            seen_at TEXT
+        )
+    """,
+    "diagnosis_medicines": """
+        CREATE TABLE diagnosis_medicines (
+            diagnosis_id INTEGER PRIMARY KEY,
+            diagnosis TEXT NOT NULL UNIQUE,
+            medicines TEXT NOT NULL
+        )
+    """,
+    # Bumped by triggers whenever a tracked table changes, so in-memory copies know when to reload
+    "data_versions": """
+        CREATE TABLE data_versions (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    # Open (seen = 'no') doctor_queue entries per doctor, kept current by triggers
+    "doctor_queue_counts": """
+        CREATE TABLE doctor_queue_counts (
+            doctor_id INTEGER PRIMARY KEY,
+            open_count INTEGER NOT NULL DEFAULT 0
+        )
+    """,
+    # Rolling consultation-duration statistics per doctor, see backend/wait_estimator.py
+    "doctor_service_stats": """
+        CREATE TABLE doctor_service_stats (
+            doctor_id INTEGER PRIMARY KEY,
+            samples INTEGER NOT NULL,
+            mean_minutes REAL NOT NULL,
+            variance REAL NOT NULL,
+            last_seen_at TEXT
+        )
+    """,
+}
+
+# Secondary indexes, kept separate so bulk loaders can create them after the data is in
+INDEXES = {
+    "ux_patients_phone": "CREATE UNIQUE INDEX IF NOT EXISTS ux_patients_phone ON patients (phone)",
+    "ux_patients_idempotency_key": """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_patients_idempotency_key ON patients (idempotency_key)
+        WHERE idempotency_key IS NOT NULL
+    """,
+    # name inherits NOCASE from the column, so case-insensitive lookups can use the index
+    "idx_doctor_schedule_name_day": "CREATE INDEX IF NOT EXISTS idx_doctor_schedule_name_day ON doctor_schedule (name, day_of_week, start_time)",
+    # At most one scheduled appointment per doctor and slot; also serves the booked-slot lookups
+    "ux_appointments_doctor_slot": """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_appointments_doctor_slot ON appointments (doctor_id, appointment_datetime)
+        WHERE status = 'scheduled'
+    """,
+    "ux_appointments_idempotency_key": """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_appointments_idempotency_key ON appointments (idempotency_key)
+        WHERE idempotency_key IS NOT NULL
+    """,
+    "idx_appointments_patient_doctor_datetime": "CREATE INDEX IF NOT EXISTS idx_appointments_patient_doctor_datetime ON appointments (patient_id, doctor_id, appointment_datetime)",
+    "idx_doctor_queue_doctor_seen": "CREATE INDEX IF NOT EXISTS idx_doctor_queue_doctor_seen ON doctor_queue (doctor_id, seen)",
+    # At most one open queue entry per patient and doctor
+    "ux_doctor_queue_open": """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_doctor_queue_open ON doctor_queue (patient_id, doctor_id)
+        WHERE seen = 'no'
+    """,
+    # Identifies an entry across checkpoint replays from the doctor queue workflow
+    "ux_doctor_queue_entry": """
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_doctor_queue_entry ON doctor_queue (doctor_id, patient_id, queued_at)
+    """,
+}
+
+# Tables kept in worker memory and the writes that invalidate those copies. Patient caches only hold
+# records that exist and never cache misses, so new registrations don't count as changes there.
+VERSIONED_TABLES = {
+    "doctor_schedule": ("INSERT", "UPDATE", "DELETE"),
+    "patients": ("UPDATE", "DELETE"),
+}
+
+VERSION_TRIGGERS = {
+    f"{table}_version_{event.lower()}": f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()} AFTER {event} ON {table}
+        BEGIN
+            UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';
+        END
+    """
+    for table, events in VERSIONED_TABLES.items()
+    for event in events
+}
+
+QUEUE_COUNT_TRIGGERS = {
+    "doctor_queue_count_insert": """
+        CREATE TRIGGER IF NOT EXISTS doctor_queue_count_insert AFTER INSERT ON doctor_queue
+        WHEN NEW.seen = 'no'
+        BEGIN
+            INSERT INTO doctor_queue_counts (doctor_id, open_count) VALUES (NEW.doctor_id, 1)
+            ON CONFLICT (doctor_id) DO UPDATE SET open_count = open_count + 1;
+        END
+    """,
+    "doctor_queue_count_update": """
+        CREATE TRIGGER IF NOT EXISTS doctor_queue_count_update AFTER UPDATE OF seen, doctor_id ON doctor_queue
+        WHEN OLD.seen IS NOT NEW.seen OR OLD.doctor_id IS NOT NEW.doctor_id
+        BEGIN
+            UPDATE doctor_queue_counts SET open_count = open_count - 1
+            WHERE OLD.seen = 'no' AND doctor_id = OLD.doctor_id;
+            INSERT INTO doctor_queue_counts (doctor_id, open_count) SELECT NEW.doctor_id, 1 WHERE NEW.seen = 'no'
+            ON CONFLICT (doctor_id) DO UPDATE SET open_count = open_count + 1;
+        END
+    """,
+    "doctor_queue_count_delete": """
+        CREATE TRIGGER IF NOT EXISTS doctor_queue_count_delete AFTER DELETE ON doctor_queue
+        WHEN OLD.seen = 'no'
+        BEGIN
+            UPDATE doctor_queue_counts SET open_count = open_count - 1 WHERE doctor_id = OLD.doctor_id;
+        END
+    """,
+}
+
+TRIGGERS = {**VERSION_TRIGGERS, **QUEUE_COUNT_TRIGGERS}
+
+# Indexes replaced by a later migration
+DROPPED_INDEXES = [
+    "idx_appointments_doctor_datetime_status",
+    "idx_doctor_queue_patient_doctor_seen",
+]
+
+# How rows of a version-0 table are copied into the rebuilt one
+LEGACY_COPY = {
+    "doctor_schedule": """
+        INSERT OR IGNORE INTO doctor_schedule (doctor_id, name, specialization, day_of_week, start_time, end_time)
+        SELECT doctor_id, name, specialization, day_of_week, start_time, end_time FROM legacy_doctor_schedule
+    """,
+    "patients": """
+        INSERT OR IGNORE INTO patients (patient_id, name, phone, gender, age, address)
+        SELECT patient_id, name, CAST(phone AS TEXT), gender, CAST(age AS TEXT), address FROM legacy_patients
+    """,
+    "appointments": """
+        INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status)
+        SELECT patient_id, doctor_id, appointment_datetime, COALESCE(status, 'scheduled') FROM legacy_appointments
+    """,
+    "doctor_queue": """
+        INSERT INTO doctor_queue (doctor_id, patient_id, queued_at, seen)
+        SELECT doctor_id, patient_id, queued_at, COALESCE(seen, 'no') FROM legacy_doctor_queue
+    """,
+    "diagnosis_medicines": """
+        INSERT OR IGNORE INTO diagnosis_medicines (diagnosis, medicines)
+        SELECT diagnosis, medicines FROM legacy_diagnosis_medicines
+    """,
+}
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def _resolve_duplicates(conn):
+    """Clear rows the unique indexes would reject, which older versions could create under concurrency."""
+    conn.execute("""
+        UPDATE appointments SET status = 'double_booked'
+        WHERE status = 'scheduled' AND appointment_id NOT IN (
+            SELECT MIN(appointment_id) FROM appointments
+            WHERE status = 'scheduled'
+            GROUP BY doctor_id, appointment_datetime
+        )
+    """)
+    conn.execute("""
+        DELETE FROM doctor_queue
+        WHERE seen = 'no' AND queue_id NOT IN (
+            SELECT MIN(queue_id) FROM doctor_queue
+            WHERE seen = 'no'
+            GROUP BY patient_id, doctor_id
+        )
+    """)
+    conn.execute("""
+        DELETE FROM doctor_queue
+        WHERE queue_id NOT IN (
+            SELECT MIN(queue_id) FROM doctor_queue
+            GROUP BY doctor_id, patient_id, queued_at
+        )
+    """)
+
+
+def _create_indexes(conn):
+    for name in DROPPED_INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    _resolve_duplicates(conn)
+    for ddl in INDEXES.values():
+        conn.execute(ddl)
+
+
+def _create_triggers(conn, triggers):
+    for ddl in triggers.values():
+        conn.execute(ddl)
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _migration_1(conn):
+    """Tables with primary keys and constraints, plus the lookup indexes used by the activities."""
+    for table, ddl in TABLES.items():
+        if table not in LEGACY_COPY:
+            continue  # added by a later migration
+        legacy = _table_exists(conn, table)
+        if legacy:
+            conn.execute(f"ALTER TABLE {table} RENAME TO legacy_{table}")
+        conn.execute(ddl)
+        if legacy:
+            conn.execute(LEGACY_COPY[table])
+            conn.execute(f"DROP TABLE legacy_{table}")
+    _create_indexes(conn)
+
+
+def _migration_2(conn):
+    """AUTOINCREMENT patient IDs, idempotency keys, and unique slot / open-queue constraints."""
+    patients_sql = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'patients'").fetchone()[0]
+    if "AUTOINCREMENT" not in patients_sql:
+        # Build the new table under a temporary name and rename it last, so the
+        # foreign keys in appointments and doctor_queue keep pointing at "patients"
+        conn.execute(TABLES["patients"].replace("CREATE TABLE patients", "CREATE TABLE new_patients"))
+        conn.execute("""
+            INSERT INTO new_patients (patient_id, name, phone, gender, age, address)
+            SELECT patient_id, name, phone, gender, age, address FROM patients
+        """)
+        conn.execute("DROP TABLE patients")
+        conn.execute("ALTER TABLE new_patients RENAME TO patients")
+    if "idempotency_key" not in _columns(conn, "appointments"):
+        conn.execute("ALTER TABLE appointments ADD COLUMN idempotency_key TEXT")
+    _create_indexes(conn)
+
+
+def _migration_3(conn):
+    """data_versions counters, bumped by triggers on the tables workers keep in memory."""
+    if not _table_exists(conn, "data_versions"):
+        conn.execute(TABLES["data_versions"])
+    conn.executemany(
+        "INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)",
+        [(table,) for table in VERSIONED_TABLES],
+    )
+    _create_triggers(conn, VERSION_TRIGGERS)
+
+
+def _migration_4(conn):
+    """Per-doctor open queue counters, so wait estimates don't count the queue history."""
+    if not _table_exists(conn, "doctor_queue_counts"):
+        conn.execute(TABLES["doctor_queue_counts"])
+    conn.execute("DELETE FROM doctor_queue_counts")
+    conn.execute("""
+        INSERT INTO doctor_queue_counts (doctor_id, open_count)
+        SELECT doctor_id, COUNT(*) FROM doctor_queue WHERE seen = 'no' GROUP BY doctor_id
+    """)
+    _create_triggers(conn, QUEUE_COUNT_TRIGGERS)
+
+
+def _migration_5(conn):
+    """Unique (doctor_id, patient_id, queued_at) so batched queue checkpoints can be replayed."""
+    _create_indexes(conn)
+
+
+def _migration_6(conn):
+    """When each queue entry was seen, and per-doctor consultation statistics built from it."""
+    if "seen_at" not in _columns(conn, "doctor_queue"):
+        conn.execute("ALTER TABLE doctor_queue ADD COLUMN seen_at TEXT")
+    if not _table_exists(conn, "doctor_service_stats"):
+        conn.execute(TABLES["doctor_service_stats"])
+
+
+def _migration_7(conn):
+    """A data_versions counter for changed patient records, so worker patient caches can drop them."""
+    _migration_3(conn)
+
+
+def fill_service_stats(conn) -> int:
+    """
+    Learn every doctor's consultation statistics from the seen entries already in doctor_queue,
+    replayed in seen_at order as the queue checkpoints would have recorded them, and replace
+    doctor_service_stats with them. Entries seen before seen_at was recorded can't be timed
+    and are skipped. Returns the number of doctors with statistics.
+    """
+    if BACKEND_DIR not in sys.path:
+        sys.path.append(BACKEND_DIR)
+    from wait_estimator import consultation_minutes, consultation_start, parse_timestamp, prior_stats, update_stats
+
+    rows = conn.execute("""
+        SELECT doctor_id, queued_at, seen_at FROM doctor_queue
+        WHERE seen = 'yes' AND seen_at IS NOT NULL
+        ORDER BY doctor_id, seen_at
+    """)
+    learned = []
+    for doctor_id, entries in itertools.groupby(rows, key=lambda row: row[0]):
+        # Booked appointments seen in between share a consultation's interval, as in the checkpoints
+        appointments = [row[0] for row in conn.execute("""
+            SELECT appointment_datetime FROM appointments WHERE doctor_id = ? AND status = 'scheduled'
+            ORDER BY appointment_datetime
+        """, (doctor_id,))]
+        stats, last_seen_at = prior_stats(), None
+        for _, queued_at, seen_at in entries:
+            start = consultation_start(queued_at, last_seen_at)
+            end = parse_timestamp(seen_at)
+            between = (bisect.bisect_right(appointments, end.isoformat())
+                       - bisect.bisect_right(appointments, start.isoformat()))
+            minutes = consultation_minutes(start, seen_at, between)
+            if minutes is not None:
+                stats = update_stats(stats, minutes)
+            last_seen_at = seen_at
+        learned.append((doctor_id, stats["samples"], stats["mean"], stats["variance"], last_seen_at))
+
+    conn.execute("DELETE FROM doctor_service_stats")
+    conn.executemany("""
+        INSERT INTO doctor_service_stats (doctor_id, samples, mean_minutes, variance, last_seen_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, learned)
+    return len(learned)
+
+
+def _migration_8(conn):
+    """Consultation statistics learned from the queue history recorded before the checkpoints kept them."""
+    fill_service_stats(conn)
+
+
+MIGRATIONS = [
+    (1, _migration_1),
+    (2, _migration_2),
+    (3, _migration_3),
+    (4, _migration_4),
+    (5, _migration_5),
+    (6, _migration_6),
+    (7, _migration_7),
+    (8, _migration_8),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, target: int = LATEST_VERSION) -> int:
+    """Apply pending migrations up to `target`, each in its own transaction. Returns the new version."""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None  # manage transactions explicitly so DDL is rolled back on failure
+    # Table rebuilds drop and recreate referenced tables; this pragma is a no-op inside a transaction
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        for version, migration in MIGRATIONS:
+            if version <= current_version(conn) or version > target:
+                continue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.isolation_level = isolation_level
+    return current_version(conn)
+
+
+if __name__ == "__main__":
+    import sys
+
+    connection = sqlite3.connect(sys.argv[1] if len(sys.argv) > 1 else "clinic.db")
+    print(f"Schema at version {migrate(connection)}")
+    connection.close()
@@ -1,17 +1,33 @@
+import csv
 import sqlite3
-import pandas as pd
+
+from schema import migrate
 
 # Connect to SQLite database
 conn = sqlite3.connect("clinic.db")
 
-# Load and insert each CSV table
+# Create or upgrade the tables, keys and indexes
+version = migrate(conn)
+print(f"Schema at version {version}")
+
+# Load and insert each CSV table; tables that already hold data are left alone
 tables = ["doctor_schedule", "patients", "appointments", "doctor_queue", "diagnosis_medicines"]
 
 for table in tables:
-    df = pd.read_csv(f"data/{table}.csv")
-    df.to_sql(table, conn, if_exists="append", index=False)
-    print(f"Loaded {len(df)} records into {table} table")
+    if conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+        print(f"Skipping {table} table, already loaded")
+        continue
+
+    with open(f"data/{table}.csv", newline="") as f:
+        reader = csv.reader(f)
+        columns = next(reader)
+        rows = [row for row in reader if row]
+    placeholders = ", ".join("?" for _ in columns)
+    cur = conn.executemany(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})", rows
+    )
+    print(f"Loaded {cur.rowcount} records into {table} table")
 
 conn.commit()
 conn.close()
-print("Database setup completed successfully!")
\ No newline at end of file
+print("Database setup completed successfully!")
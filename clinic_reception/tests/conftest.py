@@ -0,0 +1,11 @@
+import os
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+
+# schema.py lives at the top level, the backend modules import each other flat
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BACKEND_DIR)
+# and resolve their paths (template, output directories) from backend/, like the workers
+os.chdir(BACKEND_DIR)
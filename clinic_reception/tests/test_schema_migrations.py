@@ -0,0 +1,225 @@
+import sqlite3
+
+import pytest
+
+from schema import DROPPED_INDEXES, INDEXES, LATEST_VERSION, TRIGGERS, current_version, migrate
+
+# clinic.db as the pandas-based setup left it: no keys, phone and age as numbers
+LEGACY_SCHEMA = """
+    CREATE TABLE doctor_schedule ("doctor_id" INTEGER, "name" TEXT, "specialization" TEXT,
+                                  "day_of_week" TEXT, "start_time" TEXT, "end_time" TEXT);
+    CREATE TABLE patients ("patient_id" INTEGER, "name" TEXT, "phone" INTEGER, "gender" TEXT,
+                           "age" INTEGER, "address" TEXT);
+    CREATE TABLE appointments ("patient_id" INTEGER, "doctor_id" INTEGER, "appointment_datetime" TEXT,
+                               "status" TEXT);
+    CREATE TABLE doctor_queue ("doctor_id" INTEGER, "patient_id" INTEGER, "queued_at" TEXT, "seen" TEXT);
+    CREATE TABLE diagnosis_medicines ("diagnosis" TEXT, "medicines" TEXT);
+"""
+
+# clinic.db as migration 1 first shipped: keys and lookup indexes, nothing later
+V1_SCHEMA = """
+    CREATE TABLE doctor_schedule (
+        doctor_id INTEGER NOT NULL,
+        name TEXT NOT NULL COLLATE NOCASE,
+        specialization TEXT,
+        day_of_week TEXT NOT NULL,
+        start_time TEXT NOT NULL,
+        end_time TEXT NOT NULL,
+        PRIMARY KEY (doctor_id, day_of_week, start_time)
+    );
+    CREATE TABLE patients (
+        patient_id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        gender TEXT,
+        age TEXT,
+        address TEXT
+    );
+    CREATE TABLE appointments (
+        appointment_id INTEGER PRIMARY KEY,
+        patient_id INTEGER NOT NULL REFERENCES patients (patient_id),
+        doctor_id INTEGER NOT NULL,
+        appointment_datetime TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'scheduled'
+    );
+    CREATE TABLE doctor_queue (
+        queue_id INTEGER PRIMARY KEY,
+        doctor_id INTEGER NOT NULL,
+        patient_id INTEGER NOT NULL REFERENCES patients (patient_id),
+        queued_at TEXT NOT NULL,
+        seen TEXT NOT NULL DEFAULT 'no' CHECK (seen IN ('no', 'yes'))
+    );
+    CREATE TABLE diagnosis_medicines (
+        diagnosis_id INTEGER PRIMARY KEY,
+        diagnosis TEXT NOT NULL UNIQUE,
+        medicines TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX ux_patients_phone ON patients (phone);
+    CREATE INDEX idx_doctor_schedule_name_day ON doctor_schedule (name, day_of_week, start_time);
+    CREATE INDEX idx_appointments_doctor_datetime_status ON appointments (doctor_id, appointment_datetime, status);
+    CREATE INDEX idx_appointments_patient_doctor_datetime ON appointments (patient_id, doctor_id, appointment_datetime);
+    CREATE INDEX idx_doctor_queue_doctor_seen ON doctor_queue (doctor_id, seen);
+    CREATE INDEX idx_doctor_queue_patient_doctor_seen ON doctor_queue (patient_id, doctor_id, seen);
+    PRAGMA user_version = 1;
+"""
+
+SLOT = "2025-07-03T10:00:00"
+
+
+def insert_rows(conn):
+    """Rows an older version could have written, including what the newer unique indexes forbid."""
+    conn.executemany(
+        "INSERT INTO doctor_schedule (doctor_id, name, specialization, day_of_week, start_time, end_time) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, "Smith", "GP", "Monday", "09:00:00", "17:00:00"), (2, "Jones", "ENT", "Monday", "09:00:00", "13:00:00")],
+    )
+    conn.executemany(
+        "INSERT INTO patients (patient_id, name, phone, gender, age, address) VALUES (?, ?, ?, ?, ?, ?)",
+        [(1, "Asha", 5550001, "Female", 34, "Pune"), (2, "Ravi", 5550002, "Male", 51, "Delhi")],
+    )
+    conn.executemany(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status) VALUES (?, ?, ?, ?)",
+        [(1, 1, SLOT, "scheduled"), (2, 1, SLOT, "scheduled"), (2, 1, SLOT, "cancelled")],
+    )
+    conn.executemany(
+        "INSERT INTO doctor_queue (doctor_id, patient_id, queued_at, seen) VALUES (?, ?, ?, ?)",
+        [
+            (1, 1, "2025-07-03T09:00:00", "no"),
+            (1, 1, "2025-07-03T09:05:00", "no"),
+            (1, 2, "2025-07-03T08:00:00", "yes"),
+            (2, 2, "2025-07-03T09:10:00", "no"),
+        ],
+    )
+    conn.execute("INSERT INTO diagnosis_medicines (diagnosis, medicines) VALUES ('Viral Fever', 'Paracetamol')")
+    conn.commit()
+
+
+@pytest.fixture(params=["legacy", "v1"])
+def old_db(request, tmp_path):
+    conn = sqlite3.connect(tmp_path / "clinic.db")
+    conn.executescript(LEGACY_SCHEMA if request.param == "legacy" else V1_SCHEMA)
+    insert_rows(conn)
+    yield conn
+    conn.close()
+
+
+def names(conn, kind):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = ?", (kind,))}
+
+
+def test_upgrade_keeps_rows_and_reaches_latest(old_db):
+    assert migrate(old_db) == LATEST_VERSION
+    assert current_version(old_db) == LATEST_VERSION
+
+    assert old_db.execute("SELECT patient_id, phone, age FROM patients ORDER BY patient_id").fetchall() == [
+        (1, "5550001", "34"), (2, "5550002", "51"),
+    ]
+    assert old_db.execute("SELECT COUNT(*) FROM doctor_schedule").fetchone()[0] == 2
+    assert old_db.execute("SELECT COUNT(*) FROM diagnosis_medicines").fetchone()[0] == 1
+    assert "AUTOINCREMENT" in old_db.execute("SELECT sql FROM sqlite_master WHERE name = 'patients'").fetchone()[0]
+
+
+def test_upgrade_resolves_rows_the_unique_indexes_reject(old_db):
+    migrate(old_db)
+
+    # The first booking of the slot keeps it, the later one is flagged, other statuses are untouched
+    assert old_db.execute(
+        "SELECT patient_id, status FROM appointments WHERE appointment_datetime = ? ORDER BY appointment_id", (SLOT,)
+    ).fetchall() == [(1, "scheduled"), (2, "double_booked"), (2, "cancelled")]
+    # Only the earliest open entry per patient and doctor survives
+    assert old_db.execute(
+        "SELECT doctor_id, patient_id, queued_at, seen FROM doctor_queue ORDER BY queue_id"
+    ).fetchall() == [
+        (1, 1, "2025-07-03T09:00:00", "no"),
+        (1, 2, "2025-07-03T08:00:00", "yes"),
+        (2, 2, "2025-07-03T09:10:00", "no"),
+    ]
+
+
+def test_upgrade_creates_indexes_triggers_and_columns(old_db):
+    migrate(old_db)
+
+    indexes = names(old_db, "index")
+    assert set(INDEXES) <= indexes
+    assert not indexes & set(DROPPED_INDEXES)
+    assert set(TRIGGERS) <= names(old_db, "trigger")
+    assert {"idempotency_key"} <= {row[1] for row in old_db.execute("PRAGMA table_info(appointments)")}
+    assert {"seen_at"} <= {row[1] for row in old_db.execute("PRAGMA table_info(doctor_queue)")}
+    assert old_db.execute("SELECT COUNT(*) FROM doctor_service_stats").fetchone()[0] == 0
+
+
+def test_partial_unique_indexes(old_db):
+    migrate(old_db)
+
+    with pytest.raises(sqlite3.IntegrityError):
+        old_db.execute("INSERT INTO appointments (patient_id, doctor_id, appointment_datetime) VALUES (2, 1, ?)", (SLOT,))
+    old_db.execute(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime, status) VALUES (2, 1, ?, 'cancelled')",
+        (SLOT,),
+    )
+
+    with pytest.raises(sqlite3.IntegrityError):
+        old_db.execute("INSERT INTO doctor_queue (doctor_id, patient_id, queued_at) VALUES (1, 1, '2025-07-03T11:00:00')")
+    old_db.execute("UPDATE doctor_queue SET seen = 'yes' WHERE doctor_id = 1 AND patient_id = 1")
+    old_db.execute("INSERT INTO doctor_queue (doctor_id, patient_id, queued_at) VALUES (1, 1, '2025-07-03T11:00:00')")
+
+    # Idempotency keys are unique when set; rows without one don't collide
+    old_db.execute("INSERT INTO patients (name, phone) VALUES ('A', '1')")
+    old_db.execute("INSERT INTO patients (name, phone) VALUES ('B', '2')")
+    old_db.execute("INSERT INTO patients (name, phone, idempotency_key) VALUES ('C', '3', 'wf:run:1')")
+    with pytest.raises(sqlite3.IntegrityError):
+        old_db.execute("INSERT INTO patients (name, phone, idempotency_key) VALUES ('D', '4', 'wf:run:1')")
+
+
+def test_queue_counts_are_rebuilt_and_kept_by_triggers(old_db):
+    migrate(old_db)
+
+    def counts():
+        return dict(old_db.execute("SELECT doctor_id, open_count FROM doctor_queue_counts WHERE open_count > 0"))
+
+    assert counts() == {1: 1, 2: 1}
+    old_db.execute("UPDATE doctor_queue SET seen = 'yes' WHERE doctor_id = 1 AND seen = 'no'")
+    assert counts() == {2: 1}
+    old_db.execute("INSERT INTO doctor_queue (doctor_id, patient_id, queued_at) VALUES (1, 1, '2025-07-03T12:00:00')")
+    old_db.execute("UPDATE doctor_queue SET doctor_id = 1 WHERE doctor_id = 2")
+    assert counts() == {1: 2}
+    old_db.execute("DELETE FROM doctor_queue WHERE seen = 'no' AND patient_id = 1 AND queued_at = '2025-07-03T12:00:00'")
+    assert counts() == {1: 1}
+
+
+def test_schedule_writes_bump_its_data_version(old_db):
+    migrate(old_db)
+
+    def version():
+        return old_db.execute("SELECT version FROM data_versions WHERE table_name = 'doctor_schedule'").fetchone()[0]
+
+    assert version() == 0
+    old_db.execute(
+        "INSERT INTO doctor_schedule (doctor_id, name, day_of_week, start_time, end_time) "
+        "VALUES (3, 'Rao', 'Tuesday', '10:00:00', '12:00:00')"
+    )
+    old_db.execute("UPDATE doctor_schedule SET end_time = '14:00:00' WHERE doctor_id = 3")
+    old_db.execute("DELETE FROM doctor_schedule WHERE doctor_id = 3")
+    assert version() == 3
+
+
+def test_only_changed_patients_bump_their_data_version(old_db):
+    migrate(old_db)
+
+    def version():
+        return old_db.execute("SELECT version FROM data_versions WHERE table_name = 'patients'").fetchone()[0]
+
+    # Caches never hold unknown phones, so registrations leave cached records valid
+    old_db.execute("INSERT INTO patients (name, phone) VALUES ('Meera', '5550003')")
+    assert version() == 0
+    old_db.execute("UPDATE patients SET address = 'Mumbai' WHERE phone = '5550003'")
+    old_db.execute("DELETE FROM patients WHERE phone = '5550003'")
+    assert version() == 2
+
+
+def test_migrations_apply_in_steps_and_only_once(old_db):
+    assert current_version(old_db) < 3
+    assert migrate(old_db, target=3) == 3
+    assert "doctor_queue_counts" not in names(old_db, "table")
+    assert migrate(old_db) == LATEST_VERSION
+    assert migrate(old_db) == LATEST_VERSION
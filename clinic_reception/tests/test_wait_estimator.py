@@ -0,0 +1,200 @@
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+import repository
+from config import AVG_CONSULTATION_MINUTES, MAX_CONSULTATION_MINUTES, WAIT_ESTIMATE_ALPHA, WAIT_ESTIMATE_HORIZON_HOURS
+from schema import fill_service_stats, migrate
+from wait_estimator import consultation_minutes, consultation_start, estimate_wait, prior_stats, update_stats
+
+STATS = {"samples": 50, "mean": 10.0, "variance": 4.0}
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A migrated clinic.db with three patients, behind the repository's connection pool."""
+    path = str(tmp_path / "clinic.db")
+    conn = sqlite3.connect(path)
+    migrate(conn)
+    conn.executemany("INSERT INTO patients (name, phone) VALUES (?, ?)", [("P1", "1"), ("P2", "2"), ("P3", "3")])
+    conn.commit()
+    monkeypatch.setattr(repository, "pool", repository.ConnectionPool(path))
+    yield conn
+    # The pool's connections belong to the threads that opened them, DB executor threads among them,
+    # so they are left to go with the pool
+    conn.close()
+
+
+def test_update_stats_on_a_known_sequence():
+    stats = prior_stats()
+    assert stats == {"samples": 0, "mean": AVG_CONSULTATION_MINUTES, "variance": (AVG_CONSULTATION_MINUTES / 2) ** 2}
+
+    alpha = 0.1
+    stats = update_stats({"samples": 0, "mean": 15.0, "variance": 25.0}, 25.0, alpha)
+    assert stats["samples"] == 1
+    assert stats["mean"] == pytest.approx(16.0)
+    assert stats["variance"] == pytest.approx(0.9 * (25.0 + 10.0 * 1.0))
+
+    stats = update_stats(stats, 6.0, alpha)
+    assert stats["mean"] == pytest.approx(15.0)
+    assert stats["variance"] == pytest.approx(0.9 * (31.5 + 10.0 * 1.0))
+
+
+def test_update_stats_converges_on_a_steady_doctor():
+    stats = prior_stats()
+    for _ in range(200):
+        stats = update_stats(stats, 8.0)
+    assert stats["samples"] == 200
+    assert stats["mean"] == pytest.approx(8.0, abs=1e-6)
+    assert stats["variance"] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_consultation_starts_when_the_doctor_is_free():
+    assert consultation_start("2025-07-03T09:00:00") == datetime(2025, 7, 3, 9, 0)
+    # Queued while the doctor was busy: starts when the previous patient was seen
+    assert consultation_start("2025-07-03T09:00:00", "2025-07-03T09:20:00") == datetime(2025, 7, 3, 9, 20)
+    # Arrived after the doctor was free: starts on arrival
+    assert consultation_start("2025-07-03T09:30:00", "2025-07-03T09:20:00") == datetime(2025, 7, 3, 9, 30)
+    # Workflow timestamps are UTC-aware and become naive local time
+    aware = "2025-07-03T09:00:00+00:00"
+    assert consultation_start(aware) == datetime.fromisoformat(aware).astimezone().replace(tzinfo=None)
+
+
+def test_consultation_minutes_clips_gaps():
+    start = datetime(2025, 7, 3, 9, 0)
+    assert consultation_minutes(start, "2025-07-03T09:12:00") == pytest.approx(12)
+    # Booked appointments seen in between share the interval
+    assert consultation_minutes(start, "2025-07-03T09:30:00", appointments_between=2) == pytest.approx(10)
+    # Breaks and shift changes longer than MAX_CONSULTATION_MINUTES, and clock skew, are not counted
+    too_long = (start + timedelta(minutes=MAX_CONSULTATION_MINUTES + 1)).isoformat()
+    assert consultation_minutes(start, too_long) is None
+    assert consultation_minutes(start, "2025-07-03T09:00:00") is None
+    assert consultation_minutes(start, "2025-07-03T08:59:00") is None
+
+
+def test_estimate_wait_for_the_queue_ahead():
+    assert estimate_wait(0, [], STATS) == {"p50": 0, "p90": 0, "patients_ahead": 0}
+    # The first patient is about half way through
+    assert estimate_wait(1, [], STATS) == {"p50": 5, "p90": round(5 + 1.2816 * 2), "patients_ahead": 1}
+    assert estimate_wait(3, [], STATS)["p50"] == 25
+
+
+def test_estimate_wait_counts_appointments_due_before_the_turn():
+    # 25 minutes of walk-ins ahead: the appointment in 10 minutes goes first, the one in 40 does not
+    estimate = estimate_wait(3, [40, 10], STATS)
+    assert estimate["patients_ahead"] == 4
+    assert estimate["p50"] == 35
+    # Each appointment taken pushes the turn back, which can bring the next one in
+    assert estimate_wait(3, [30, 10], STATS)["patients_ahead"] == 5
+
+
+def test_checkpoints_learn_consultation_times(db):
+    doctor_id = 1
+    seen = [
+        # patient, queued, seen: 20 minutes from arrival
+        (1, "2025-07-03T09:00:00", "2025-07-03T09:20:00"),
+        # queued while patient 1 was with the doctor: 30 minutes from 09:20
+        (2, "2025-07-03T09:05:00", "2025-07-03T09:50:00"),
+        # lunch in between, longer than MAX_CONSULTATION_MINUTES: not counted
+        (3, "2025-07-03T09:10:00", "2025-07-03T13:00:00"),
+    ]
+    events = [{"type": "enqueued", "patient_id": p, "queued_at": q} for p, q, _ in seen]
+    events += [{"type": "seen", "patient_id": p, "queued_at": q, "seen_at": s} for p, q, s in seen]
+    repository.apply_queue_events(doctor_id, events)
+    # Replaying the batch after a retry changes nothing
+    repository.apply_queue_events(doctor_id, events)
+
+    expected = prior_stats()
+    for minutes in (20.0, 30.0):
+        expected = update_stats(expected, minutes, WAIT_ESTIMATE_ALPHA)
+    stats = repository.get_service_stats(doctor_id)
+    assert stats["samples"] == 2
+    assert stats["mean"] == pytest.approx(expected["mean"])
+    assert stats["variance"] == pytest.approx(expected["variance"])
+    assert repository.count_open_queue(doctor_id) == 0
+
+
+def test_history_replay_learns_what_the_checkpoints_did(db):
+    doctor_id = 1
+    db.execute(
+        "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime) VALUES (3, ?, '2025-07-03T09:40:00')",
+        (doctor_id,),
+    )
+    db.commit()
+    seen = [
+        (1, "2025-07-03T09:00:00", "2025-07-03T09:12:00"),
+        (2, "2025-07-03T09:05:00", "2025-07-03T09:30:00"),
+        # the appointment at 09:40 was seen in between
+        (1, "2025-07-03T09:35:00", "2025-07-03T09:58:00"),
+        (3, "2025-07-03T09:36:00", "2025-07-03T13:00:00"),
+    ]
+    for patient_id, queued_at, seen_at in seen:
+        repository.apply_queue_events(doctor_id, [
+            {"type": "enqueued", "patient_id": patient_id, "queued_at": queued_at},
+            {"type": "seen", "patient_id": patient_id, "queued_at": queued_at, "seen_at": seen_at},
+        ])
+    # Seen before seen_at was recorded: not timed
+    db.execute("INSERT INTO doctor_queue (doctor_id, patient_id, queued_at, seen) VALUES (2, 1, '2025-07-03T09:00:00', 'yes')")
+    checkpointed = repository.get_service_stats(doctor_id)
+    db.execute("DELETE FROM doctor_service_stats")
+
+    assert fill_service_stats(db) == 1
+    db.commit()
+    assert repository.get_service_stats(doctor_id) == pytest.approx(checkpointed)
+    assert repository.get_service_stats(2) is None
+    assert checkpointed["samples"] == 3
+
+
+def test_walkin_estimate_only_counts_appointments_within_the_horizon(db):
+    from activities import estimate_wait_time_for_walkin
+
+    doctor_id = 1
+    # Enough walk-ins ahead that the turn comes after the horizon
+    ahead = int(WAIT_ESTIMATE_HORIZON_HOURS * 60 / AVG_CONSULTATION_MINUTES) + 10
+    db.executemany(
+        "INSERT INTO patients (name, phone) VALUES (?, ?)", [(f"Q{n}", f"q{n}") for n in range(ahead)]
+    )
+    db.executemany(
+        "INSERT INTO doctor_queue (doctor_id, patient_id, queued_at) VALUES (?, ?, ?)",
+        [(doctor_id, 4 + n, f"2025-07-03T08:{n % 60:02d}:{n // 60:02d}") for n in range(ahead)],
+    )
+    now = datetime.now().replace(microsecond=0)
+    for patient_id, hours in ((1, 1), (2, WAIT_ESTIMATE_HORIZON_HOURS + 1)):
+        db.execute(
+            "INSERT INTO appointments (patient_id, doctor_id, appointment_datetime) VALUES (?, ?, ?)",
+            (patient_id, doctor_id, (now + timedelta(hours=hours)).isoformat()),
+        )
+    db.commit()
+
+    estimate = asyncio.run(estimate_wait_time_for_walkin(doctor_id))
+    assert estimate["patients_ahead"] == ahead + 1
+
+
+def test_checkpoints_close_entries_queued_before_the_workflow(db):
+    doctor_id = 1
+    # Open entries left in SQLite from before the queue workflow started, as the seed data has
+    db.executemany(
+        "INSERT INTO doctor_queue (doctor_id, patient_id, queued_at) VALUES (?, ?, ?)",
+        [(doctor_id, 1, "2025-07-03T09:00:00"), (doctor_id, 2, "2025-07-03T09:05:00")],
+    )
+    db.commit()
+    assert [entry["patient_id"] for entry in repository.open_queue_entries(doctor_id)] == [1, 2]
+
+    # Patient 1 joins again through a workflow that didn't know about the stored entry, then is seen
+    queued_at = "2025-07-03T09:10:00+00:00"
+    events = [
+        {"type": "enqueued", "patient_id": 1, "queued_at": queued_at},
+        {"type": "seen", "patient_id": 1, "queued_at": queued_at, "seen_at": "2025-07-03T09:20:00+00:00"},
+        {"type": "enqueued", "patient_id": 1, "queued_at": "2025-07-03T09:30:00+00:00"},
+    ]
+    repository.apply_queue_events(doctor_id, events)
+    # Replaying the batch doesn't close the entry it opened last
+    repository.apply_queue_events(doctor_id, events)
+
+    assert [(entry["patient_id"], entry["queued_at"]) for entry in repository.open_queue_entries(doctor_id)] == [
+        (2, "2025-07-03T09:05:00"), (1, "2025-07-03T09:30:00+00:00"),
+    ]
+    assert repository.count_open_queue(doctor_id) == 2
+    assert repository.get_service_stats(doctor_id)["samples"] == 1